@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+"""
+Benchmark del tiempo de arranque de curryrtool.
+
+Lanza varias veces cada comando rápido (``--help``) en un proceso nuevo y compara
+la mediana con su presupuesto. También comprueba que importar las interfaces no
+arrastra módulos pesados. Termina con código 1 si algo se sale del presupuesto.
+
+Uso: python3 benchmarks/arranque.py [-n repeticiones] [-j resultados.json]
+"""
+import json
+import optparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CURRYRTOOL = os.path.join(RAIZ, "curryrtool.py")
+
+# Comando -> mediana máxima en milisegundos
+PRESUPUESTOS = {
+    "device read --help": 150,
+    "device write --help": 150,
+    "trainning entrenar --help": 150,
+    "trainning predecir --help": 150,
+}
+
+# Módulos que no deben cargarse sólo por importar las interfaces
+MODULOS_PESADOS = ["numpy", "tensorflow", "matplotlib", "asyncio"]
+
+
+def medir(comando: str, repeticiones: int) -> list:
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        subprocess.run([sys.executable, CURRYRTOOL] + comando.split(), cwd=RAIZ, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+
+def modulos_cargados() -> list:
+    codigo = (
+        "import sys; sys.path.insert(0, %r)\n"
+        "import curryrtoolslib.interfaces.devices_interface, curryrtoolslib.interfaces.trainning_interface\n"
+        "print(' '.join(sorted(m for m in %r if m in sys.modules)))"
+    ) % (RAIZ, MODULOS_PESADOS)
+    salida = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True, cwd=RAIZ)
+    return salida.stdout.split()
+
+
+def main() -> int:
+    parser = optparse.OptionParser()
+    parser.add_option('-n', '--repeticiones', dest='repeticiones', help='Ejecuciones por comando', default="10")
+    parser.add_option('-j', '--json', dest='json', help='Guardar los resultados en un fichero JSON', default=None)
+    (options, args) = parser.parse_args()
+
+    resultados = {"comandos": {}, "modulos_pesados": modulos_cargados()}
+    correcto = not resultados["modulos_pesados"]
+    for comando, presupuesto in PRESUPUESTOS.items():
+        tiempos = medir(comando, int(options.repeticiones))
+        mediana = statistics.median(tiempos)
+        dentro = mediana <= presupuesto
+        correcto = correcto and dentro
+        resultados["comandos"][comando] = {"mediana_ms": round(mediana, 2), "min_ms": round(min(tiempos), 2), "presupuesto_ms": presupuesto, "ok": dentro}
+        print("%-30s mediana %7.1f ms  min %7.1f ms  presupuesto %4d ms  %s" % (comando, mediana, min(tiempos), presupuesto, "OK" if dentro else "FUERA"))
+
+    if resultados["modulos_pesados"]:
+        print("Módulos pesados cargados al importar las interfaces: %s" % ", ".join(resultados["modulos_pesados"]))
+    if options.json:
+        with open(options.json, "w") as fichero:
+            json.dump(resultados, fichero, indent=1)
+
+    return 0 if correcto else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
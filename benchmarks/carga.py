@@ -0,0 +1,180 @@
+#!/usr/bin/python3
+"""
+Pruebas de carga de captura, repetición y envío sin hardware.
+
+Usa el termostato virtual (``utils/simulador.py``) sobre pseudoterminales y ejecuta
+los mismos métodos de ``DeviceInterface`` que los comandos, en un hilo, hasta que se
+activa su evento ``parar``. Mide tramas por segundo, pérdidas y latencia de cada camino:
+
+* ``captura``: simulador -> ``read_serial_data`` en formato log, con la cola de
+  escritura (como ``device read``). Cuenta las tramas que ``procesar_trama`` guarda.
+* ``repetidor``: simulador -> ``modo_repetidor`` -> puerto de salida -> bus de vuelta
+  del simulador (como ``device repeat``).
+* ``envio``: ``send_data_from`` con ritmo ``linea`` de capturas sintéticas -> puerto -> simulador.
+
+La latencia de la captura y del repetidor se mide desde el último byte emitido, así
+que incluye el silencio con el que el receptor cierra la trama (el doble de ``-t``).
+La del envío se mide desde que ``send_data_from`` termina.
+
+Uso: python3 benchmarks/carga.py [-b 115200] [-t 0.01] [-n 200] [--perturbaciones ruido=0.05,truncadas=0.02,rafaga=10] [-j carga.json]
+"""
+import contextlib
+import io
+import json
+import optparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from typing import Any, Callable, Dict, List
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from curryrtoolslib.interfaces.devices_interface import DeviceInterface
+from curryrtoolslib.utils import simulador
+from curryrtoolslib.utils import sintetico
+
+ESCENARIOS = ["captura", "repetidor", "envio"]
+TRAMAS_DISTINTAS = 64
+# Tiempo para que el método abra el puerto: al abrirlo se vacía lo que ya hubiera llegado
+ESPERA_ARRANQUE = 0.5
+
+
+class InterfazMedida(DeviceInterface):
+    """``DeviceInterface`` que avisa al medidor de cada trama que guarda."""
+
+    def __init__(self, medidor: simulador.MedidorCarga, carpeta: str) -> None:
+        super().__init__()
+        self.medidor = medidor
+        self.config = {"dumpsfolder": carpeta, "formatocaptura": "log"}
+
+    def procesar_trama(self, trama: Any, numero: int, baudrate: int, timeout: Any, posiciones: Any = None) -> Any:
+        file_name = super().procesar_trama(trama, numero, baudrate, timeout, posiciones)
+        if file_name:
+            self.medidor.recibida(b"".join(trama[0]))
+        return file_name
+
+
+def ejecutar_hasta_parar(iface: DeviceInterface, metodo: Callable[..., Any], *args: Any) -> Callable[[], None]:
+    """Ejecuta ``metodo`` en un hilo. :return: Función que activa ``iface.parar`` y espera a que termine."""
+    hilo = threading.Thread(target=metodo, args=args, daemon=True)
+    hilo.start()
+    time.sleep(ESPERA_ARRANQUE)
+
+    def parar() -> None:
+        iface.parar.set()
+        hilo.join()
+
+    return parar
+
+
+def escenario_captura(tramas: List[List[bytes]], total: int, baudrate: int, timeout: float, perturbaciones: simulador.Perturbaciones) -> Dict[str, Any]:
+    entrada = simulador.PuertoVirtual()
+    medidor = simulador.MedidorCarga()
+    emulador = simulador.SimuladorTermostato(entrada.extremo(timeout), baudrate, timeout, perturbaciones=perturbaciones, medidor=medidor)
+    carpeta = tempfile.mkdtemp(prefix="curryrtool_carga_")
+    try:
+        iface = InterfazMedida(medidor, carpeta)
+        parar = ejecutar_hasta_parar(iface, iface.read_serial_data, entrada.nombre, baudrate, False, None, timeout)
+        emulador.reproducir(tramas, total)
+        time.sleep(timeout * 4)
+        parar()
+        return dict(medidor.resumen(), emitidas=emulador.contadores)
+    finally:
+        entrada.cerrar()
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+
+def escenario_repetidor(tramas: List[List[bytes]], total: int, baudrate: int, timeout: float, perturbaciones: simulador.Perturbaciones) -> Dict[str, Any]:
+    entrada = simulador.PuertoVirtual()
+    salida = simulador.PuertoVirtual()
+    medidor = simulador.MedidorCarga()
+    emulador = simulador.SimuladorTermostato(entrada.extremo(timeout), baudrate, timeout, perturbaciones=perturbaciones, medidor=medidor)
+    receptor = simulador.ReceptorBus(salida.extremo(timeout), timeout, medidor)
+    try:
+        iface = DeviceInterface()
+        receptor.arrancar()
+        parar = ejecutar_hasta_parar(iface, iface.modo_repetidor, entrada.nombre, salida.nombre, baudrate, timeout)
+        emulador.reproducir(tramas, total)
+        time.sleep(timeout * 6)
+        parar()
+        receptor.detener()
+        return dict(medidor.resumen(), emitidas=emulador.contadores)
+    finally:
+        entrada.cerrar()
+        salida.cerrar()
+
+
+def escenario_envio(tramas: List[List[bytes]], total: int, baudrate: int, timeout: float, perturbaciones: simulador.Perturbaciones) -> Dict[str, Any]:
+    puerto = simulador.PuertoVirtual()
+    medidor = simulador.MedidorCarga()
+    receptor = simulador.ReceptorBus(puerto.extremo(timeout), timeout, medidor)
+    carpeta = tempfile.mkdtemp(prefix="curryrtool_carga_")
+    try:
+        # Las mismas tramas que se emiten en los otros escenarios, como capturas .bin
+        ficheros = [os.path.basename(ruta) for ruta in sintetico.escribir_capturas(carpeta, len(tramas), baudrate=baudrate, timeout=timeout)]
+        iface = DeviceInterface()
+        iface.config = {"dumpsfolder": carpeta}
+        receptor.arrancar()
+        inicio = time.perf_counter()
+        for num in range(total):
+            if not iface.send_data_from(ficheros[num % len(ficheros)], puerto.nombre, baudrate, timeout, ritmo="linea"):
+                continue
+            medidor.esperada(b"".join(tramas[num % len(tramas)]), time.monotonic_ns())
+            # El receptor cierra la trama tras el doble del timeout
+            time.sleep(timeout * 2.5)
+        segundos = time.perf_counter() - inicio
+        time.sleep(timeout * 4)
+        receptor.detener()
+        return dict(medidor.resumen(), segundos_envio=round(segundos, 3))
+    finally:
+        puerto.cerrar()
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+
+def main() -> int:
+    parser = optparse.OptionParser()
+    parser.add_option('-b', '--baudrate', dest='baudrate', help='Baudrate simulado', default="115200")
+    parser.add_option('-t', '--timeout', dest='timeout', help='Silencio en segundos que separa bloques', default="0.01")
+    parser.add_option('-n', '--tramas', dest='tramas', help='Tramas por escenario', default="200")
+    parser.add_option('-e', '--escenarios', dest='escenarios', help='Escenarios separados por comas: %s' % ", ".join(ESCENARIOS), default=",".join(ESCENARIOS))
+    parser.add_option('--perturbaciones', dest='perturbaciones', help='p.ej. ruido=0.05,truncadas=0.02,rafaga=10', default=None)
+    parser.add_option('-j', '--json', dest='json', help='Guardar los resultados en un fichero JSON', default=None)
+    (options, args) = parser.parse_args()
+
+    baudrate, timeout, total = int(options.baudrate), float(options.timeout), int(options.tramas)
+    perturbaciones = simulador.parsear_perturbaciones(options.perturbaciones)
+    tramas = [bloques for bloques, _ in sintetico.generar_tramas(TRAMAS_DISTINTAS)]
+    resultados: Dict[str, Any] = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "baudrate": baudrate,
+        "timeout": timeout,
+        "tramas": total,
+        "perturbaciones": perturbaciones._asdict(),
+        "escenarios": {},
+    }
+
+    for nombre in options.escenarios.split(","):
+        escenario = {"captura": escenario_captura, "repetidor": escenario_repetidor, "envio": escenario_envio}[nombre.strip()]
+        with contextlib.redirect_stdout(io.StringIO()):
+            resultado = escenario(tramas, total, baudrate, timeout, perturbaciones)
+        resultados["escenarios"][nombre] = resultado
+        latencia = resultado.get("latencia_ms")
+        print("%-10s %5s esperadas %5s recibidas %5s perdidas %5s no esperadas %8.2f tramas/s  %s" % (
+            nombre, resultado["esperadas"], resultado["recibidas"], resultado["perdidas"], resultado["no_esperadas"], resultado["tramas_s"],
+            "latencia p50 %(p50).2f ms p99 %(p99).2f ms" % latencia if latencia else ""))
+
+    if options.json:
+        with open(options.json, "w") as fichero:
+            json.dump(resultados, fichero, indent=1)
+        print("Resultados guardados en %s" % options.json)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+#!/usr/bin/python3
+"""
+Benchmarks de los caminos críticos de captura y entrenamiento.
+
+Genera capturas sintéticas (``utils/sintetico.py``) de varios tamaños en una carpeta
+temporal y mide, para cada tamaño, la validación, carga y normalización de tramas,
+la lectura del dataset (en frío y desde la caché), la preparación del ``tf.data``,
+una época de entrenamiento y la predicción por lotes. Sin TensorFlow se mide sólo
+lo que no lo necesita (la predicción con el motor NumPy).
+
+Los resultados se guardan en JSON; con ``-c`` se comparan con los de otra ejecución.
+
+Uso: python3 benchmarks/rendimiento.py [-t 100,1000,10000] [-n repeticiones] [-j resultados.json] [-c anterior.json]
+"""
+import contextlib
+import io
+import json
+import optparse
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from typing import Any, Callable, Dict
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import numpy as np
+
+from curryrtoolslib.interfaces.trainning_interface import TrainningInterface
+from curryrtoolslib.utils import modelo_numpy
+from curryrtoolslib.utils import perezoso
+from curryrtoolslib.utils import sintetico
+from curryrtoolslib.utils import trama as trama_tools
+
+LAYER_SIZE = 79
+CAPAS = [20, 20, 20]
+
+
+def medir(funcion: Callable[[], Any], repeticiones: int, elementos: int) -> Dict[str, float]:
+    """Ejecuta ``funcion`` varias veces sin imprimir nada y resume los tiempos."""
+    tiempos = []
+    for _ in range(repeticiones):
+        with contextlib.redirect_stdout(io.StringIO()):
+            inicio = time.perf_counter()
+            funcion()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+    mediana = statistics.median(tiempos)
+    return {
+        "mediana_ms": round(mediana, 3),
+        "min_ms": round(min(tiempos), 3),
+        "elementos": elementos,
+        "us_por_elemento": round(mediana * 1000 / max(elementos, 1), 3),
+    }
+
+
+def interfaz(carpeta: str, sin_cache: bool) -> TrainningInterface:
+    iface = TrainningInterface()
+    iface.config = {
+        "dumpsfolder": carpeta,
+        "neuronasfirstlayer": str(LAYER_SIZE),
+        "workers": "1",
+        "formatocaptura": "bin",
+        "sincache": sin_cache,  # type: ignore[dict-item]
+        "validacion": "0",
+    }
+    return iface
+
+
+def benchmarks_tamano(carpeta: str, tamano: int, repeticiones: int, con_tf: bool) -> Dict[str, Dict[str, float]]:
+    rutas = sintetico.escribir_capturas(carpeta, tamano)
+    tramas = [bloques for bloques, _ in sintetico.generar_tramas(tamano)]
+    tramas_bytes = [b"".join(bloques) for bloques in tramas]
+    bloques = [(num, list(bloque)) for trama in tramas for num, bloque in enumerate(trama)]
+    resultados: Dict[str, Dict[str, float]] = {}
+
+    resultados["validar_trama_bytes"] = medir(lambda: [trama_tools.validar_trama_bytes(trama) for trama in tramas_bytes], repeticiones, tamano)
+    resultados["cargar_trama_bytes"] = medir(lambda: [trama_tools.cargar_trama_bytes(ruta) for ruta in rutas], repeticiones, tamano)
+    resultados["normalizar_bloque"] = medir(lambda: [trama_tools.normalizar_bloque(num, datos) for num, datos in bloques], repeticiones, len(bloques))
+    resultados["normalizar_tramas"] = medir(lambda: trama_tools.normalizar_tramas(tramas, LAYER_SIZE), repeticiones, tamano)
+    resultados["leer_fichero"] = medir(lambda: [interfaz(carpeta, False).leer_fichero(ruta) for ruta in rutas], repeticiones, tamano)
+    resultados["recoger_arrays_frio"] = medir(lambda: interfaz(carpeta, True).recoger_arrays(), repeticiones, tamano)
+    resultados["recoger_arrays_cache"] = medir(lambda: interfaz(carpeta, False).recoger_arrays(), repeticiones, tamano)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        datos, resultados_esperados = interfaz(carpeta, False).recoger_arrays()
+        datos, resultados_esperados = np.asarray(datos), np.asarray(resultados_esperados)
+
+    capas = []
+    entradas = LAYER_SIZE
+    rng = np.random.default_rng(0)
+    for neuronas in CAPAS + [1]:
+        capas.append((rng.normal(size=(entradas, neuronas)), np.zeros(neuronas), "relu" if neuronas != 1 else "sigmoid"))
+        entradas = neuronas
+    modelo_np = modelo_numpy.ModeloNumpy(capas, (1, LAYER_SIZE))
+    resultados["predecir_numpy"] = medir(lambda: modelo_np.predecir(datos), repeticiones, tamano)
+
+    if con_tf:
+        from curryrtoolslib.utils import ia as ia_tools
+
+        resultados["recoger_dataset"] = medir(lambda: interfaz(carpeta, False).recoger_dataset(), repeticiones, tamano)
+        resultados["crear_dataset"] = medir(lambda: ia_tools.crear_dataset(datos, resultados_esperados), repeticiones, tamano)
+        with contextlib.redirect_stdout(io.StringIO()):
+            modelo = ia_tools.init_modelo(input_schema=(LAYER_SIZE, 1), layers=CAPAS, output_shapes=1)
+            dataset = ia_tools.crear_dataset(datos, resultados_esperados)
+            # La primera época traza el grafo: no se cuenta
+            modelo.fit(dataset, epochs=1, verbose=0)
+        resultados["epoca_entrenamiento"] = medir(lambda: modelo.fit(dataset, epochs=1, verbose=0), repeticiones, tamano)
+        resultados["predecir_keras"] = medir(lambda: ia_tools.predecir(datos, modelo), repeticiones, tamano)
+
+    shutil.rmtree(carpeta, ignore_errors=True)
+    return resultados
+
+
+def comparar(resultados: Dict[str, Any], anterior: Dict[str, Any]) -> None:
+    print("\n# COMPARACIÓN con %s" % anterior.get("fecha", "la ejecución anterior"))
+    for tamano, medidas in resultados["tamanos"].items():
+        medidas_anteriores = anterior.get("tamanos", {}).get(tamano, {})
+        for nombre, medida in medidas.items():
+            if nombre not in medidas_anteriores:
+                continue
+            antes = medidas_anteriores[nombre]["mediana_ms"]
+            ratio = medida["mediana_ms"] / antes if antes else 0.0
+            print("  %7s %-24s %10.3f ms -> %10.3f ms  x%.2f%s" % (
+                tamano, nombre, antes, medida["mediana_ms"], ratio, "  MÁS LENTO" if ratio > 1.1 else ""))
+
+
+def main() -> int:
+    parser = optparse.OptionParser()
+    parser.add_option('-t', '--tamanos', dest='tamanos', help='Tramas del dataset sintético, separadas por comas', default="100,1000,10000")
+    parser.add_option('-n', '--repeticiones', dest='repeticiones', help='Ejecuciones por medida', default="5")
+    parser.add_option('-j', '--json', dest='json', help='Guardar los resultados en un fichero JSON', default=None)
+    parser.add_option('-c', '--comparar', dest='comparar', help='Comparar con los resultados JSON de otra ejecución', default=None)
+    parser.add_option('--sin-tf', dest='sintf', help='No medir lo que necesita TensorFlow', action="store_true", default=False)
+    (options, args) = parser.parse_args()
+
+    con_tf = not options.sintf and perezoso.ModuloPerezoso("tensorflow").disponible()
+    resultados: Dict[str, Any] = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "tensorflow": con_tf,
+        "cpus": os.cpu_count(),
+        "tamanos": {},
+    }
+    if not con_tf:
+        print("Sin TensorFlow: se omiten recoger_dataset, crear_dataset, la época de entrenamiento y predecir_keras")
+
+    for tamano in [int(tamano) for tamano in options.tamanos.split(",")]:
+        carpeta = tempfile.mkdtemp(prefix="curryrtool_bench_")
+        medidas = benchmarks_tamano(carpeta, tamano, int(options.repeticiones), con_tf)
+        resultados["tamanos"][str(tamano)] = medidas
+        print("\n# %s TRAMAS" % tamano)
+        for nombre, medida in medidas.items():
+            print("  %-24s mediana %10.3f ms  min %10.3f ms  %9.3f us/elemento" % (nombre, medida["mediana_ms"], medida["min_ms"], medida["us_por_elemento"]))
+
+    if options.comparar:
+        with open(options.comparar, "r") as fichero:
+            comparar(resultados, json.load(fichero))
+    if options.json:
+        with open(options.json, "w") as fichero:
+            json.dump(resultados, fichero, indent=1)
+        print("Resultados guardados en %s" % options.json)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,7 @@
-from curryrtoolslib.utils.config import ConfigurationManager
+from curryrtoolslib.utils.config import ConfigurationManager, ConfiguracionPerezosa
 
 __version__ = 0.1
 
-CONFIG = ConfigurationManager()
+CONFIG: ConfigurationManager = ConfiguracionPerezosa() # type: ignore[assignment]
 
 
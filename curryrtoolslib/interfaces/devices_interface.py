@@ -1,5 +1,13 @@
 from . common_interface import CommonInterface
 from .. utils import trama as trama_tools
+from .. utils.lector import LectorTramas, Trama
+from .. utils.captura import CapturaPipeline, ColaEscritura, POLITICAS_COLA
+from .. utils import estadisticas
+from .. utils import envio
+from .. utils.cambios import FiltroCambios
+from .. utils import registro
+from .. utils.registro import EscritorRegistro
+from .. utils.metricas import RegistroMetricas, ExportadorMetricas
 from .. import CONFIG
 import serial # type: ignore[import]
 from datetime import datetime
@@ -7,8 +15,11 @@ import time
 import sys
 import os
 import traceback
+import threading
+import contextlib
 import optparse
 import codecs
+import itertools
 
 
 from typing import List, Union, Optional, Tuple, Dict, Union
@@ -16,13 +27,23 @@ from typing import List, Union, Optional, Tuple, Dict, Union
 class DeviceInterface(CommonInterface):
 
     valid_sizes: List[int]
+    registro: Optional[EscritorRegistro]
+    filtro: Optional[FiltroCambios]
+    metricas: Optional[RegistroMetricas]
+    exportador: Optional[ExportadorMetricas]
 
     def __init__(self):
         super().__init__()
+        self.registro = None
+        self.filtro = None
+        self.metricas = None
+        self.exportador = None
+        # Activándolo desde otro hilo terminan read, repeat y la captura en curso como con Ctrl+C
+        self.parar = threading.Event()
 
     def parse_args(self, custom_argv: Optional[List[str]] = None) -> bool:
         parser = optparse.OptionParser()
-        parser.add_option('-p', '--port', dest='port', help='Puerto de comunicacion')
+        parser.add_option('-p', '--port', dest='port', help='Puerto de comunicacion (se puede repetir en read para leer varios puertos)', action="append")
         parser.add_option('-b', '--baudrate', dest='baudrate', help='Baudrate')
         parser.add_option('-t', '--timeout', dest='timeout', help='Timeout')
         parser.add_option('-d', '--dumpsfolder', dest='dumpsfolder', help='Carpeta de dumps')
@@ -32,8 +53,43 @@ class DeviceInterface(CommonInterface):
         parser.add_option('-o', '--posiciones', dest='posiciones', help='Posiciones de los modulos')
         parser.add_option('-r', '--portsalida', dest='portsalida', help='Puerto de salida')
         parser.add_option('-i', '--interval', dest='intervalo', help='Tiempo de envio entre tramas')
+        parser.add_option('-c', '--cola', dest='cola', help='Tramas en cola entre lectura y escritura (0 = sin hilos)', default="64")
+        parser.add_option('--escritores', dest='escritores', help='Hilos escritores de la captura', default="1")
+        parser.add_option('--politica-cola', dest='politicacola', help='Con la cola llena: %s' % ", ".join(POLITICAS_COLA), default="descartar_antigua")
+        parser.add_option('--ritmo', dest='ritmo', help='Espera entre bloques al enviar: fijo:<segundos>, original o linea', default=envio.RITMO_DEFECTO)
+        parser.add_option('--solo-cambios', dest='solocambios', help='En read, guarda sólo las tramas que cambian y cuenta las repeticiones', action="store_true", default=False)
+        parser.add_option('--archivar', dest='archivar', help='En repeat, guarda también las tramas reenviadas', action="store_true", default=False)
+        parser.add_option('--formato', dest='formatocaptura', help='Formato de captura: bin (un .bin/.info por trama) o log (segmentos .clog)')
+        parser.add_option('--segmento-mb', dest='segmentomb', help='Tamaño máximo de cada segmento .clog en MB', default="8")
+        parser.add_option('--modelo', dest='modelfile', help='En monitor, modelo para decodificar el estado (.keras o .npz)', default=None)
+        parser.add_option('--tabla', dest='tabla', help='En monitor, tabla de estados que se consulta antes que el modelo', default=None)
+        parser.add_option('--json', dest='json', help='En monitor, escribe cada cambio de estado como una línea JSON', action="store_true", default=False)
+        parser.add_option('--sinteticas', dest='sinteticas', help='En simular, número de tramas sintéticas distintas en lugar de las de -f', default=None)
+        parser.add_option('--tramas', dest='tramassim', help='En simular, tramas a emitir (0: hasta Ctrl+C)', default="0")
+        parser.add_option('--perturbaciones', dest='perturbaciones', help='En simular, p.ej. ruido=0.05,truncadas=0.02,rafaga=10', default=None)
+        parser.add_option('--metricas', dest='metricas', help='En read, repeat y write, exporta métricas a un fichero .prom o por HTTP (http://127.0.0.1:9100 o :9100)', default=None)
+        parser.add_option('--metricas-intervalo', dest='metricasintervalo', help='Segundos entre escrituras del fichero de métricas', default="10")
+        parser.add_option('--segmento-min', dest='segmentomin', help='Minutos antes de rotar a un segmento .clog nuevo', default="60")
         
         (options, args) = parser.parse_args(custom_argv)
+        options.puertos = options.port or []
+        options.port = options.puertos[0] if options.puertos else None
+        try:
+            # Sin esperar a abrir el puerto para enterarse de que el ritmo no vale
+            envio.Ritmo(options.ritmo, 0, 0)
+        except Exception as e:
+            parser.error(str(e))
+        if len(options.puertos) > 1:
+            # La lectura de varios puertos va por motor_async, que no tiene estas opciones
+            opciones = [
+                ("--solo-cambios", options.solocambios),
+                ("--escritores", options.escritores != "1"),
+                ("--politica-cola", options.politicacola != "descartar_antigua"),
+                ("--metricas", options.metricas),
+            ]
+            ignoradas = [nombre for nombre, usada in opciones if usada]
+            if ignoradas:
+                parser.error("%s no se puede usar con varios -p" % ", ".join(ignoradas))
         return self.load_config(options)
                
     def execute_actions(self):
@@ -42,7 +98,7 @@ class DeviceInterface(CommonInterface):
         """
         if len(sys.argv) < 3:
             print("Uso: %s device <action>" % sys.argv[0])
-            print("Acciones válidas: menu, read, write")
+            print("Acciones válidas: menu, read, write, repeat, convertir, monitor, simular")
             sys.exit(1)
 
         action = sys.argv[2]
@@ -51,7 +107,7 @@ class DeviceInterface(CommonInterface):
         elif action == "read":
 
             if not self.check_not_null(['port','baudrate','timeout','posiciones']):
-                print("Uso: %s device read -p <port> -b <baudrate> -t <timeout> -o <posiciones>" % sys.argv[0])
+                print("Uso: %s device read -p <port> -b <baudrate> -t <timeout> -o <posiciones> [--metricas <fichero.prom|:puerto>]" % sys.argv[0])
                 sys.exit(1)
 
             port = self.config['port']
@@ -59,11 +115,17 @@ class DeviceInterface(CommonInterface):
             timeout = self.config['timeout']
             posiciones = self.config['posiciones']
             save_to_file = str(self.config['savefile']).lower() in ["s","true"]
-            self.read_serial_data(port=port, baudrate=int(baudrate), timeout=float(timeout), posiciones=posiciones, save_to_file=save_to_file)
+            if len(self.config['puertos']) > 1:
+                self.read_serial_data_multi(puertos=self.config['puertos'], baudrate=int(baudrate), timeout=float(timeout), posiciones=posiciones, save_to_file=save_to_file, # type: ignore[arg-type]
+                                            tamano_cola=int(self.config['cola']))
+                return
+            self.read_serial_data(port=port, baudrate=int(baudrate), timeout=float(timeout), posiciones=posiciones, save_to_file=save_to_file,
+                                  tamano_cola=int(self.config['cola']), escritores=int(self.config['escritores']), politica=self.config['politicacola'],
+                                  solo_cambios=bool(self.config['solocambios']))
         elif action == "write":
 
             if not self.check_not_null(['port','baudrate','timeout','tramafile','repeticionesenvio','intervalo']):
-                print("Uso: %s device write -p <port> -b <baudrate> -t <timeout> -f <file_name> -r <repeticiones> -i <intervalo>" % sys.argv[0])
+                print("Uso: %s device write -p <port> -b <baudrate> -t <timeout> -f <file_name> -r <repeticiones> -i <intervalo> [--ritmo fijo:<seg>|original|linea] [--metricas <fichero.prom|:puerto>]" % sys.argv[0])
                 sys.exit(1)
 
             port = self.config['port']
@@ -74,11 +136,12 @@ class DeviceInterface(CommonInterface):
             repeticiones = self.config['repeticionesenvio']
             intervalo = self.config['intervalo']
 
-            self.enviar_trama(port=port, baudrate=int(baudrate), timeout=float(timeout), file_name=file_name, repeticiones=int(repeticiones), intervalo=int(intervalo))
+            self.enviar_trama(port=port, baudrate=int(baudrate), timeout=float(timeout), file_name=file_name, repeticiones=int(repeticiones), intervalo=int(intervalo),
+                              ritmo=self.config['ritmo'])
         
         elif action == "repeat":
             if not self.check_not_null(['port','baudrate','timeout','portsalida']):
-                print("Uso: %s device repeat -p <port> -r <port_salida> -b <baudrate> -t <timeout>" % sys.argv[0])
+                print("Uso: %s device repeat -p <port> -r <port_salida> -b <baudrate> -t <timeout> [--archivar] [--metricas <fichero.prom|:puerto>]" % sys.argv[0])
                 sys.exit(1)
 
             port = self.config['port']
@@ -86,41 +149,64 @@ class DeviceInterface(CommonInterface):
             baudrate = self.config['baudrate']
             timeout = self.config['timeout']
 
-            self.modo_repetidor(port=port, port_salida=port_salida, baudrate=int(baudrate), timeout=float(timeout))
+            self.modo_repetidor(port=port, port_salida=port_salida, baudrate=int(baudrate), timeout=float(timeout),
+                                tamano_cola=int(self.config['cola']), politica=self.config['politicacola'], archivar=bool(self.config['archivar']))
+        elif action == "convertir":
+            if not self.check_not_null(['dumpsfolder']):
+                print("Uso: %s device convertir -d <dumpsfolder>" % sys.argv[0])
+                sys.exit(1)
+
+            self.convertir_dumps(self.config['dumpsfolder'])
+        elif action == "monitor":
+            if not self.check_not_null(['port','baudrate','timeout','modelfile']):
+                print("Uso: %s device monitor -p <port> -b <baudrate> -t <timeout> --modelo <file> [--tabla <file>] [--json]" % sys.argv[0])
+                sys.exit(1)
+
+            self.monitorizar(port=self.config['port'], baudrate=int(self.config['baudrate']), timeout=float(self.config['timeout']),
+                             nombre_modelo=self.config['modelfile'], salida_json=bool(self.config['json']), nombre_tabla=self.config.get('tabla'))
+        elif action == "simular":
+            if not self.check_not_null(['baudrate','timeout']):
+                print("Uso: %s device simular -b <baudrate> -t <timeout> [-f <file_name> | --sinteticas <n>] [--tramas <n>] [-i <intervalo>] [--perturbaciones ruido=0.05,truncadas=0.02,rafaga=10]" % sys.argv[0])
+                sys.exit(1)
+
+            self.simular(baudrate=int(self.config['baudrate']), timeout=float(self.config['timeout']), file_name=self.config['tramafile'],
+                         sinteticas=int(self.config['sinteticas'] or 0), total=int(self.config['tramassim'] or 0),
+                         intervalo=float(self.config.get('intervalo') or 0), perturbaciones=self.config['perturbaciones'])
         else:
             print("Acción %s no válida." % action)
 
 
-    def enviar_trama(self, port:str, baudrate:int, timeout:Union[float,int], file_name:str, repeticiones:int, intervalo: int = 5):
+    def enviar_trama(self, port:str, baudrate:int, timeout:Union[float,int], file_name:str, repeticiones:int, intervalo: int = 5, ritmo: str = envio.RITMO_DEFECTO):
         """
         Envía una trama de datos a través de un puerto serial específico.
+        Las tramas se cargan una sola vez y se envían por la misma conexión en todas las repeticiones.
 
         :param port: El nombre del puerto serial, por defecto '/dev/ttyUSB0'.
         :param baudrate: La velocidad en baudios, por defecto 2400.
         :param timeout: El tiempo de espera en segundos para la lectura del puerto, por defecto 1 segundo.
         :param file_name: Fichero de contien la trama a enviar
+        :param ritmo: Espera entre bloques: fijo:<segundos>, original o linea.
         """
+        emisor = None
+        self.iniciar_metricas()
         try:
-            
-            print(f"Conectado al puerto {port} con velocidad {baudrate} baudios.")
             i = 0
-            lista_ficheros = []
-            if "_" in file_name:
-                fichero_path = os.path.join(self.config["dumpsfolder"], file_name)
-                lista_ficheros = ["%s.bin" % file_name for file_name in trama_tools.resuelve_nombre_binarios_lista(fichero_path)]
-            else:
-                lista_ficheros.append(file_name)
-
+            lista_ficheros = self.ficheros_envio(file_name)
+            tramas = envio.cargar_tramas_envio([os.path.join(self.config["dumpsfolder"], fichero) for fichero in lista_ficheros])
+            if not tramas:
+                print("No se han encontrado tramas que enviar")
+                return
+            print("Cargadas %s tramas de %s fichero/s" % (len(tramas), len(lista_ficheros)))
 
-            while i < repeticiones:
-                for fichero in lista_ficheros:
-                    print("Enviando trama %s" % fichero)
-                    if not self.send_data_from(fichero, port, baudrate, timeout):
-                        print("Error al enviar trama")
-                        break
-                i += 1
-                print("Trama/s enviada %d/%d. Esperando %s seg. para nuevo envio" % (i,repeticiones, intervalo))
-                time.sleep(intervalo)
+            with serial.Serial(port, baudrate, timeout=timeout) as ser:
+                print(f"Conectado al puerto {port} con velocidad {baudrate} baudios.")
+                emisor = envio.EmisorTramas(ser, envio.Ritmo(ritmo, baudrate, timeout), metricas=self.metricas)
+                while i < repeticiones:
+                    emisor.enviar(tramas)
+                    i += 1
+                    print("Trama/s enviada %d/%d. Esperando %s seg. para nuevo envio" % (i,repeticiones, intervalo))
+                    if i < repeticiones:
+                        time.sleep(intervalo)
                     
             print("Fin.")
 
@@ -131,25 +217,131 @@ class DeviceInterface(CommonInterface):
         except Exception as e:
             print(f"Ocurrió un error inesperado: {e}")
             print(traceback.format_exc())
+        finally:
+            if emisor:
+                emisor.mostrar_resumen()
+            self.terminar_metricas()
+
+    def ficheros_envio(self, file_name: str) -> List[str]:
+        """Ficheros de -f: un segmento .clog (o registro), una lista dump_list_*.json o cambios_*.json o un .bin."""
+        if registro.es_segmento(file_name.split("#")[0]):
+            return [file_name]
+        if "_" in file_name:
+            fichero_path = os.path.join(self.config["dumpsfolder"], file_name)
+            binarios = ["%s.bin" % nombre for nombre in trama_tools.resuelve_nombre_binarios_lista(fichero_path)]
+            return binarios + trama_tools.resuelve_registros_lista(fichero_path)
+        return [file_name]
+
+    def simular(self, baudrate: int, timeout: float, file_name: str, sinteticas: int = 0, total: int = 0, intervalo: float = 0.0, perturbaciones: Optional[str] = None):
+        """
+        Termostato virtual: emite tramas por un pseudoterminal como si fuera el adaptador RS485.
 
-    def modo_repetidor(self, port: str, port_salida: str, baudrate: int, timeout:Union[float,int]):
+        Crea dos puertos: por la entrada emite las tramas (para read, repeat o monitor) y por
+        la salida escucha lo que le llega (para write o el puerto de salida de repeat), midiendo
+        cuántas tramas vuelven, cuántas se pierden y con qué latencia.
+
+        :param file_name: Tramas grabadas a reproducir, si no se piden sintéticas.
+        :param sinteticas: Número de tramas sintéticas distintas.
+        :param total: Tramas a emitir; 0 hasta Ctrl+C.
+        :param intervalo: Segundos mínimos entre tramas.
+        :param perturbaciones: Ruido, tramas cortadas y ráfagas (ver simulador.parsear_perturbaciones).
+        """
+        from .. utils import simulador
+        from .. utils import sintetico
+
+        if sinteticas:
+            tramas = [bloques for bloques, _ in sintetico.generar_tramas(sinteticas)]
+        else:
+            rutas = [os.path.join(self.config["dumpsfolder"], fichero) for fichero in self.ficheros_envio(file_name)]
+            tramas = [[bloque for bloque, _ in trama] for trama in envio.cargar_tramas_envio(rutas)]
+        if not tramas:
+            print("No se han encontrado tramas que emitir")
+            return
+
+        entrada = simulador.PuertoVirtual()
+        salida = simulador.PuertoVirtual()
+        medidor = simulador.MedidorCarga()
+        emulador = simulador.SimuladorTermostato(entrada.extremo(timeout), baudrate, timeout, intervalo=intervalo,
+                                                 perturbaciones=simulador.parsear_perturbaciones(perturbaciones), medidor=medidor)
+        receptor = simulador.ReceptorBus(salida.extremo(timeout), timeout, medidor)
+        parar = threading.Event()
+        print("Termostato virtual a %s baudios con %s tramas distintas" % (baudrate, len(tramas)))
+        print("  Entrada (read, repeat -p, monitor): %s" % entrada.nombre)
+        print("  Salida  (write, repeat -r):         %s" % salida.nombre)
+        try:
+            receptor.arrancar()
+            hilo = emulador.arrancar(tramas, total, parar)
+            while hilo.is_alive():
+                hilo.join(0.5)
+            # Tiempo para que lleguen las últimas tramas reenviadas
+            time.sleep(timeout * 4)
+        except KeyboardInterrupt:
+            print("Simulación interrumpida por el usuario.")
+        finally:
+            parar.set()
+            receptor.detener()
+            emulador.mostrar_resumen()
+            medidor.mostrar_resumen("BUS DE SALIDA")
+            entrada.cerrar()
+            salida.cerrar()
+
+    def modo_repetidor(self, port: str, port_salida: str, baudrate: int, timeout:Union[float,int], tamano_cola: int = 64, politica: str = "descartar_antigua", archivar: bool = False):
         """
         Repite la lectura de datos desde un puerto serial específico.
+        Cada bloque se reenvía desde memoria al puerto de salida en cuanto se cierra;
+        los dos puertos se mantienen abiertos durante toda la sesión.
 
         :param port: El nombre del puerto serial, por defecto '/dev/ttyUSB0'.
+        :param port_salida: El nombre del puerto serial de salida.
         :param baudrate: La velocidad en baudios, por defecto 2400.
         :param timeout: El tiempo de espera en segundos para la lectura del puerto, por defecto 1 segundo.
-        :param send_data: Si es True, envía datos al puerto serial.
+        :param tamano_cola: Tramas pendientes de archivar.
+        :param politica: Qué hacer con la cola de archivo llena (ver captura.POLITICAS_COLA).
+        :param archivar: Si es True, valida y guarda las tramas en segundo plano.
         """
+        latencias: List[float] = []
+        archivo: Optional[ColaEscritura] = None
+        metricas = self.iniciar_metricas()
+        reenviadas = metricas.contador("tramas_reenviadas_total", "Tramas reenviadas al puerto de salida")
+        latencia_reenvio = metricas.histograma("latencia_reenvio_segundos", "Desde el último byte recibido de la trama hasta su reenvío")
         try:
-            with serial.Serial(port, baudrate, timeout=timeout) as ser:
+            if archivar:
+                self.abrir_registro()
+            with serial.Serial(port, baudrate, timeout=timeout) as ser, serial.Serial(port_salida, baudrate, timeout=timeout) as ser_salida:
                 print(f"Conectado al puerto {port} con velocidad {baudrate} baudios.") 
-
-                while True:
-                    file_name = self.read_data_from(ser,baudrate,timeout)
-                    if not self.send_data_from("%s.bin" % file_name, port_salida, baudrate, timeout):
-                        print("Error al enviar trama")   
+                print(f"Reenviando al puerto {port_salida}.")
+
+                ultimo_envio = [0]
+                def reenviar(bloque: bytes, ultimo_ns: int) -> None:
+                    ser_salida.write(bloque)
+                    ultimo_envio[0] = time.monotonic_ns() - ultimo_ns
+
+                lector = LectorTramas(ser, silencio_bloque=timeout, al_cerrar_bloque=reenviar)
+                self.metricas_lector(lector)
+                if archivar:
+                    contador = itertools.count()
+                    def guardar(trama: Trama) -> None:
+                        self.procesar_trama(trama, next(contador), baudrate, timeout)
+
+                    archivo = ColaEscritura(guardar, tamano_cola=tamano_cola, escritores=1, politica=politica)
+                    archivo.arrancar()
+                    self.metricas_cola(archivo)
+
+                num = 0
+                while not self.parar.is_set():
+                    trama = lector.leer_trama(parar=self.parar.is_set)
+                    if trama is None:
                         break
+                    total_data = trama[0]
+                    latencia_ms = ultimo_envio[0] / 1e6
+                    latencias.append(latencia_ms)
+                    self.contar_trama_leida(lector, trama)
+                    reenviadas.incrementar()
+                    latencia_reenvio.observar(latencia_ms / 1000)
+                    print("Reenviada trama %s: %s bytes en %s bloques (latencia %.2f ms)" % (num, sum(len(data) for data in total_data), len(total_data), latencia_ms))
+                    if archivo:
+                        archivo.encolar(trama)
+                    num += 1
                     
         except serial.SerialException as e:
             print(f"Error al abrir el puerto serial: {e}")
@@ -157,8 +349,68 @@ class DeviceInterface(CommonInterface):
             print("Lectura interrumpida por el usuario.")
         except Exception as e:
             print(f"Ocurrió un error inesperado: {e}")
+        finally:
+            if archivo:
+                archivo.terminar()
+                archivo.mostrar_resumen()
+            self.cerrar_registro()
+            print("# LATENCIA DE REENVÍO: %s" % estadisticas.resumen_latencias(latencias))
+            self.terminar_metricas()
+
+    def monitorizar(self, port: str, baudrate: int, timeout: Union[float,int], nombre_modelo: str, salida_json: bool = False, nombre_tabla: Optional[str] = None):
+        """
+        Decodifica en vivo el estado del termostato a partir de las tramas del puerto.
+        Las tramas no se guardan: se normalizan en memoria y se pasan por el modelo.
+
+        :param port: El nombre del puerto serial.
+        :param baudrate: La velocidad en baudios.
+        :param timeout: El silencio en segundos que separa bloques.
+        :param nombre_modelo: Modelo .keras o .npz (en la carpeta de modelos o ruta completa).
+        :param salida_json: Si es True, escribe cada cambio como una línea JSON.
+        :param nombre_tabla: Tabla de estados que resuelve las tramas conocidas sin pasar por el modelo.
+        """
+        from .. utils.prediccion import cargar_predictor
+        from .. utils.monitor import MonitorEstado
+        from .. utils.tabla import cargar_decodificador
+
+        predictor = cargar_predictor(nombre_modelo, self.config['modelofolder'])
+        if predictor is None:
+            return
+        layer_size = int(self.config['neuronasfirstlayer'])
+        decodificador = None
+        if nombre_tabla:
+            with contextlib.redirect_stdout(sys.stderr if salida_json else sys.stdout):
+                decodificador = cargar_decodificador(nombre_tabla, self.config['modelofolder'], layer_size, predictor)
+        monitor = MonitorEstado(decodificador or predictor, layer_size, salida_json=salida_json)
+        try:
+            with serial.Serial(port, baudrate, timeout=timeout) as ser:
+                if not salida_json:
+                    print(f"Conectado al puerto {port} con velocidad {baudrate} baudios.")
 
-    def read_serial_data(self, port: str, baudrate: int, save_to_file: bool, posiciones: str, timeout:Union[float,int]):
+                ultimo_byte = [0]
+                def al_cerrar_bloque(bloque: bytes, ultimo_ns: int) -> None:
+                    ultimo_byte[0] = ultimo_ns
+
+                lector = LectorTramas(ser, silencio_bloque=timeout, al_cerrar_bloque=al_cerrar_bloque, parser=trama_tools.ParserTramas())
+                while True:
+                    trama = lector.leer_trama()
+                    if trama:
+                        monitor.procesar(trama[0], trama[1][-1][0][0], ultimo_byte[0])
+
+        except serial.SerialException as e:
+            print(f"Error al abrir el puerto serial: {e}")
+        except KeyboardInterrupt:
+            print("Lectura interrumpida por el usuario.")
+        except Exception as e:
+            print(f"Ocurrió un error inesperado: {e}")
+            traceback.print_exc()
+        finally:
+            monitor.mostrar_resumen()
+            if decodificador:
+                decodificador.mostrar_resumen(sys.stderr if salida_json else None)
+
+    def read_serial_data(self, port: str, baudrate: int, save_to_file: bool, posiciones: str, timeout:Union[float,int], tamano_cola: int = 64, escritores: int = 1, politica: str = "descartar_antigua",
+                         solo_cambios: bool = False):
         """
         Lee y muestra los datos recibidos desde un puerto serial específico.
         Detecta la finalización de un stream de bits y lo guarda en un archivo
@@ -168,9 +420,17 @@ class DeviceInterface(CommonInterface):
         :param baudrate: La velocidad en baudios, por defecto 2400.
         :param timeout: El tiempo de espera en segundos para la lectura del puerto, por defecto 1 segundo.
         :param save_to_file: Si es True, guarda los datos en un archivo de texto.
+        :param tamano_cola: Tramas en cola entre la lectura y la escritura. Con 0 se lee y guarda en el mismo hilo.
+        :param escritores: Número de hilos que validan y guardan las tramas.
+        :param politica: Qué hacer con la cola llena (ver captura.POLITICAS_COLA).
+        :param solo_cambios: Si es True, sólo guarda las tramas distintas de la anterior en su posición.
         """
 
         hex_file : Dict[str, Union[str, int, List[str]]] = {}
+        # (número de lectura, fichero): con varios escritores se guardan en cualquier orden
+        guardados: List[Tuple[int, str]] = []
+        self.filtro = FiltroCambios() if solo_cambios else None
+        self.iniciar_metricas()
         try:
             # Inicializa la conexión serial
             if save_to_file:
@@ -181,10 +441,19 @@ class DeviceInterface(CommonInterface):
                     "posiciones" : posiciones
                 }
 
+            self.abrir_registro()
             with serial.Serial(port, baudrate, timeout=timeout) as ser:
                 print(f"Conectado al puerto {port} con velocidad {baudrate} baudios.")               
                     # Escribe un comentario con la velocidad en baudios en el archivo hexadecimal
-                self.read_data_from(ser,baudrate,timeout,posiciones, hex_file)
+                if tamano_cola > 0:
+                    def guardar(trama: Trama, numero: int) -> None:
+                        file_name = self.procesar_trama(trama, numero, baudrate, timeout, posiciones)
+                        if file_name and hex_file:
+                            guardados.append((numero, file_name))
+
+                    self.capturar_en_paralelo(ser, timeout, guardar, tamano_cola, escritores, politica)
+                else:
+                    self.read_data_from(ser,baudrate,timeout,posiciones, hex_file)
                             
         except serial.SerialException as e:
             print(f"Error al abrir el puerto serial: {e}")
@@ -194,8 +463,84 @@ class DeviceInterface(CommonInterface):
             print(f"Ocurrió un error inesperado: {e}")
             traceback.print_exc()
         finally:
-            if hex_file:
+            if guardados:
+                hex_file["files"] = [file_name for _, file_name in sorted(guardados)]
+            if self.filtro:
+                self.filtro.mostrar_resumen()
+                if hex_file:
+                    hex_file["repeticiones"] = self.filtro.entradas # type: ignore[assignment]
+            if hex_file and not self.registro:
                 trama_tools.crear_lista_json(lista=hex_file, posiciones=posiciones, baudrate=baudrate)        
+            elif hex_file and self.filtro:
+                # Los registros de un segmento no son .bin: fuera de "files", que es lo que leen las listas de dumps
+                hex_file["registros"] = hex_file.pop("files")
+                trama_tools.crear_lista_json(lista=hex_file, posiciones=posiciones, baudrate=baudrate, prefijo="cambios")
+            self.filtro = None
+            self.cerrar_registro()
+            self.terminar_metricas()
+
+    def read_serial_data_multi(self, puertos: List[str], baudrate: int, save_to_file: bool, posiciones: str, timeout:Union[float,int], tamano_cola: int = 64):
+        """
+        Lee varios puertos a la vez desde un único bucle asyncio.
+        Cada puerto tiene su propia salida: su dump_list o sus segmentos .clog.
+
+        :param puertos: Lista de puertos serial a vigilar.
+        :param baudrate: La velocidad en baudios, común a todos los puertos.
+        :param timeout: El silencio en segundos que separa bloques.
+        :param save_to_file: Si es True, guarda las tramas válidas de cada puerto.
+        :param tamano_cola: Tramas pendientes de guardar por puerto.
+        """
+        hex_files: Dict[str, Dict[str, Union[str, int, List[str]]]] = {}
+        registros: Dict[str, EscritorRegistro] = {}
+        contadores: Dict[str, 'itertools.count[int]'] = {}
+        formato_log = str(self.config.get('formatocaptura', 'bin')).lower() == "log"
+        for puerto in puertos:
+            contadores[puerto] = itertools.count()
+            if not save_to_file:
+                continue
+            hex_files[puerto] = {
+                "files" : [],
+                "baudrate" : int(baudrate),
+                "posiciones" : posiciones,
+                "port": puerto
+            }
+            if formato_log:
+                max_bytes = int(float(self.config.get('segmentomb') or 8) * 1024 * 1024)
+                max_segundos = float(self.config.get('segmentomin') or 60) * 60
+                registros[puerto] = EscritorRegistro(self.config['dumpsfolder'], max_bytes=max_bytes, max_segundos=max_segundos,
+                                                     prefijo="captura_%s" % os.path.basename(puerto))
+
+        def guardar(puerto: str, trama: Trama) -> None:
+            total_data, total_times = trama
+            print("[%s] Trama %s: %s bytes en %s bloques" % (puerto, next(contadores[puerto]), sum(len(data) for data in total_data), len(total_data)))
+            if not save_to_file:
+                return
+            if puerto in registros:
+                file_name = registros[puerto].escribir(total_data, total_times, baudrate, timeout, posiciones)
+            else:
+                file_name = trama_tools.guardar_trama_bytes(total_data, total_times, baudrate, timeout, posiciones) # type: ignore[arg-type]
+            hex_files[puerto]["files"].append(file_name) # type: ignore[union-attr]
+
+        try:
+            from .. utils.motor_async import MotorSerieAsync
+
+            motor = MotorSerieAsync(puertos, baudrate, timeout, guardar, tamano_cola=tamano_cola)
+            motor.ejecutar()
+        except serial.SerialException as e:
+            print(f"Error al abrir el puerto serial: {e}")
+        except KeyboardInterrupt:
+            print("Lectura interrumpida por el usuario.")
+        except Exception as e:
+            print(f"Ocurrió un error inesperado: {e}")
+            traceback.print_exc()
+        finally:
+            for puerto, hex_file in hex_files.items():
+                if puerto in registros:
+                    registros[puerto].cerrar()
+                    for ruta in registros[puerto].segmentos:
+                        print(f"Datos de {puerto} guardados en {ruta}")
+                else:
+                    trama_tools.crear_lista_json(lista=hex_file, posiciones=posiciones, baudrate=baudrate, sufijo=os.path.basename(puerto))
 
     def detect_baud_rate(self, port: str, timeout:Union[float,int]):
         """
@@ -330,96 +675,180 @@ class DeviceInterface(CommonInterface):
             print(f"Ocurrió un error inesperado: {e}")
 
 
-    def send_data_from(self, file_name : str, port: str, baudrate: int, timeout: float) -> bool:
+    def send_data_from(self, file_name : str, port: str, baudrate: int, timeout: float, ritmo: str = envio.RITMO_DEFECTO) -> bool:
         try:
-            file_name_path = os.path.join(CONFIG.get("dumpsfolder"), file_name)
+            file_name_path = os.path.join(self.config.get("dumpsfolder") or CONFIG.get("dumpsfolder"), file_name)
             # print("Enviando trama %s" % file_name_path)
-            lista_tramas = trama_tools.cargar_trama_bytes(file_name_path)
-            last_timeout = None
-            ser = serial.Serial(port, baudrate, timeout=timeout)
-            for num, trama in enumerate(lista_tramas):
-                """  print("NUM", num)
-                port = self.config["port"]
-                new_timeout = datetime.strptime(trama["time"], "%Y-%m-%d %H:%M:%S.%f")
-                if last_timeout:
-                    wait_until = new_timeout - last_timeout
-                    wait_until = wait_until.total_seconds()
-                    current_timeout = float(trama["timeout"])
-                    #print("Waiting ...", wait_until)
-                    #print("Timeout ...", current_timeout)
-                    # fixed_waiting = wait_until - current_timeout
-                    fixed_waiting = 0.1
-                    print("Waiting ...", fixed_waiting)
-
-                    time.sleep(fixed_waiting) """
-
-                print("Enviado %s/%s : %s (%s bytes)" % (0, num+1, [hex(val) for val in trama["data"]], len(trama["data"]))) # type: ignore[index]
-                if not ser.is_open:
-                    ser.open()
-                ser.writelines([trama["data"]]) # type: ignore[index]
-                ser.close()
-                time.sleep(0.18)
-
+            tramas = envio.cargar_tramas_envio([file_name_path])
+            if not tramas:
+                return False
+            with serial.Serial(port, baudrate, timeout=timeout) as ser:
+                envio.EmisorTramas(ser, envio.Ritmo(ritmo, baudrate, timeout), metricas=self.metricas).enviar(tramas)
 
             print("OK")
             return True
         except Exception as e:
+            if self.metricas:
+                self.metricas.contador("errores_envio_total", "Envíos que han fallado").incrementar()
             print(f"Ocurrió un error inesperado: {e}")
             print(traceback.format_exc())
             return False
     
+    def abrir_registro(self) -> None:
+        """Abre el registro segmentado si la captura está configurada en formato log."""
+        if str(self.config.get('formatocaptura', 'bin')).lower() != "log":
+            return
+        max_bytes = int(float(self.config.get('segmentomb') or 8) * 1024 * 1024)
+        max_segundos = float(self.config.get('segmentomin') or 60) * 60
+        self.registro = registro.EscritorRegistro(self.config.get('dumpsfolder') or CONFIG.get('dumpsfolder'), max_bytes=max_bytes, max_segundos=max_segundos)
+        print("Formato de captura: segmentos %s" % registro.EXTENSION)
+
+    def cerrar_registro(self) -> None:
+        if self.registro:
+            self.registro.cerrar()
+            for ruta in self.registro.segmentos:
+                print(f"Datos guardados en {ruta}")
+            self.registro = None
+
+    def iniciar_metricas(self) -> RegistroMetricas:
+        """Crea el registro de métricas de la sesión y, si se ha pedido con --metricas, empieza a exportarlo."""
+        self.metricas = RegistroMetricas()
+        destino = self.config.get('metricas')
+        if destino:
+            try:
+                self.exportador = ExportadorMetricas(self.metricas, destino, float(self.config.get('metricasintervalo') or 10))
+                self.exportador.arrancar()
+            except Exception as e:
+                print(f"No se pueden exportar las métricas a {destino}: {e}")
+                self.exportador = None
+        return self.metricas
+
+    def terminar_metricas(self) -> None:
+        if self.exportador:
+            self.exportador.detener()
+            self.exportador = None
+        if self.metricas:
+            self.metricas.mostrar_resumen()
+            self.metricas = None
+
+    def contar_trama_leida(self, lector: LectorTramas, trama: Optional['Trama']) -> None:
+        """Tramas y bytes recibidos y el silencio que separa cada trama de la anterior."""
+        if not self.metricas or not trama:
+            return
+        self.metricas.contador("tramas_leidas_total", "Tramas recibidas del puerto").incrementar()
+        self.metricas.contador("bytes_leidos_total", "Bytes de las tramas recibidas").incrementar(sum(len(bloque) for bloque in trama[0]))
+        if lector.hueco_ns > 0:
+            self.metricas.histograma("hueco_tramas_segundos", "Silencio entre el final de una trama y el principio de la siguiente").observar(lector.hueco_ns / 1e9)
+
+    def metricas_lector(self, lector: LectorTramas) -> None:
+        """
+        Lo que se pierde antes de llegar a las tramas leídas: bytes y tramas que descarta el lector.
+        Las tramas inválidas son las que descarta el lector más las leídas que no pasan la validación.
+        """
+        if not self.metricas:
+            return
+        leidas = self.metricas.contador("tramas_leidas_total", "Tramas recibidas del puerto")
+        rechazadas = self.metricas.contador("tramas_rechazadas_total", "Tramas leídas que no pasan la validación")
+
+        def invalidas() -> float:
+            return lector.tramas_descartadas + rechazadas.valor
+
+        self.metricas.contador("bytes_descartados_total", "Bytes descartados al resincronizar con la cabecera", funcion=lambda: lector.descartados)
+        self.metricas.contador("tramas_invalidas_total", "Tramas con tamaño no válido, cortadas o que no pasan la validación", funcion=invalidas)
+        self.metricas.indicador("proporcion_tramas_invalidas", "Tramas inválidas entre todas las recibidas",
+                                funcion=lambda: invalidas() / max(1.0, leidas.valor + lector.tramas_descartadas))
+
+    def metricas_cola(self, cola: ColaEscritura) -> None:
+        """Profundidad y descartes de la cola entre la lectura y la escritura."""
+        if not self.metricas:
+            return
+        self.metricas.indicador("cola_tramas", "Tramas pendientes de escribir", funcion=cola.cola.qsize)
+        self.metricas.indicador("cola_maxima_tramas", "Profundidad máxima alcanzada por la cola", funcion=lambda: cola.contadores["max_cola"])
+        self.metricas.contador("tramas_descartadas_cola_total", "Tramas descartadas por cola llena", funcion=lambda: cola.contadores["descartadas"])
+        self.metricas.contador("errores_escritura_total", "Errores al procesar tramas de la cola", funcion=lambda: cola.contadores["errores"])
+
+    def convertir_dumps(self, carpeta: str) -> None:
+        """
+        Importa los pares .bin/.info existentes a segmentos .clog en la misma carpeta.
+        Los ficheros originales se conservan.
+        """
+        with registro.EscritorRegistro(carpeta, prefijo="importado") as escritor:
+            importados, omitidos = registro.convertir_dumps(carpeta, escritor)
+        for ruta in escritor.segmentos:
+            print(f"Datos guardados en {ruta}")
+        print("Importadas %s tramas (%s omitidas)" % (importados, omitidos))
+        print("Configura formatocaptura = log para usar los segmentos en lugar de los .bin")
+
+    def procesar_trama(self, trama: 'Trama', numero: int, baudrate: int, timeout: Union[float,int], posiciones: Optional[str] = None) -> Optional[str]:
+        """
+        Muestra, valida y guarda una trama capturada.
+
+        :return: El nombre del fichero guardado o None si la trama no es válida.
+        """
+        total_data, total_times = trama
+        for x, data in enumerate(total_data):
+            print(f"Recibido {numero}/{x+1}: {[hex(val) for val in data]} ({len(data)} bytes)")
+
+        full_data = b"".join(total_data)
+        file_name = None
+        metricas = self.metricas
+        if trama_tools.validar_trama_bytes(list(full_data)): # type: ignore[arg-type]
+            entrada = None
+            if self.filtro:
+                nuevo, entrada = self.filtro.registrar(total_data, total_times[0][0][0])
+                if not nuevo:
+                    print("# TRAMA REPETIDA (%s veces desde %s)" % (entrada["repeticiones"], entrada["primera"]))
+                    if metricas:
+                        metricas.contador("tramas_repetidas_total", "Tramas válidas iguales a la anterior en su posición, no guardadas").incrementar()
+                    return None
+            if self.registro:
+                file_name = self.registro.escribir(total_data, total_times, baudrate, timeout, posiciones) # type: ignore[arg-type]
+            else:
+                file_name = trama_tools.guardar_trama_bytes(total_data, total_times, baudrate, timeout, posiciones) # type: ignore[arg-type]
+            if entrada is not None:
+                entrada["fichero"] = file_name
+            if metricas:
+                metricas.contador("tramas_guardadas_total", "Tramas válidas guardadas").incrementar()
+        elif metricas:
+            metricas.contador("tramas_rechazadas_total", "Tramas leídas que no pasan la validación").incrementar()
+
+        print("# STREAM TERMINADO %s bytes" % (len(full_data)))
+        return file_name
 
     def read_data_from(self, ser, baudrate, timeout, posiciones=None, hex_file: Dict[str, Union[str, int, List[str]]] = {}) -> Optional[str]:
-        stream_data: Tuple[bytes, List[str]] = [] # type: ignore[assignment]
+        lector = LectorTramas(ser, silencio_bloque=timeout, parser=trama_tools.ParserTramas())
+        self.metricas_lector(lector)
         i = 0
         print("## ESPERANDO TRAMA %s" % i)
-        x = 0
-        tiempos_trama = []
-        while True:
-            data = b""
-            while True:
-                tiempo_inicio = datetime.now()
-                new_data = ser.read(1)
-                tiempos_trama.append(str(tiempo_inicio))
-                if new_data:
-                    data += new_data
+        while not self.parar.is_set():
+            trama = lector.leer_trama(parar=self.parar.is_set)
+            if trama is None:
+                break
+            self.contar_trama_leida(lector, trama)
+            file_name = self.procesar_trama(trama, i, baudrate, timeout, posiciones)
+            if file_name:
+                if hex_file:
+                    hex_file["files"].append(file_name) # type: ignore[union-attr]
                 else:
-                    break
-                
-            valid = True
-            if data:
-                if x == 0:
-                    tiempos_trama = [tiempos_trama[-1]]
-                stream_data.append([data, tiempos_trama]) # type: ignore[attr-defined]
-                tiempos_trama = []
-                print(f"Recibido {i}/{x+1}: {[hex(val) for val in data]} ({len(data)} bytes)")
-                #print(f"Recibido {i}/{x+1}: {[val for val in data]} ({len(data)} bytes)")
-                #print(f"Recibido {i}/{x+1}: {[chr(val) for val in data]} ({len(data)} bytes)")
-                x+=1
-            else:
-                if not stream_data:
-                    continue
-                total_data = []
-                total_times = []
-                full_data = [] # type: ignore[var-annotated]
-                for byte_, time_ in stream_data:
-                    total_data.append(byte_)
-                    total_times.append([time_, len(byte_)]) # type: ignore [arg-type]
-                    full_data += byte_ # type: ignore[arg-type]
-
-                valid = trama_tools.validar_trama_bytes(full_data)
-                if valid:
-                    file_name = trama_tools.guardar_trama_bytes(total_data, total_times, baudrate, timeout, posiciones) # type: ignore[arg-type]
-                    if hex_file:
-                        hex_file["files"].append(file_name) # type: ignore[union-attr]
-                    else:
-                        return file_name
-                stream_data = [] # type: ignore[assignment]
-                
-                print("# STREAM TERMINADO %s bytes" % (len(full_data)))
-                i+= 1
-                x= 0
-                print("## ESPERANDO TRAMA %s" % i)
+                    return file_name
+
+            i+= 1
+            print("## ESPERANDO TRAMA %s" % i)
+        return None
+
+    def capturar_en_paralelo(self, ser, timeout: Union[float,int], consumidor, tamano_cola: int, escritores: int, politica: str) -> None:
+        """
+        Captura con un hilo lector dedicado y hilos escritores separados por una cola acotada.
+
+        :param consumidor: Recibe la trama y su número de orden; se ejecuta en los hilos escritores.
+        """
+        lector = LectorTramas(ser, silencio_bloque=timeout, parser=trama_tools.ParserTramas())
+        self.metricas_lector(lector)
+        pipeline = CapturaPipeline(lector, consumidor, tamano_cola=tamano_cola, escritores=escritores, politica=politica,
+                                   al_leer=lambda trama: self.contar_trama_leida(lector, trama), parar=self.parar)
+        self.metricas_cola(pipeline.escritura)
+        print("## CAPTURA EN PARALELO (cola %s, %s escritor/es, política %s)" % (tamano_cola, escritores, politica))
+        pipeline.ejecutar()
 
 def main_menu(iface: 'DeviceInterface'):
     while True:
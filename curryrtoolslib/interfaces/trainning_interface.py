@@ -1,15 +1,34 @@
 from . common_interface import CommonInterface
 from .. import CONFIG
-from .. utils import ia as ia_tools
 from .. utils import trama as trama_tools
-from .. utils import graphics
+from .. utils import registro
+from .. utils.perezoso import ModuloPerezoso
 from datetime import datetime
 import optparse
+import contextlib
+import importlib.util
+import io
 import sys
 import os
-
-
-from typing import List, Union, Optional, Any,TYPE_CHECKING, Tuple
+import time
+import random
+import tempfile
+
+# Se importan al usarlos: TensorFlow, matplotlib y NumPy son lo más lento del arranque.
+# Sin TensorFlow sólo se puede predecir con modelos NumPy (.npz)
+ia_tools = ModuloPerezoso("curryrtoolslib.utils.ia")
+graphics = ModuloPerezoso("curryrtoolslib.utils.graphics")
+ingesta = ModuloPerezoso("curryrtoolslib.utils.ingesta")
+prediccion = ModuloPerezoso("curryrtoolslib.utils.prediccion")
+servidor_tools = ModuloPerezoso("curryrtoolslib.utils.servidor")
+cache_tools = ModuloPerezoso("curryrtoolslib.utils.cache")
+modelo_numpy = ModuloPerezoso("curryrtoolslib.utils.modelo_numpy")
+tabla_tools = ModuloPerezoso("curryrtoolslib.utils.tabla")
+barrido = ModuloPerezoso("curryrtoolslib.utils.barrido")
+np = ModuloPerezoso("numpy")
+
+
+from typing import List, Union, Optional, Any,TYPE_CHECKING, Tuple, Dict, Callable
 
 if TYPE_CHECKING:
     from tensorflow.python.data.ops.dataset_ops import DatasetV2 # type: ignore[import]
@@ -26,16 +45,43 @@ class TrainningInterface(CommonInterface):
         parser.add_option('-d', '--dumpsfolder', dest='dumpsfolder', help='Carpeta de dumps')
         parser.add_option('-m', '--model_file', dest='modelfile', help='Archivo del modelo', default=None)
         parser.add_option('-f', '--file_name', dest='tramafile', help='Archivo con trama o lista de tramas', default=None)
-        parser.add_option('-l', '--layers', dest='layers', help='Capas', default="20,20,20")
+        parser.add_option('-l', '--layers', dest='layers', help='Capas (en sweep, varias separadas por ";")', default="20,20,20")
         parser.add_option('-e', '--epocs', dest='epocs', help='Epocas', default="10000")
         parser.add_option('-s', '--savefile', dest='savefile', help='Guardar archivo del modelo entrenado', action="store_true", default=True)
-        parser.add_option('-o', '--opt', dest='optimizado', help='Afinado', default="0.001")
+        parser.add_option('-o', '--opt', dest='optimizado', help='Afinado (en sweep, varios separados por comas)', default="0.001")
         parser.add_option('-n', '--neuronas_fisrt_layer', dest='neuronasfirstlayer', help='Neuronas first layer')
+        parser.add_option('--formato', dest='formatocaptura', help='Formato de las capturas: bin (dump_list_*.json) o log (segmentos .clog)')
+        parser.add_option('-w', '--workers', dest='workers', help='Procesos para cargar las capturas', default=str(os.cpu_count() or 1))
+        parser.add_option('--lote', dest='tamanolote', help='Muestras por lote de entrenamiento o peticiones por lote del servidor', default=None)
+        parser.add_option('--buffer-shuffle', dest='buffershuffle', help='Tamaño del buffer para barajar (0: todo el dataset)', default="0")
+        parser.add_option('--salida', dest='salida', help='Guardar las predicciones en un fichero .csv o .json', default=None)
+        parser.add_option('--bloque-prediccion', dest='bloqueprediccion', help='Tramas por pasada de la red al predecir', default=None)
+        parser.add_option('--socket', dest='socket', help='Socket Unix donde escucha serve (por defecto stdin/stdout)', default=None)
+        parser.add_option('--espera-lote', dest='esperalote', help='Milisegundos que serve espera para agrupar peticiones', default=None)
+        parser.add_option('--tabla', dest='tabla', help='Tabla de estados: en tabla, fichero a crear; en predecir y serve, se consulta antes que el modelo', default=None)
+        parser.add_option('--hilos-tf', dest='hilostf', help='Hilos de TensorFlow por operación (en sweep, por proceso; por defecto se reparten los núcleos entre --procesos-barrido)', default=None)
+        parser.add_option('--perfil', dest='perfil', help='Perfil de rendimiento al entrenar: defecto, cpu o cpu-compartida', default=None)
+        parser.add_option('--hilos-inter', dest='hilosinter', help='Operaciones de TensorFlow en paralelo al entrenar', default=None)
+        parser.add_option('--pasos-ejecucion', dest='pasosejecucion', help='Lotes por llamada a la función de entrenamiento (steps_per_execution)', default=None)
+        parser.add_option('--sin-jit', dest='sinjit', help='Entrena sin compilar el modelo con XLA aunque el perfil lo haga', action="store_true", default=False)
+        parser.add_option('--procesos-barrido', dest='procesosbarrido', help='En sweep, candidatos que se entrenan a la vez', default="1")
+        parser.add_option('--conservar', dest='conservar', help='En sweep, modelos que se conservan (los mejores)', default="1")
+        parser.add_option('--validacion', dest='validacion', help='Fracción de las tramas para validar y decidir la parada temprana (por defecto ninguna; en sweep 0.1)', default=None)
+        parser.add_option('--paciencia', dest='paciencia', help='Épocas sin mejorar antes de parar (por defecto sin parada temprana)', default=None)
+        parser.add_option('--checkpoint-cada', dest='checkpointcada', help='Épocas entre checkpoints en la carpeta de modelos (0: sin checkpoints)', default=None)
+        parser.add_option('--reanudar', dest='reanudar', help='Continúa el entrenamiento desde el último checkpoint', action="store_true", default=False)
+        parser.add_option('--sin-cache', dest='sincache', help='Reconstruir el dataset ignorando la caché', action="store_true", default=False)
         (options, args) = parser.parse_args(custom_argv)
         return self.load_config(options)
                
     def execute_actions(self) -> None:
         action = sys.argv[2]
+        # sweep sólo usa TensorFlow en los procesos del barrido: basta con saber que está instalado
+        if action == "sweep" and importlib.util.find_spec("tensorflow") is None or \
+                action in ["pesos", "entrenar", "exportar", "paridad"] and not ia_tools.disponible():
+            print("La acción %s necesita TensorFlow, que no está instalado" % action)
+            sys.exit(1)
+
         if action == "pesos":
             
             if not self.check_not_null(['modelfile']):
@@ -55,94 +101,253 @@ class TrainningInterface(CommonInterface):
             nombre_modelo = self.config['modelfile']
             epocas = int(self.config['epocs'])
 
-            modelo = ia_tools.load_modelo(nombre_modelo, self.config['modelofolder']) if nombre_modelo else self.crear_modelo()
-
-            datos = self.recoger_dataset()
-
-
-            result = ia_tools.entrenar_datos(datos=datos, epocas=epocas, num_datos=len(datos), modelo=modelo)
+            # Los hilos se fijan antes de que TensorFlow ejecute nada
+            perfil = self.perfil_rendimiento()
+            ia_tools.configurar_hilos(perfil["hilos_intra"], perfil["hilos_inter"])
+
+            estado = None
+            if self.config.get('reanudar'):
+                estado = ia_tools.ultimo_checkpoint(self.config['modelofolder'])
+                if not estado:
+                    print("No hay checkpoints que reanudar en %s" % os.path.join(self.config['modelofolder'], ia_tools.CARPETA_CHECKPOINTS))
+                    sys.exit(1)
+                print("Reanudando %s (época %s)" % (estado["modelo"], estado["epoca"]))
+                modelo = ia_tools.load_modelo(estado["modelo"], os.path.dirname(estado["modelo"]))
+            else:
+                modelo = ia_tools.load_modelo(nombre_modelo, self.config['modelofolder']) if nombre_modelo else self.crear_modelo()
+            if not modelo:
+                sys.exit(1)
+            ia_tools.aplicar_perfil(modelo, perfil)
+
+            semilla = estado["semilla"] if estado else random.randrange(2 ** 31)
+            datos, validacion, muestras = self.recoger_dataset(semilla, perfil["tamano_lote"])
+            control = ia_tools.ControlEntrenamiento(
+                self.config['modelofolder'],
+                paciencia=int(self.config.get('paciencia') or ia_tools.PACIENCIA),
+                cada=int(self.config.get('checkpointcada') or ia_tools.CHECKPOINT_CADA),
+                estado=estado, monitor="val_loss" if validacion is not None else "loss", semilla=semilla,
+            )
+
+            result = ia_tools.entrenar_datos(datos=datos, epocas=epocas, num_datos=len(datos), modelo=modelo, validacion=validacion,
+                                             callbacks=[control, ia_tools.RendimientoEpocas(muestras)], epoca_inicial=estado["epoca"] if estado else 0)
             if self.config["savefile"]:
-                epocas_entrenadas, layers_modelo = ia_tools.recoge_datos_modelo(modelo)
+                epocas_entrenadas, layers_modelo = ia_tools.recoge_datos_modelo(modelo, result)
                 if not epocas_entrenadas:
-                    epocas_entrenadas = epocas
+                    epocas_entrenadas = control.estado["epoca"] or epocas
                 time_stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 ia_tools.save_modelo(self.config, modelo, "modelo__%s__%s_%s.keras" % ("_".join(layers_modelo), epocas_entrenadas, time_stamp))
+                control.borrar()
             graphics.mostrar_graf(result)
+        elif action == "sweep":
+            if not self.check_not_null(['layers','epocs','dumpsfolder','optimizado']):
+                print('Uso: %s trainning sweep -l "20,20,20;8*100" -o 0.001,0.01 -e <epocas> [--procesos-barrido <procesos>]' % sys.argv[0])
+                sys.exit(1)
+
+            self.barrer()
+
         elif action == "predecir":
             if not self.check_not_null(['modelfile','tramafile']):
                 print("Uso: %s trainning predecir -m <file>" % sys.argv[0])
                 sys.exit(1)
 
-            modelo = ia_tools.load_modelo(self.config['modelfile'], self.config['modelofolder'])
-            lista_tramas = self.calcular_predicciones()
+            predictor = self.cargar_predictor()
+            if predictor is None:
+                sys.exit(1)
+            datos, origenes = self.calcular_predicciones()
+            if not len(datos):
+                print("No se han encontrado tramas que procesar")
+                return
+
+            print("Procesando %s predicciones" % len(datos))
+            inicio = time.perf_counter()
+            salidas = predictor(datos, int(self.config.get('bloqueprediccion') or modelo_numpy.TAMANO_BLOQUE_PREDICCION))
+            segundos = time.perf_counter() - inicio
+            filas = prediccion.filas_prediccion(origenes, salidas)
 
-            print("Procesando %s predicciones" % len(lista_tramas))
-            for trama_ in lista_tramas:
-                ia_tools.predecir(trama_.take(1), modelo)
+            if self.config.get('salida'):
+                prediccion.guardar_predicciones(self.config['salida'], filas)
             else:
-                print("No se han encontrado tramas que procesar")
+                prediccion.mostrar_tabla(filas)
+            print("# PREDICCIÓN: %d tramas en %.3f s (%.1f tramas/s)" % (len(filas), segundos, len(filas) / max(segundos, 1e-9)))
+            if isinstance(predictor, tabla_tools.DecodificadorTabla):
+                predictor.mostrar_resumen()
+
+        elif action == "serve":
+            if not self.check_not_null(['modelfile']):
+                print("Uso: %s trainning serve -m <file> [--socket <ruta>]" % sys.argv[0])
+                sys.exit(1)
+
+            self.servir()
+
+        elif action == "tabla":
+            if not self.check_not_null(['dumpsfolder','neuronasfirstlayer']):
+                print("Uso: %s trainning tabla -d <dumpsfolder> [--tabla <file.npz>]" % sys.argv[0])
+                sys.exit(1)
+
+            self.crear_tabla()
+
+        elif action == "exportar":
+            if not self.check_not_null(['modelfile']):
+                print("Uso: %s trainning exportar -m <file.keras>" % sys.argv[0])
+                sys.exit(1)
+
+            modelo = ia_tools.load_modelo(self.config['modelfile'], self.config['modelofolder'])
+            if not modelo:
+                sys.exit(1)
+            nombre_npz = os.path.splitext(os.path.basename(self.config['modelfile']))[0] + ".npz"
+            modelo_numpy.ModeloNumpy.desde_keras(modelo).guardar(os.path.join(self.config['modelofolder'], nombre_npz))
+
+        elif action == "paridad":
+            if not self.check_not_null(['modelfile','tramafile']):
+                print("Uso: %s trainning paridad -m <file.keras> -f <file>" % sys.argv[0])
+                sys.exit(1)
+
+            if not self.comprobar_paridad():
+                sys.exit(1)
 
         else:
             print("Accion %s no reconocida" % (action))
 
-    def calcular_predicciones(self) -> List['DatasetV2']:
+    def servir(self) -> None:
+        """Carga el modelo una vez y atiende peticiones hasta Ctrl+C (o fin de stdin)."""
+        socket_servidor = self.config.get('socket')
+        salida = sys.stdout
+        # Con stdin/stdout todo lo que no sea una respuesta va a stderr
+        with contextlib.redirect_stdout(sys.stderr if not socket_servidor else sys.stdout):
+            predictor = self.cargar_predictor()
+            if predictor is None:
+                sys.exit(1)
+
+            servidor = servidor_tools.ServidorPredicciones(
+                predictor,
+                int(self.config['neuronasfirstlayer']), # type: ignore[arg-type]
+                tamano_lote=int(self.config.get('tamanolote') or servidor_tools.TAMANO_LOTE_SERVIDOR),
+                espera_lote=float(self.config.get('esperalote') or servidor_tools.ESPERA_LOTE * 1000) / 1000,
+            )
+            if socket_servidor:
+                servidor.ejecutar_socket(socket_servidor)
+            else:
+                print("Esperando tramas por stdin")
+                servidor.ejecutar_stdin(salida)
+            if isinstance(predictor, tabla_tools.DecodificadorTabla):
+                predictor.mostrar_resumen(sys.stderr)
+
+    def cargar_predictor(self) -> Optional[Callable[..., Any]]:
+        """
+        Carga el modelo indicado con -m: Keras (.keras) o NumPy (.npz, sin TensorFlow).
+        Con --tabla, las tramas conocidas se resuelven con la tabla de estados y sólo el resto pasa por el modelo.
+        """
+        predictor = prediccion.cargar_predictor(self.config['modelfile'], self.config['modelofolder'])
+        if predictor is None or not self.config.get('tabla'):
+            return predictor
+        decodificador = tabla_tools.cargar_decodificador(self.config['tabla'], self.config['modelofolder'],
+                                                         int(self.config['neuronasfirstlayer']), predictor) # type: ignore[arg-type]
+        return decodificador or predictor
+
+    def barrer(self) -> None:
+        """Entrena la rejilla de -l x -o con el dataset cargado una sola vez y conserva los mejores modelos."""
+        candidatos = barrido.rejilla(self.config['layers'], self.config['optimizado'])
+        total_data, total_results = self.recoger_arrays()
+        if not len(total_data):
+            print("No se han encontrado tramas para entrenar")
+            return
+        clasificacion = barrido.ejecutar_barrido(
+            candidatos, np.asarray(total_data), np.asarray(total_results),
+            epocas=int(self.config['epocs']),
+            tamano_lote=int(self.config['tamanolote']) if self.config.get('tamanolote') else None,
+            carpeta_modelos=self.config['modelofolder'],
+            workers=int(self.config.get('procesosbarrido') or 1),
+            hilos=int(self.config['hilostf']) if self.config.get('hilostf') else None,
+            conservar=int(self.config.get('conservar') or 1),
+            fraccion=float(self.config['validacion']) if self.config.get('validacion') else None,
+        )
+        barrido.mostrar_clasificacion(clasificacion)
+
+    def crear_tabla(self) -> None:
+        """Construye la tabla de estados con todas las tramas del dataset y sus posiciones reales."""
+        layer_size: int = int(self.config['neuronasfirstlayer']) # type: ignore[arg-type]
+        total_data, total_results = self.recoger_arrays()
+        if not len(total_data):
+            print("No se han encontrado tramas para la tabla")
+            return
+        tabla, resumen = tabla_tools.TablaEstados.construir(total_data, total_results)
+        print("# TABLA DE ESTADOS: %(tramas)s tramas, %(distintas)s distintas, %(ambiguas)s con varios códigos (se dejan al modelo)" % resumen)
+        tabla.guardar(tabla_tools.ruta_tabla(self.config.get('tabla'), self.config['modelofolder'], layer_size))
+
+    def comprobar_paridad(self, tolerancia: float = 1e-5) -> bool:
+        """
+        Compara la salida de Keras con la del motor NumPy sobre las tramas de -f.
+
+        El motor NumPy se prueba tal como lo usa ``predict``: exportado a un ``.npz`` y vuelto a cargar.
+        """
+        modelo = ia_tools.load_modelo(self.config['modelfile'], self.config['modelofolder'])
+        if not modelo:
+            return False
+        datos, origenes = self.calcular_predicciones()
+        if not len(datos):
+            print("No se han encontrado tramas que procesar")
+            return False
+
+        salidas_keras = ia_tools.predecir(datos, modelo)
+        with tempfile.TemporaryDirectory(prefix="curryrtool_paridad_") as carpeta:
+            ruta_npz = os.path.join(carpeta, "modelo" + modelo_numpy.EXTENSION_MODELO_NUMPY)
+            with contextlib.redirect_stdout(io.StringIO()):
+                modelo_numpy.ModeloNumpy.desde_keras(modelo).guardar(ruta_npz)
+            salidas_numpy = modelo_numpy.ModeloNumpy.cargar(ruta_npz).predecir(datos)
+        diferencia = np.abs(salidas_keras - salidas_numpy)
+        codigos_distintos = int((prediccion.decodificar(salidas_keras)["codigo"] != prediccion.decodificar(salidas_numpy)["codigo"]).sum())
+        print("# PARIDAD: %d tramas, diferencia máxima %.3g, media %.3g, %d códigos distintos" % (
+            len(datos), diferencia.max(), diferencia.mean(), codigos_distintos))
+        for num in np.flatnonzero(diferencia > tolerancia)[:10]:
+            print("  %s: keras %.6f numpy %.6f" % (origenes[num], salidas_keras[num], salidas_numpy[num]))
+
+        return bool(diferencia.max() <= tolerancia and not codigos_distintos)
+
+    def calcular_predicciones(self) -> Tuple['np.ndarray', List[str]]:
+        """
+        Carga todas las tramas a predecir en un único array.
+
+        :return: Tramas normalizadas (N, 1, neuronas) y el origen de cada una (``fichero#num``).
+        """
+        layer_size: int = int(self.config['neuronasfirstlayer']) # type: ignore[arg-type]
         fichero : str =  self.config['tramafile'] 
         if not fichero:
-            return []
+            return np.zeros((0, 1, layer_size), dtype=np.float32), []
         fichero_path = os.path.join(self.config["dumpsfolder"], fichero) 
         lista_ficheros = []
-        if "_" in fichero:
+        if registro.es_segmento(fichero.split("#")[0]):
+            lista_ficheros.append(fichero_path)
+        elif "_" in fichero:
             lista_ficheros = [os.path.join(self.config["dumpsfolder"], "%s.bin" % file_name) for file_name in trama_tools.resuelve_nombre_binarios_lista(fichero_path)] 
         else:
             lista_ficheros.append(fichero_path)
 
-        lista_predicciones = []
+        lista_datos = []
+        origenes = []
         for fichero_path in lista_ficheros:
             dataset, resultset = self.leer_fichero(fichero_path)
-            for data in dataset:
-                lista_predicciones.append(data)
-        
-        return [ia_tools.crear_dataset([data], None) for data in lista_predicciones] # type: ignore[list-item]
+            lista_datos.append(dataset)
+            origenes.extend("%s#%d" % (os.path.basename(fichero_path), num) for num in range(len(dataset)))
 
+        if not lista_datos:
+            return np.zeros((0, 1, layer_size), dtype=np.float32), []
+        return np.concatenate(lista_datos), origenes
 
-
-    def leer_fichero(self, file_name: str) -> Tuple[list[list[int]], list[list[int]]]:
+    def leer_fichero(self, file_name: str) -> Tuple['np.ndarray', 'np.ndarray']:
         # print("Leyendo fichero %s." % file_name) 
-        total_data = []
-
-        file_data = trama_tools.cargar_trama_bytes(file_name)
-        datos_list = []
-        for bloque, data in enumerate(file_data):
-            datos_bloque = trama_tools.normalizar_bloque(bloque, data["data"]) # type: ignore[index]
-            for pos, valor in enumerate(datos_bloque):                  
-                datos_list.append(int(valor))
-
         layer_size: int = int(self.config['neuronasfirstlayer']) # type: ignore[arg-type]
-        datos_list_norm = trama_tools.normalizar_datos(layer_size, datos_list, True)
-
-        if datos_list_norm is False:
-            print("Omitiendo linea de fichero %s" % file_name)
-            return [], []
-
-        resultado_list = [int(valor) for valor in file_data[0]["values"]] # type: ignore[index]
+        datos, resultados, validas = ingesta.preparar_tramas(trama_tools.cargar_tramas(file_name), layer_size)
+        if not validas.all():
+            print("Omitiendo %s tramas de %s con más de %s datos" % (int((~validas).sum()), file_name, layer_size))
+        return datos, resultados
 
-        while len(resultado_list) < 8:
-            resultado_list.insert(0, 0)
-
-        total_data.append(datos_list_norm)
-        list_data = [int("".join([str(bit) for bit in resultado_list]),2)]
-        total_results = [trama_tools.normalizar_datos(layer_size, list_data)]
-
-        return total_data, total_results # type: ignore [return-value]
-
-
-    def recoger_dataset(self):
-        print("Recoger datasets ....")
+    def ficheros_dataset(self) -> List[str]:
+        """Ficheros de captura de la carpeta de dumps según el formato configurado."""
         folder_name = self.config['dumpsfolder']
-        total_data = []
-        total_results = []
-        print("Comprobando folder %s" % folder_name)
-        num_ficheros = 0
+        if str(self.config.get('formatocaptura', 'bin')).lower() == "log":
+            return registro.listar_segmentos(folder_name)
+
+        ficheros = []
         for file in os.listdir(folder_name):
             nombre_fichero = os.path.join(folder_name, file)
             if not nombre_fichero.endswith(".json"):
@@ -151,34 +356,69 @@ class TrainningInterface(CommonInterface):
             lista_ficheros = trama_tools.resuelve_nombre_binarios_lista(nombre_fichero)
             for nombre_fichero_sin_ext in lista_ficheros:
                 nombre_fichero_bin = "%s.bin" % nombre_fichero_sin_ext
-                ruta_fichero = os.path.join(folder_name, nombre_fichero_bin)
-                if not os.path.exists(ruta_fichero):
-                    print("No existe el fichero %s" % ruta_fichero)
-                    continue
-                num_ficheros += 1
+                # Los que falten se anotan en el informe de la ingesta
+                ficheros.append(os.path.join(folder_name, nombre_fichero_bin))
+
+        return ficheros
+
+    def recoger_dataset(self, semilla: int = 0, tamano_lote: Optional[int] = None) -> Tuple['DatasetV2', Optional['DatasetV2'], int]:
+        """
+        :return: Dataset de entrenamiento, de validación (None sin --validacion o si no hay tramas suficientes)
+                 y muestras de entrenamiento por época.
+        """
+        total_data, total_results = self.recoger_arrays()
+        fraccion = float(self.config.get('validacion') or ia_tools.FRACCION_VALIDACION)
+        (datos, resultados), validacion = ia_tools.dividir_validacion(total_data, total_results, fraccion, semilla)
+        tamano_lote = tamano_lote or int(self.config.get('tamanolote') or ia_tools.TAMANO_LOTE)
+        dataset = ia_tools.crear_dataset(datos, resultados, tamano_lote=tamano_lote, buffer_shuffle=int(self.config.get('buffershuffle') or 0))
+        muestras = len(datos) * ia_tools.REPETICIONES
+        if validacion is None:
+            return dataset, None, muestras
+        print("Validación: %d tramas; entrenamiento: %d tramas" % (len(validacion[0]), len(datos)))
+        return dataset, ia_tools.crear_dataset(validacion[0], validacion[1], tamano_lote=tamano_lote, barajar=False), muestras
+
+    def perfil_rendimiento(self) -> Dict[str, Any]:
+        """Perfil de --perfil con lo que se indique en --hilos-tf, --hilos-inter, --lote, --pasos-ejecucion y --sin-jit."""
+        def entero(clave: str) -> Optional[int]:
+            return int(self.config[clave]) if self.config.get(clave) else None
+
+        return ia_tools.perfil_rendimiento(
+            self.config.get('perfil') or "defecto",
+            hilos_intra=entero('hilostf'),
+            hilos_inter=entero('hilosinter'),
+            tamano_lote=entero('tamanolote'),
+            pasos_ejecucion=entero('pasosejecucion'),
+            jit=False if self.config.get('sinjit') else None,
+        )
+
+    def recoger_arrays(self) -> Tuple[Any, Any]:
+        """Tramas normalizadas (N, 1, neuronas) y resultados (N, 1, 1) de todas las capturas, a través de la caché."""
+        print("Recoger datasets ....")
+        folder_name = self.config['dumpsfolder']
+        print("Comprobando folder %s" % folder_name)
+        rutas = self.ficheros_dataset()
+        layer_size: int = int(self.config['neuronasfirstlayer']) # type: ignore[arg-type]
+
+        def construir(pendientes: List[str]) -> Tuple[Any, Any, List[Optional[int]]]:
+            resultado = ingesta.ingerir(pendientes, layer_size, workers=int(self.config.get('workers') or 1))
+            ingesta.mostrar_informe(resultado, layer_size)
+            return resultado.datos, resultado.resultados, resultado.filas
 
-                data, results = self.leer_fichero(ruta_fichero)
-                # print("Recogido fichero %s con %s tramas" % (nombre_fichero_bin, data[0]))
-                total_data.extend(data)
-                total_results.extend(results)
-        
-        # print("Recolectadas %d tramas de %s ficheros" % (len(total_data), num_ficheros))
+        cache = cache_tools.CacheDataset(folder_name, {
+            "neuronasfirstlayer": layer_size,
+            "normalizacion": trama_tools.VERSION_NORMALIZACION,
+        })
+        total_data, total_results = cache.actualizar(rutas, construir, forzar=bool(self.config.get('sincache')))
+        cache.mostrar_resumen()
+        # print("Recolectadas %d tramas de %s ficheros" % (len(total_data), len(rutas)))
 
-        return ia_tools.crear_dataset(total_data, total_results)
+        return total_data, total_results
 
     def crear_modelo(self) -> Any:
         #print("Creando modelo ....")
         conf_layer: str = self.config['layers'] # type: ignore[assignment]
-        layers = []
-        if "," in conf_layer:
-            layers = [int(layer) for layer in conf_layer.split(",")]
-        elif "*" in conf_layer:
-            num, neu = conf_layer.split("*")
-            for i in range(int(num)):
-                layers.append(int(neu))
-        else:
-            raise Exception("Error en la configuración de capas")
-            
+        layers = barrido.parsear_capas(conf_layer)
+
         optimizado = float(self.config['optimizado']) # type: ignore[arg-type]
         neuronas_first_layer: int = int(self.config['neuronasfirstlayer']) # type: ignore[arg-type]
  
@@ -0,0 +1,187 @@
+"""
+Barrido de hiperparámetros: entrena en paralelo una rejilla de capas y tasas de aprendizaje.
+
+El dataset se carga una sola vez en el proceso principal (a través de la caché) y
+se pasa a cada proceso al arrancarlo. Cada proceso limita los hilos de TensorFlow
+para que los candidatos no compitan por los mismos núcleos, entrena y guarda su
+modelo en una carpeta temporal. Todos apartan las mismas tramas para validar
+(``ia.dividir_validacion`` con una semilla fija), así que al terminar se ordenan por
+la pérdida de validación, se escribe la clasificación y sólo se conservan los mejores
+modelos. Si no quedan tramas para validar se ordenan por la pérdida de entrenamiento.
+
+El proceso principal no importa TensorFlow: los procesos se crean con ``spawn`` y el
+tamaño de lote por defecto de ``ia`` se resuelve en ellos.
+"""
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from typing import Any, Dict, List, Optional, Tuple
+
+# Datos del proceso: se fijan una vez al arrancarlo con ``_iniciar_proceso``
+_DATOS: Dict[str, Any] = {}
+# Semilla de la división de validación: la misma para todos los candidatos
+SEMILLA_VALIDACION = 0
+# Fracción de las tramas para validar: sin validación no hay con qué comparar los candidatos
+FRACCION_VALIDACION = 0.1
+
+
+def parsear_capas(conf_layer: str) -> List[int]:
+    """Capas ocultas de una especificación ``20,20,20`` o ``8*100`` (8 capas de 100)."""
+    conf_layer = conf_layer.strip()
+    if "*" in conf_layer:
+        num, neu = conf_layer.split("*")
+        return [int(neu)] * int(num)
+    if "," in conf_layer or conf_layer.isdigit():
+        return [int(layer) for layer in conf_layer.split(",")]
+    raise Exception("Error en la configuración de capas")
+
+
+def rejilla(especificaciones: str, tasas: str) -> List[Tuple[str, float]]:
+    """
+    :param especificaciones: Especificaciones de capas separadas por ``;`` (``20,20,20;8*100``).
+    :param tasas: Tasas de aprendizaje separadas por comas (``0.001,0.01``).
+    :return: Todas las combinaciones (capas, tasa).
+    """
+    lista_capas = [especificacion.strip() for especificacion in especificaciones.split(";") if especificacion.strip()]
+    for especificacion in lista_capas:
+        parsear_capas(especificacion)
+    lista_tasas = [float(tasa) for tasa in tasas.split(",") if tasa.strip()]
+    return [(capas, tasa) for capas in lista_capas for tasa in lista_tasas]
+
+
+def _iniciar_proceso(datos: Any, resultados: Any, hilos: int) -> None:
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    from . import ia as ia_tools
+
+    # Cada proceso usa su parte de los núcleos: con todos, los procesos compiten entre sí
+    ia_tools.configurar_hilos(hilos, 1)
+    _DATOS["datos"] = datos
+    _DATOS["resultados"] = resultados
+
+
+def entrenar_candidato(capas: str, tasa: float, epocas: int, tamano_lote: Optional[int], carpeta: str,
+                       fraccion: Optional[float] = None, semilla: int = SEMILLA_VALIDACION) -> Dict[str, Any]:
+    """
+    Entrena un candidato en el proceso actual. Se ejecuta en los procesos del pool.
+
+    :param tamano_lote: Por defecto, ``ia.TAMANO_LOTE``.
+    :param fraccion: Fracción de las tramas para validar; por defecto, ``FRACCION_VALIDACION``.
+    """
+    from . import ia as ia_tools
+
+    tamano_lote = tamano_lote or ia_tools.TAMANO_LOTE
+    fraccion = FRACCION_VALIDACION if fraccion is None else fraccion
+    resultado: Dict[str, Any] = {"capas": capas, "tasa": tasa, "tamano_lote": tamano_lote}
+    inicio = time.perf_counter()
+    try:
+        (datos, resultados), validacion = ia_tools.dividir_validacion(_DATOS["datos"], _DATOS["resultados"], fraccion, semilla)
+        # Sólo interesa el resumen: la salida de Keras de varios procesos a la vez es ilegible
+        with contextlib.redirect_stdout(io.StringIO()):
+            modelo = ia_tools.init_modelo(input_schema=(datos.shape[-1], 1), layers=parsear_capas(capas), output_shapes=1, opt=tasa)
+            dataset = ia_tools.crear_dataset(datos, resultados, tamano_lote=tamano_lote)
+            dataset_validacion = None
+            if validacion is not None:
+                dataset_validacion = ia_tools.crear_dataset(validacion[0], validacion[1], tamano_lote=tamano_lote, barajar=False)
+            historia = modelo.fit(dataset, epochs=epocas, verbose=0, validation_data=dataset_validacion)
+            _, layers_modelo = ia_tools.recoge_datos_modelo(modelo)
+            nombre = "modelo__%s__%s_%s.keras" % ("_".join(layers_modelo), epocas, datetime.now().strftime("%Y%m%d_%H%M%S_%f"))
+            ia_tools.save_modelo({"modelofolder": carpeta}, modelo, nombre)
+        resultado.update({
+            "perdida": float(historia.history["loss"][-1]),
+            "precision": float(historia.history.get("accuracy", [0.0])[-1]),
+            "modelo": os.path.join(carpeta, nombre),
+        })
+        if "val_loss" in historia.history:
+            resultado["perdida_validacion"] = float(historia.history["val_loss"][-1])
+            resultado["tramas_validacion"] = len(validacion[0]) # type: ignore[index]
+    except Exception as e:
+        resultado["error"] = "%s: %s" % (type(e).__name__, e)
+        traceback.print_exc()
+    resultado["segundos"] = round(time.perf_counter() - inicio, 3)
+    return resultado
+
+
+def _perdida(resultado: Dict[str, Any]) -> float:
+    """Pérdida con la que se clasifica: la de validación si la hay."""
+    return resultado.get("perdida_validacion", resultado.get("perdida", 0.0))
+
+
+def ejecutar_barrido(candidatos: List[Tuple[str, float]], datos: Any, resultados: Any, epocas: int, tamano_lote: Optional[int],
+                     carpeta_modelos: str, workers: int = 1, hilos: Optional[int] = None, conservar: int = 1,
+                     fraccion: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    Entrena todos los candidatos y deja en ``carpeta_modelos`` sólo los ``conservar`` mejores.
+
+    :param candidatos: Combinaciones (capas, tasa) de ``rejilla``.
+    :param datos: Tramas normalizadas (N, 1, neuronas).
+    :param resultados: Resultados esperados (N, 1, 1).
+    :param tamano_lote: Por defecto, ``ia.TAMANO_LOTE``.
+    :param fraccion: Fracción de las tramas para validar y clasificar; por defecto, ``FRACCION_VALIDACION``.
+    :param workers: Candidatos que se entrenan a la vez.
+    :param hilos: Hilos de TensorFlow por proceso; por defecto se reparten los núcleos.
+    :return: La clasificación, de mejor a peor (los que fallaron al final).
+    """
+    workers = max(1, min(workers, len(candidatos)))
+    hilos = hilos or max(1, (os.cpu_count() or 1) // workers)
+    sello = datetime.now().strftime("%Y%m%d_%H%M%S")
+    temporal = os.path.join(carpeta_modelos, ".barrido_%s" % sello)
+    os.makedirs(temporal, exist_ok=True)
+    print("Barrido de %s candidatos en %s procesos (%s hilos de TensorFlow cada uno)" % (len(candidatos), workers, hilos))
+
+    clasificacion: List[Dict[str, Any]] = []
+    contexto = multiprocessing.get_context("spawn")
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=contexto, initializer=_iniciar_proceso,
+                                 initargs=(datos, resultados, hilos)) as pool:
+            futuros = [pool.submit(entrenar_candidato, capas, tasa, epocas, tamano_lote, temporal, fraccion) for capas, tasa in candidatos]
+            for num, futuro in enumerate(futuros):
+                try:
+                    resultado = futuro.result()
+                except Exception as e:
+                    capas, tasa = candidatos[num]
+                    resultado = {"capas": capas, "tasa": tasa, "error": "Fallo del proceso: %s" % e}
+                clasificacion.append(resultado)
+                print("  [%s/%s] %s tasa %s: %s" % (num + 1, len(candidatos), resultado["capas"], resultado["tasa"],
+                                                    resultado.get("error") or "pérdida %.6f" % _perdida(resultado)))
+
+        clasificacion.sort(key=lambda resultado: ("error" in resultado, _perdida(resultado)))
+        for puesto, resultado in enumerate(clasificacion, 1):
+            resultado["puesto"] = puesto
+            ruta = resultado.pop("modelo", None)
+            if ruta and puesto <= conservar:
+                destino = os.path.join(carpeta_modelos, os.path.basename(ruta))
+                shutil.move(ruta, destino)
+                resultado["modelo"] = destino
+    finally:
+        shutil.rmtree(temporal, ignore_errors=True)
+
+    ruta_clasificacion = os.path.join(carpeta_modelos, "barrido_%s.json" % sello)
+    with open(ruta_clasificacion, "w") as fichero:
+        json.dump({
+            "epocas": epocas,
+            "tamano_lote": tamano_lote or next((resultado["tamano_lote"] for resultado in clasificacion), None),
+            "semilla_validacion": SEMILLA_VALIDACION,
+            "clasificacion": clasificacion,
+        }, fichero, indent=1)
+    print("Clasificación guardada en %s" % ruta_clasificacion)
+    return clasificacion
+
+
+def mostrar_clasificacion(clasificacion: List[Dict[str, Any]]) -> None:
+    print("# BARRIDO:")
+    for resultado in clasificacion:
+        if "error" in resultado:
+            print("  %2d. %-20s tasa %-8s ERROR %s" % (resultado["puesto"], resultado["capas"], resultado["tasa"], resultado["error"]))
+            continue
+        validacion = "val %.6f" % resultado["perdida_validacion"] if "perdida_validacion" in resultado else "val -"
+        print("  %2d. %-20s tasa %-8s pérdida %.6f %s precisión %.4f %7.1f s %s" % (
+            resultado["puesto"], resultado["capas"], resultado["tasa"], resultado["perdida"], validacion, resultado["precision"],
+            resultado["segundos"], os.path.basename(resultado.get("modelo", ""))))
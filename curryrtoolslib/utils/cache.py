@@ -0,0 +1,225 @@
+"""
+Caché en disco del dataset ya preprocesado, con construcción incremental.
+
+``trainning entrenar`` normaliza todas las capturas antes de la primera época. El
+resultado (X e y) se guarda como dos ``.npy`` junto a un manifiesto ``.json`` que
+anota, para cada captura ingerida, la ruta, tamaño, fecha de modificación y hash
+de sus ficheros y las filas que ocupa en los arrays.
+
+Al reconstruir sólo se procesan las capturas nuevas o cambiadas: sus filas se
+añaden al final y las de capturas borradas o cambiadas se eliminan. Si no cambia
+nada, los arrays se abren directamente con ``mmap``. Si cambian los ajustes de
+normalización, se reconstruye todo.
+"""
+import hashlib
+import json
+import os
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+CARPETA_CACHE = ".cache"
+PREFIJO_CACHE = "dataset"
+VERSION_MANIFIESTO = 1
+TAMANO_LECTURA = 1 << 20
+
+# Construye los arrays de una lista de capturas: (X, y, filas por captura o None si falló)
+Constructor = Callable[[List[str]], Tuple[Any, Any, List[Optional[int]]]]
+
+
+def ficheros_entrada(ruta: str) -> List[str]:
+    """Ficheros de los que depende una captura: el ``.bin`` y su ``.info``, o el segmento."""
+    if ruta.endswith(".bin"):
+        return [ruta, ruta.replace(".bin", ".info")]
+    return [ruta]
+
+
+def estado_ficheros(ruta: str) -> Optional[List[List[Any]]]:
+    """Ruta absoluta, tamaño y fecha de modificación (ns) de los ficheros de una captura."""
+    estado = []
+    for fichero in ficheros_entrada(ruta):
+        try:
+            datos = os.stat(fichero)
+        except OSError:
+            return None
+        estado.append([os.path.abspath(fichero), datos.st_size, datos.st_mtime_ns])
+    return estado
+
+
+def hash_ficheros(ruta: str) -> str:
+    resumen = hashlib.blake2b(digest_size=16)
+    for fichero in ficheros_entrada(ruta):
+        with open(fichero, "rb") as entrada:
+            for bloque in iter(lambda: entrada.read(TAMANO_LECTURA), b""):
+                resumen.update(bloque)
+    return resumen.hexdigest()
+
+
+class CacheDataset:
+
+    manifiesto: Dict[str, Any]
+
+    def __init__(self, carpeta: str, ajustes: Dict[str, Any]) -> None:
+        """
+        :param carpeta: Carpeta de dumps; la caché se guarda en su subcarpeta ``.cache``.
+        :param ajustes: Parámetros que cambian el resultado de la normalización (neuronas, versión...).
+        """
+        self.carpeta = os.path.join(carpeta, CARPETA_CACHE)
+        self.ajustes = ajustes
+        self.ruta_manifiesto = os.path.join(self.carpeta, "%s.json" % PREFIJO_CACHE)
+        self.ruta_datos = os.path.join(self.carpeta, "%s_X.npy" % PREFIJO_CACHE)
+        self.ruta_resultados = os.path.join(self.carpeta, "%s_y.npy" % PREFIJO_CACHE)
+        self.manifiesto = {}
+        self.contadores = {"sin_cambios": 0, "nuevas": 0, "cambiadas": 0, "borradas": 0}
+
+    def actualizar(self, rutas: List[str], construir: Constructor, forzar: bool = False) -> Tuple[Any, Any]:
+        """
+        Devuelve (X, y) para ``rutas``, procesando con ``construir`` sólo lo que no esté en la caché.
+
+        :param rutas: Capturas que forman el dataset, en orden.
+        :param construir: Carga y normaliza una lista de capturas.
+        :param forzar: Ignora la caché y lo reconstruye todo.
+        """
+        anteriores = {} if forzar else self._cargar_manifiesto()
+        arrays = self._abrir_arrays() if anteriores else None
+        if arrays is None:
+            anteriores = {}
+
+        conservar: List[Dict[str, Any]] = []
+        pendientes: List[str] = []
+        for ruta in rutas:
+            entrada = anteriores.pop(os.path.abspath(ruta), None)
+            estado = estado_ficheros(ruta)
+            if entrada is not None and estado is not None and self._sin_cambios(entrada, ruta, estado):
+                conservar.append(entrada)
+                self.contadores["sin_cambios"] += 1
+                continue
+            self.contadores["cambiadas" if entrada is not None else "nuevas"] += 1
+            pendientes.append(ruta)
+        self.contadores["borradas"] = len(anteriores)
+
+        if arrays is not None and not pendientes and not anteriores:
+            if any(entrada.get("_tocada") for entrada in conservar):
+                self._guardar_manifiesto(conservar, len(arrays[0]))
+            return arrays
+
+        partes_datos, partes_resultados, entradas = self._conservar_filas(conservar, arrays)
+        if pendientes:
+            datos, resultados, filas = construir(pendientes)
+            datos, resultados = np.asarray(datos), np.asarray(resultados)
+            descartar: List[Tuple[int, int]] = []
+            inicio = 0
+            for ruta, num_filas in zip(pendientes, filas):
+                if num_filas is None:
+                    # No se anota: se volverá a intentar en la próxima construcción
+                    continue
+                estado = estado_ficheros(ruta)
+                try:
+                    resumen = hash_ficheros(ruta) if estado is not None else None
+                except OSError:
+                    resumen = None
+                if resumen is None:
+                    # Borrada durante la construcción: sin entrada en el manifiesto, sus filas
+                    # tampoco pueden quedarse o las siguientes entradas apuntarían a filas ajenas
+                    descartar.append((inicio, inicio + num_filas))
+                else:
+                    entradas.append({"ruta": os.path.abspath(ruta), "ficheros": estado, "hash": resumen, "filas": num_filas})
+                inicio += num_filas
+            if descartar:
+                conservadas = np.ones(len(datos), dtype=bool)
+                for desde, hasta in descartar:
+                    conservadas[desde:hasta] = False
+                datos, resultados = datos[conservadas], resultados[conservadas]
+            partes_datos.append(datos)
+            partes_resultados.append(resultados)
+
+        total_datos = np.concatenate(partes_datos) if partes_datos else np.zeros((0, 1, self.ajustes.get("neuronasfirstlayer", 0)), dtype=np.float32)
+        total_resultados = np.concatenate(partes_resultados) if partes_resultados else np.zeros((0, 1, 1), dtype=np.float32)
+        self._guardar(total_datos, total_resultados, entradas)
+        return self._abrir_arrays() or (total_datos, total_resultados)
+
+    def mostrar_resumen(self) -> None:
+        print("# DATASET: %(sin_cambios)s capturas en caché, %(nuevas)s nuevas, %(cambiadas)s cambiadas, %(borradas)s borradas" % self.contadores)
+
+    def _sin_cambios(self, entrada: Dict[str, Any], ruta: str, estado: List[List[Any]]) -> bool:
+        if entrada["ficheros"] == estado:
+            return True
+        # Misma ruta con otra fecha: sólo ha cambiado si cambia el contenido
+        if [fichero[1] for fichero in entrada["ficheros"]] != [fichero[1] for fichero in estado] or entrada["hash"] != hash_ficheros(ruta):
+            return False
+        entrada["ficheros"] = estado
+        entrada["_tocada"] = True
+        return True
+
+    def _conservar_filas(self, conservar: List[Dict[str, Any]], arrays: Optional[Tuple[Any, Any]]) -> Tuple[List[Any], List[Any], List[Dict[str, Any]]]:
+        partes_datos: List[Any] = []
+        partes_resultados: List[Any] = []
+        entradas: List[Dict[str, Any]] = []
+        if arrays is None or not conservar:
+            return partes_datos, partes_resultados, entradas
+
+        posiciones = np.concatenate([np.arange(entrada["inicio"], entrada["inicio"] + entrada["filas"]) for entrada in conservar])
+        partes_datos.append(arrays[0][posiciones])
+        partes_resultados.append(arrays[1][posiciones])
+        entradas.extend(conservar)
+        return partes_datos, partes_resultados, entradas
+
+    def _cargar_manifiesto(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.ruta_manifiesto):
+            return {}
+        try:
+            with open(self.ruta_manifiesto, "r") as fichero:
+                manifiesto = json.load(fichero)
+        except (OSError, ValueError) as e:
+            print(f"Manifiesto del dataset no válido: {e}")
+            return {}
+        if manifiesto.get("version") != VERSION_MANIFIESTO or manifiesto.get("ajustes") != self.ajustes:
+            return {}
+        self.manifiesto = manifiesto
+        return {entrada["ruta"]: entrada for entrada in manifiesto.get("capturas", [])}
+
+    def _abrir_arrays(self) -> Optional[Tuple[Any, Any]]:
+        try:
+            datos = np.load(self.ruta_datos, mmap_mode="r")
+            resultados = np.load(self.ruta_resultados, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        if len(datos) != len(resultados) or (self.manifiesto and len(datos) != self.manifiesto.get("tramas")):
+            return None
+        return datos, resultados
+
+    def _guardar(self, datos: Any, resultados: Any, entradas: List[Dict[str, Any]]) -> None:
+        os.makedirs(self.carpeta, exist_ok=True)
+        # El manifiesto se escribe el último: si algo falla antes, la caché queda inválida
+        if os.path.exists(self.ruta_manifiesto):
+            os.remove(self.ruta_manifiesto)
+        for ruta, array in ((self.ruta_datos, datos), (self.ruta_resultados, resultados)):
+            temporal = ruta + ".tmp"
+            with open(temporal, "wb") as fichero:
+                np.save(fichero, np.ascontiguousarray(array))
+            os.replace(temporal, ruta)
+        self._guardar_manifiesto(entradas, len(datos))
+
+    def _guardar_manifiesto(self, entradas: List[Dict[str, Any]], tramas: int) -> None:
+        inicio = 0
+        capturas = []
+        for entrada in entradas:
+            capturas.append({
+                "ruta": entrada["ruta"],
+                "ficheros": entrada["ficheros"],
+                "hash": entrada["hash"],
+                "inicio": inicio,
+                "filas": entrada["filas"],
+            })
+            inicio += entrada["filas"]
+        self.manifiesto = {
+            "version": VERSION_MANIFIESTO,
+            "ajustes": self.ajustes,
+            "tramas": tramas,
+            "capturas": capturas,
+        }
+        temporal = self.ruta_manifiesto + ".tmp"
+        with open(temporal, "w") as fichero:
+            json.dump(self.manifiesto, fichero, indent=1)
+        os.replace(temporal, self.ruta_manifiesto)
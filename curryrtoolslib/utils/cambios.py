@@ -0,0 +1,65 @@
+"""
+Filtro de captura que sólo conserva las tramas que cambian.
+
+El termostato reenvía continuamente las mismas tramas mientras nada cambia. El
+filtro calcula un hash de cada trama válida y la compara con la última guardada
+para la misma posición (la misma estructura de bloques). Las repeticiones no se
+guardan: se acumulan como un contador y las horas de la primera y última vez que
+se vio la trama.
+"""
+import hashlib
+import threading
+
+from typing import Any, Dict, List, Tuple
+
+
+class FiltroCambios:
+
+    ultimas: Dict[Tuple[int, ...], Tuple[bytes, Dict[str, Any]]]
+    entradas: List[Dict[str, Any]]
+
+    def __init__(self) -> None:
+        self.ultimas = {}
+        self.entradas = []
+        self.vistas = 0
+        self.lock = threading.Lock()
+
+    def registrar(self, bloques: List[bytes], hora: str) -> Tuple[bool, Dict[str, Any]]:
+        """
+        Anota una trama válida.
+
+        :return: Si hay que guardarla (es nueva para su posición) y la entrada donde se
+                 acumulan sus repeticiones. Quien la guarde debe rellenar ``entrada["fichero"]``.
+        """
+        posicion = tuple(len(bloque) for bloque in bloques)
+        resumen = hashlib.blake2b(b"".join(bloques), digest_size=16).digest()
+        with self.lock:
+            self.vistas += 1
+            anterior = self.ultimas.get(posicion)
+            if anterior is not None and anterior[0] == resumen:
+                entrada = anterior[1]
+                entrada["repeticiones"] += 1
+                entrada["ultima"] = hora
+                return False, entrada
+
+            entrada = {
+                "fichero": None,
+                "hash": resumen.hex(),
+                "repeticiones": 1,
+                "primera": hora,
+                "ultima": hora,
+            }
+            self.ultimas[posicion] = (resumen, entrada)
+            self.entradas.append(entrada)
+            return True, entrada
+
+    def guardadas(self) -> int:
+        return len(self.entradas)
+
+    def mostrar_resumen(self) -> None:
+        guardadas = self.guardadas()
+        if not self.vistas:
+            print("# SOLO CAMBIOS: no se recibieron tramas válidas")
+            return
+        print("# SOLO CAMBIOS: %s tramas válidas, %s guardadas, %s repeticiones omitidas (reducción %.1f:1, %.1f%% menos)" % (
+            self.vistas, guardadas, self.vistas - guardadas, self.vistas / max(guardadas, 1), 100 * (1 - guardadas / self.vistas)))
@@ -0,0 +1,183 @@
+"""
+Captura productor/consumidor.
+
+Un hilo lector dedicado saca tramas del puerto y las deja en una cola acotada;
+uno o varios hilos escritores las validan y las guardan. Así la escritura en disco
+nunca retrasa la lectura del puerto.
+
+Con varios escritores las tramas se terminan de procesar en cualquier orden: cada una
+lleva el número con el que se leyó para poder reordenar lo guardado.
+"""
+import queue
+import threading
+import traceback
+
+from typing import Callable, Dict, Optional
+
+from .lector import LectorTramas, Trama
+
+POLITICAS_COLA = ["descartar_antigua", "descartar_nueva", "bloquear"]
+
+_FIN = None
+
+
+class ColaEscritura:
+
+    cola: 'queue.Queue[Optional[Trama]]'
+    contadores: Dict[str, int]
+
+    def __init__(self, consumidor: Callable[[Trama], None], tamano_cola: int = 64, escritores: int = 1, politica: str = "descartar_antigua") -> None:
+        """
+        :param consumidor: Función que procesa (valida, guarda, reenvía...) cada trama en los hilos escritores.
+        :param tamano_cola: Número máximo de tramas pendientes de escribir.
+        :param escritores: Número de hilos escritores.
+        :param politica: Qué hacer con la cola llena: descartar_antigua, descartar_nueva o bloquear.
+        """
+        if politica not in POLITICAS_COLA:
+            raise Exception("Política de cola %s no válida. Opciones: %s" % (politica, ", ".join(POLITICAS_COLA)))
+        self.consumidor = consumidor
+        self.cola = queue.Queue(maxsize=max(1, tamano_cola))
+        self.politica = politica
+        self.parar = threading.Event()
+        self.lock = threading.Lock()
+        self.hilos = [threading.Thread(target=self._escribir, name="captura-escritor-%d" % num, daemon=True) for num in range(max(1, escritores))]
+        self.contadores = {
+            "leidas": 0,
+            "descartadas": 0,
+            "procesadas": 0,
+            "errores": 0,
+            "max_cola": 0,
+        }
+
+    def arrancar(self) -> None:
+        for hilo in self.hilos:
+            hilo.start()
+
+    def terminar(self) -> None:
+        """Deja de aceptar tramas, espera a que se escriban las pendientes y para los hilos."""
+        self.parar.set()
+        for _ in self.hilos:
+            self.cola.put(_FIN)
+        for hilo in self.hilos:
+            hilo.join()
+
+    def encolar(self, trama: Trama) -> None:
+        self._incrementar("leidas")
+        if self.politica == "bloquear":
+            while not self.parar.is_set():
+                try:
+                    self.cola.put(trama, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+            else:
+                self._incrementar("descartadas")
+        else:
+            try:
+                self.cola.put_nowait(trama)
+            except queue.Full:
+                self._incrementar("descartadas")
+                if self.politica == "descartar_antigua":
+                    try:
+                        self.cola.get_nowait()
+                    except queue.Empty:
+                        pass
+                    try:
+                        self.cola.put_nowait(trama)
+                    except queue.Full:
+                        self._incrementar("descartadas")
+
+        profundidad = self.cola.qsize()
+        with self.lock:
+            if profundidad > self.contadores["max_cola"]:
+                self.contadores["max_cola"] = profundidad
+
+    def mostrar_resumen(self) -> None:
+        print("# CAPTURA: %(leidas)s tramas leídas, %(procesadas)s procesadas, %(descartadas)s descartadas por cola llena, %(errores)s errores (cola máxima %(max_cola)s)" % self.contadores)
+
+    def _incrementar(self, clave: str, valor: int = 1) -> None:
+        with self.lock:
+            self.contadores[clave] += valor
+
+    def _escribir(self) -> None:
+        while True:
+            trama = self.cola.get()
+            if trama is _FIN:
+                break
+            try:
+                self.consumidor(trama)
+                self._incrementar("procesadas")
+            except Exception as e:
+                self._incrementar("errores")
+                print(f"Error al procesar trama: {e}")
+                print(traceback.format_exc())
+
+
+class CapturaPipeline:
+
+    def __init__(self, lector: LectorTramas, consumidor: Callable[[Trama, int], None], tamano_cola: int = 64, escritores: int = 1, politica: str = "descartar_antigua",
+                 al_leer: Optional[Callable[[Trama], None]] = None, parar: Optional[threading.Event] = None) -> None:
+        """
+        :param lector: Lector de tramas sobre el puerto ya abierto.
+        :param consumidor: Procesa (valida, guarda, reenvía...) cada trama en los hilos escritores; recibe la
+                           trama y su número en el orden de lectura.
+        :param tamano_cola: Número máximo de tramas pendientes de escribir.
+        :param escritores: Número de hilos escritores.
+        :param politica: Qué hacer con la cola llena: descartar_antigua, descartar_nueva o bloquear.
+        :param al_leer: Se llama en el hilo lector con cada trama antes de encolarla; tiene que ser rápida.
+        :param parar: Evento de fuera que termina la captura como Ctrl+C (no se activa al terminar).
+        """
+        self.lector = lector
+        self.al_leer = al_leer
+        self.externo = parar
+        # En la cola van (trama, número) y cada escritor los pasa al consumidor
+        self.escritura = ColaEscritura(lambda elemento: consumidor(*elemento), tamano_cola=tamano_cola, escritores=escritores, politica=politica) # type: ignore[misc]
+        self.leidas = 0
+        self.parar = threading.Event()
+        self.error: Optional[BaseException] = None
+
+    @property
+    def contadores(self) -> Dict[str, int]:
+        return self.escritura.contadores
+
+    def ejecutar(self) -> None:
+        """Arranca los hilos y espera hasta que el lector termine o se pulse Ctrl+C."""
+        hilo_lector = threading.Thread(target=self._leer, name="captura-lector", daemon=True)
+        self.escritura.arrancar()
+        hilo_lector.start()
+
+        try:
+            while hilo_lector.is_alive():
+                hilo_lector.join(0.5)
+        finally:
+            self.parar.set()
+            hilo_lector.join()
+            self.escritura.terminar()
+            self.escritura.mostrar_resumen()
+            if self.lector.descartados:
+                print("# %s bytes descartados al resincronizar con la cabecera (%s tramas con tamaño no válido)" % (
+                    self.lector.descartados, self.lector.tramas_descartadas))
+
+        if self.error is not None:
+            raise self.error
+
+    def detener(self) -> None:
+        self.parar.set()
+
+    def _debe_parar(self) -> bool:
+        return self.parar.is_set() or (self.externo is not None and self.externo.is_set())
+
+    def _leer(self) -> None:
+        try:
+            while not self._debe_parar():
+                trama = self.lector.leer_trama(parar=self._debe_parar)
+                if trama is None:
+                    continue
+                if self.al_leer is not None:
+                    self.al_leer(trama)
+                self.escritura.encolar((trama, self.leidas)) # type: ignore[arg-type]
+                self.leidas += 1
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.parar.set()
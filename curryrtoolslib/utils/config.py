@@ -1,6 +1,6 @@
 import configparser
 import os
-from typing import List, Dict
+from typing import Any, List, Dict, Optional
 class ConfigurationManager:
 
     config : 'configparser.ConfigParser'
@@ -16,7 +16,8 @@ class ConfigurationManager:
         'timeout': '0.1',
         'repeticionesenvio' : ' 30',
         'portsalida': '/dev/ttyUSB1',
-        'neuronasfirstlayer': '79'
+        'neuronasfirstlayer': '79',
+        'formatocaptura': 'bin'
     }
 
     def __init__(self) -> None:
@@ -53,10 +54,10 @@ class ConfigurationManager:
                 print(f"Error al obtener la clave {key}: {e}")
             if current_val is None or current_val != val:
                 self.config.set('CONFIG', key, str(val))
-                need_updated = True
+                need_update = True
             
                 
-        if need_updated:
+        if need_update:
             self.save_config_file()
     
     def load_config(self) -> None:
@@ -77,6 +78,7 @@ class ConfigurationManager:
             self.get('repeticionesenvio')
             self.get('portsalida')   
             self.get('neuronasfirstlayer')        
+            self.get('formatocaptura')
 
     def save_config_file(self) -> None:
         with open(self.file_name, 'w') as configfile:
@@ -96,5 +98,22 @@ class ConfigurationManager:
                 lista.append(key_org)
         
         return lista
-        
 
+
+class ConfiguracionPerezosa:
+    """
+    Crea el ``ConfigurationManager`` la primera vez que se usa.
+
+    Así importar el paquete no lee (ni crea) ``config.ini``: ``--help`` y las acciones
+    que no usan la configuración arrancan sin tocar el disco.
+    """
+
+    _config: Optional[ConfigurationManager]
+
+    def __init__(self) -> None:
+        self._config = None
+
+    def __getattr__(self, name: str) -> Any:
+        if self._config is None:
+            self._config = ConfigurationManager()
+        return getattr(self._config, name)
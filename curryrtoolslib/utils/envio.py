@@ -0,0 +1,133 @@
+"""
+Envío de tramas precargadas por una única conexión serie.
+
+Las tramas se leen y se decodifican una sola vez; después se emiten tantas veces
+como haga falta sobre el mismo puerto abierto, con un ritmo configurable:
+
+* ``fijo:<segundos>``: pausa fija tras cada bloque (por defecto ``fijo:0.18``).
+* ``original``: reproduce los silencios entre bloques registrados en la captura.
+* ``linea``: deja sólo el silencio mínimo para que el receptor separe los bloques.
+"""
+import math
+import time
+from datetime import datetime
+
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from . import trama as trama_tools
+
+if TYPE_CHECKING:
+    from .metricas import RegistroMetricas
+
+RITMO_DEFECTO = "fijo:0.18"
+MAX_SILENCIO_ORIGINAL = 1.0
+
+# Una trama a enviar: sus bloques con la hora (epoch) a la que se capturaron
+TramaEnvio = List[Tuple[bytes, float]]
+
+
+def cargar_tramas_envio(rutas: List[str]) -> List[TramaEnvio]:
+    """Carga y decodifica una vez todas las tramas de los ficheros indicados."""
+    tramas: List[TramaEnvio] = []
+    for ruta in rutas:
+        for bloques in trama_tools.cargar_tramas(ruta):
+            tramas.append([(bloque["data"], _a_epoch(bloque["time"])) for bloque in bloques])
+    return tramas
+
+
+def _a_epoch(hora: Any) -> float:
+    try:
+        return datetime.fromisoformat(str(hora)).timestamp()
+    except ValueError:
+        return 0.0
+
+
+class Ritmo:
+
+    def __init__(self, definicion: str, baudrate: int, timeout: float) -> None:
+        """
+        :param definicion: ``fijo:<segundos>``, ``original`` o ``linea``.
+        :param baudrate: Velocidad del puerto, para calcular el tiempo en línea.
+        :param timeout: Silencio que usa el receptor para separar bloques.
+        """
+        self.definicion = definicion or RITMO_DEFECTO
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.pausa_fija = 0.0
+        nombre, _, valor = self.definicion.partition(":")
+        if nombre == "fijo":
+            try:
+                self.pausa_fija = float(valor or RITMO_DEFECTO.split(":")[1])
+            except ValueError:
+                self.pausa_fija = math.nan
+            # Falla también con NaN
+            if not self.pausa_fija >= 0:
+                raise Exception("Ritmo %s no válido: la pausa tiene que ser un número de segundos >= 0" % self.definicion)
+        elif nombre not in ("original", "linea"):
+            raise Exception("Ritmo %s no válido. Opciones: fijo:<segundos>, original, linea" % self.definicion)
+        self.nombre = nombre
+
+    def pausa(self, actual: Tuple[bytes, float], siguiente: Any) -> float:
+        """
+        Segundos a esperar, tras terminar de transmitir ``actual``, antes de empezar ``siguiente``.
+        ``siguiente`` es None al final de la tanda.
+        """
+        if self.nombre == "fijo":
+            return self.pausa_fija
+        if self.nombre == "linea" or siguiente is None or not actual[1] or not siguiente[1]:
+            # Un poco más del timeout del receptor para que cierre el bloque
+            return self.timeout * 1.2
+        transmision = len(actual[0]) * 10 / self.baudrate
+        silencio = siguiente[1] - actual[1] - transmision
+        return min(max(silencio, self.timeout * 1.2), MAX_SILENCIO_ORIGINAL)
+
+
+class EmisorTramas:
+
+    contadores: Dict[str, float]
+
+    def __init__(self, ser: Any, ritmo: Ritmo, verbose: bool = True, metricas: Optional['RegistroMetricas'] = None) -> None:
+        """
+        :param ser: Puerto serie abierto durante toda la sesión.
+        :param ritmo: Política de espera entre bloques.
+        :param metricas: Registro en el que contar las tramas y bytes enviados.
+        """
+        self.ser = ser
+        self.metricas = metricas
+        self.ritmo = ritmo
+        self.verbose = verbose
+        self.contadores = {
+            "tramas": 0,
+            "bloques": 0,
+            "bytes": 0,
+            "segundos": 0.0,
+        }
+
+    def enviar(self, tramas: List[TramaEnvio]) -> None:
+        inicio = time.perf_counter()
+        bloques = [bloque for trama in tramas for bloque in trama]
+        for num, bloque in enumerate(bloques):
+            data = bloque[0]
+            if self.verbose:
+                print("Enviado %s/%s : %s (%s bytes)" % (0, num+1, [hex(val) for val in data], len(data)))
+            self.ser.write(data)
+            self.ser.flush()
+            self.contadores["bloques"] += 1
+            self.contadores["bytes"] += len(data)
+            siguiente = bloques[num + 1] if num + 1 < len(bloques) else None
+            pausa = self.ritmo.pausa(bloque, siguiente)
+            if pausa > 0:
+                time.sleep(pausa)
+        segundos = time.perf_counter() - inicio
+        self.contadores["tramas"] += len(tramas)
+        self.contadores["segundos"] += segundos
+        if self.metricas is not None:
+            self.metricas.contador("tramas_enviadas_total", "Tramas enviadas").incrementar(len(tramas))
+            self.metricas.contador("bytes_enviados_total", "Bytes enviados").incrementar(sum(len(bloque[0]) for bloque in bloques))
+            self.metricas.histograma("duracion_envio_segundos", "Duración de cada envío de tramas").observar(segundos)
+
+    def mostrar_resumen(self) -> None:
+        segundos = self.contadores["segundos"] or 1e-9
+        print("# ENVÍO: %d tramas, %d bloques, %d bytes en %.2f s (%.2f tramas/s, %.1f bytes/s, ritmo %s)" % (
+            self.contadores["tramas"], self.contadores["bloques"], self.contadores["bytes"], self.contadores["segundos"],
+            self.contadores["tramas"] / segundos, self.contadores["bytes"] / segundos, self.ritmo.definicion))
@@ -0,0 +1,20 @@
+"""Utilidades de estadística para latencias y tiempos."""
+import math
+
+from typing import Sequence
+
+
+def percentil(valores: Sequence[float], porcentaje: float) -> float:
+    """Percentil por el método del rango más cercano. Devuelve 0 si no hay valores."""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    pos = max(0, math.ceil(porcentaje / 100 * len(ordenados)) - 1)
+    return ordenados[min(pos, len(ordenados) - 1)]
+
+
+def resumen_latencias(valores_ms: Sequence[float]) -> str:
+    if not valores_ms:
+        return "sin datos"
+    return "n=%d p50=%.2f ms p99=%.2f ms max=%.2f ms" % (
+        len(valores_ms), percentil(valores_ms, 50), percentil(valores_ms, 99), max(valores_ms))
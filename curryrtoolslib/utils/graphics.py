@@ -1,6 +1,3 @@
-import numpy as np
-import matplotlib.pyplot as plt
-
 def mostrar_graf(historial):
     import matplotlib.pyplot as plt
     plt.plot(historial.history['accuracy'], label='Precisión')
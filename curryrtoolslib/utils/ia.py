@@ -1,7 +1,13 @@
 import tensorflow as tf
+import numpy as np
+import glob
+import json
 import os
+import time
+from datetime import datetime
 from .. import CONFIG
-from typing import Optional, List, TYPE_CHECKING, Tuple, Any, Iterable
+from .modelo_numpy import TAMANO_BLOQUE_PREDICCION
+from typing import Optional, List, TYPE_CHECKING, Tuple, Any, Iterable, Dict
 
 if TYPE_CHECKING:
     from tensorflow.python.data.ops.dataset_ops import DatasetV2 # type: ignore [import]
@@ -12,15 +18,100 @@ if TYPE_CHECKING:
 TAMANO_LOTE = 10
 REPETICIONES= 1
 
+FRACCION_VALIDACION = 0 # Fracción de las tramas para validar (0: se entrena con todas)
+PACIENCIA = 0           # Épocas sin mejorar antes de parar (0: sin parada temprana)
+MEJORA_MINIMA = 1e-6
+CHECKPOINT_CADA = 100   # Épocas entre checkpoints (0: sin checkpoints)
+CARPETA_CHECKPOINTS = "checkpoints"
+
+# Perfiles de rendimiento para entrenar en CPU. Hilos a 0: los que decida TensorFlow
+PERFILES: Dict[str, Dict[str, Any]] = {
+    # Lo de siempre: ajustes de TensorFlow y lotes pequeños
+    "defecto": {"hilos_intra": 0, "hilos_inter": 0, "jit": False, "tamano_lote": TAMANO_LOTE, "pasos_ejecucion": 1},
+    # Máquina dedicada: cada operación usa todos los núcleos y la pila Dense se compila con XLA
+    "cpu": {"hilos_intra": os.cpu_count() or 1, "hilos_inter": 2, "jit": True, "tamano_lote": 256, "pasos_ejecucion": 16},
+    # Máquina compartida: la mitad de los núcleos
+    "cpu-compartida": {"hilos_intra": max(1, (os.cpu_count() or 1) // 2), "hilos_inter": 1, "jit": True, "tamano_lote": 128, "pasos_ejecucion": 8},
+}
+
 """ def preprocess_fn(data, result):
     return data, result """
 
-def crear_dataset(datas : List[int], results : Optional[List[int]]) -> 'DatasetV2':
+def crear_dataset(datas : List[int], results : Optional[List[int]], tamano_lote: int = TAMANO_LOTE, buffer_shuffle: int = 0, repeticiones: int = REPETICIONES, barajar: bool = True) -> 'DatasetV2':
+    """
+    Pipeline de entrada: normaliza todo de una vez, cachea, baraja, repite, agrupa en lotes y precarga.
+
+    :param datas: Tramas normalizadas (N, 1, neuronas) o lista de tramas (1, neuronas).
+    :param results: Resultados esperados (N, 1, 1); None para predecir (no se baraja).
+    :param tamano_lote: Muestras por paso de entrenamiento.
+    :param buffer_shuffle: Tamaño del buffer para barajar; 0 usa todo el dataset.
+    :param repeticiones: Veces que se repite el dataset en cada época.
+    :param barajar: False para el dataset de validación.
+    """
+    # Una sola operación sobre todo el array; cada muestra es un vector (neuronas,)
+    datos = np.asarray(datas, dtype=np.float32)
+    datasn = normalizar(datos.reshape(len(datos), -1))
+    if results is None or not len(results):
+        dataset = tf.data.Dataset.from_tensor_slices(datasn)
+    else:
+        resultados = np.asarray(results, dtype=np.float32)
+        dataset = tf.data.Dataset.from_tensor_slices((datasn, normalizar(resultados.reshape(len(resultados), -1))))
+        dataset = dataset.cache()
+        if barajar:
+            dataset = dataset.shuffle(buffer_shuffle or max(len(datos), 1), reshuffle_each_iteration=True)
+
+    return dataset.repeat(repeticiones).batch(max(1, tamano_lote)).prefetch(tf.data.AUTOTUNE)
+
+def dividir_validacion(datos: Any, resultados: Any, fraccion: float, semilla: int) -> Tuple[Tuple[Any, Any], Optional[Tuple[Any, Any]]]:
+    """
+    Separa al azar una fracción de las tramas para validar.
+
+    Con la misma semilla y el mismo dataset la división es la misma, así que todos los
+    candidatos de un barrido validan con las mismas tramas y, al reanudar un entrenamiento,
+    la validación no se mezcla con el entrenamiento.
+
+    :return: (datos, resultados) de entrenamiento y de validación, o None si no queda ninguna trama para validar.
+    """
+    num_validacion = int(len(datos) * fraccion)
+    if num_validacion < 1 or num_validacion >= len(datos):
+        return (datos, resultados), None
+    orden = np.random.default_rng(semilla).permutation(len(datos))
+    validacion, entrenamiento = np.sort(orden[:num_validacion]), np.sort(orden[num_validacion:])
+    return (datos[entrenamiento], resultados[entrenamiento]), (datos[validacion], resultados[validacion])
+
+def perfil_rendimiento(nombre: str, **cambios: Any) -> Dict[str, Any]:
+    """
+    Ajustes de un perfil de ``PERFILES`` con los cambios indicados (los None se ignoran).
+    """
+    if nombre not in PERFILES:
+        raise Exception("Perfil %s no reconocido. Opciones: %s" % (nombre, ", ".join(PERFILES)))
+    perfil = dict(PERFILES[nombre], nombre=nombre)
+    perfil.update({clave: valor for clave, valor in cambios.items() if valor is not None})
+    return perfil
 
-    datasn = [normalizar(data) for data in datas]
-    resultsn = [normalizar(result) for result in results] if results else None
-    dataset = tf.data.Dataset.from_tensor_slices((datasn, resultsn)) # type: ignore [arg-type]
-    return dataset.prefetch(buffer_size=tf.data.experimental.AUTOTUNE).repeat(REPETICIONES).shuffle(len(datas))
+def configurar_hilos(hilos_intra: int, hilos_inter: int) -> None:
+    """Tamaño de los pools de hilos de TensorFlow. Hay que llamarlo antes de crear o cargar el modelo."""
+    try:
+        if hilos_intra:
+            tf.config.threading.set_intra_op_parallelism_threads(hilos_intra)
+        if hilos_inter:
+            tf.config.threading.set_inter_op_parallelism_threads(hilos_inter)
+    except RuntimeError as e:
+        print("No se pueden cambiar los hilos de TensorFlow ya iniciado: %s" % e)
+
+def aplicar_perfil(modelo: Any, perfil: Dict[str, Any]) -> None:
+    """
+    Vuelve a compilar el modelo con la compilación XLA y los pasos por ejecución del perfil.
+    Se conserva el optimizador, así que un modelo cargado o reanudado no pierde su estado.
+    """
+    print("Perfil %(nombre)s: hilos intra %(hilos_intra)s, inter %(hilos_inter)s, jit %(jit)s, lote %(tamano_lote)s, pasos por ejecución %(pasos_ejecucion)s" % perfil)
+    modelo.compile(
+        optimizer=modelo.optimizer,
+        loss='mean_squared_error',
+        metrics=['accuracy'],
+        jit_compile=bool(perfil["jit"]),
+        steps_per_execution=max(1, int(perfil["pasos_ejecucion"])),
+    )
 
 def normalizar(datos : int) -> 'tf.Tensor':
     datosf: 'tf.Tensor' = tf.cast(datos, tf.float32)
@@ -58,44 +149,155 @@ def init_modelo(input_schema : Tuple[int, int], layers: Iterable[int] , output_s
     return modelo
 
 
-def predecir(trama: str , modelo : Any):
-    #trama = np.array(trama)
-    prediccion = modelo.predict(trama)
-    print(prediccion)
-    str_val = bin(int(prediccion[0][0]))[2:].zfill(8)
-    for control in ["FAN","COLD","DRY","HOT"]:
-        val = "OFF"
-        if control == "FAN":
-            sub_str = str_val[2:5]
-            val =  "1" if sub_str == "100" else "2" if sub_str == "010" else "3" if sub_str == "001" else "0"
-        elif control == "COLD":
-            val = "ON" if str_val[5] == "1" else "OFF"
-        elif control == "DRY":
-            val = "ON" if str_val[6] == "1" else "OFF"
-        elif control == "HOT":
-            val = "ON" if str_val[7] == "1" else "OFF"
-        else:
-            val = "???"
-        print("%s: %s" % (control, val))
-    """ posiciones=""
-    for num, clase in enumerate(lista_clases):
-        pos = "ON" if prediccion[0][num] == 1.0 else "OFF"
-        posiciones += "1" if pos == "ON" else "0"
-        print("%s : %s (accuracy:%s)" % (clase, pos, prediccion[0][num]))
-    #nombre_clases[np.argmax(prediccion[0])]
-    print(posiciones) """
-
-
-def entrenar_datos(datos, epocas, num_datos, modelo, verb=True):
+def predecir(datos: Any, modelo : Any, tamano_bloque: int = TAMANO_BLOQUE_PREDICCION) -> 'np.ndarray':
+    """
+    Ejecuta la red sobre todas las tramas con una pasada por bloque.
+
+    :param datos: Tramas normalizadas (N, 1, neuronas) o (N, neuronas), en 0...255.
+    :param tamano_bloque: Tramas por pasada, para acotar la memoria.
+    :return: Salida de la red para cada trama (N,).
+    """
+    datos = np.asarray(datos, dtype=np.float32)
+    forma_entrada = tuple(modelo.input_shape[1:])
+    salidas = []
+    for inicio in range(0, len(datos), max(1, tamano_bloque)):
+        bloque = datos[inicio:inicio + tamano_bloque]
+        bloque = normalizar(bloque.reshape((len(bloque),) + forma_entrada))
+        salida = np.asarray(modelo.predict_on_batch(bloque))
+        salidas.append(salida.reshape(len(salida), -1)[:, 0])
+    return np.concatenate(salidas) if salidas else np.zeros(0, dtype=np.float32)
+
+
+def entrenar_datos(datos, epocas, num_datos, modelo, verb=True, validacion=None, callbacks=None, epoca_inicial=0):
 
     print("Entrenando modelo durante %d epocas ..." % (epocas))
-    print("Datos: %d" % num_datos)
+    if epoca_inicial:
+        print("Reanudando desde la época %d" % epoca_inicial)
+    print("Lotes por época: %d" % num_datos)
     print("Modelo: %s" %  modelo)
-    result = modelo.fit(datos, epochs=epocas, verbose=verb) #, steps_per_epoch=math.ceil(num_datos/TAMANO_LOTE)
+    result = modelo.fit(datos, epochs=epocas, verbose=verb, validation_data=validacion, callbacks=callbacks, initial_epoch=epoca_inicial) #, steps_per_epoch=math.ceil(num_datos/TAMANO_LOTE)
     print("Entrenamiento finalizado")
     return result
 
 
+class ControlEntrenamiento(tf.keras.callbacks.Callback):
+    """
+    Parada temprana y checkpoints periódicos en ``<modelofolder>/checkpoints``.
+
+    Cada checkpoint guarda el modelo (con el estado del optimizador), los mejores pesos
+    vistos y un ``.json`` con la época, la mejor pérdida y la espera de la parada
+    temprana, para que ``--reanudar`` continúe exactamente donde se quedó.
+    """
+
+    def __init__(self, folder: str, paciencia: int = PACIENCIA, cada: int = CHECKPOINT_CADA, estado: Optional[Dict[str, Any]] = None, monitor: str = "val_loss", semilla: int = 0) -> None:
+        """
+        :param folder: Carpeta de modelos.
+        :param paciencia: Épocas sin mejorar antes de parar; 0 desactiva la parada temprana.
+        :param cada: Épocas entre checkpoints; 0 desactiva los checkpoints.
+        :param estado: Estado de un checkpoint para reanudar (ver ``ultimo_checkpoint``).
+        :param monitor: Métrica que decide la parada temprana: ``val_loss`` o ``loss`` sin validación.
+        :param semilla: Semilla de la división de validación, que se guarda para reanudar con la misma.
+        """
+        super().__init__()
+        self.paciencia = paciencia
+        self.cada = cada
+        self.estado = estado or {
+            "nombre": "entrenamiento_%s" % datetime.now().strftime("%Y%m%d_%H%M%S"),
+            "epoca": 0,
+            "monitor": monitor,
+            "mejor": None,
+            "espera": 0,
+            "semilla": semilla,
+        }
+        base = os.path.join(folder, CARPETA_CHECKPOINTS, self.estado["nombre"])
+        self.ruta_modelo = base + ".keras"
+        self.ruta_pesos = base + "_mejor.npz"
+        self.ruta_estado = base + ".json"
+        self.mejores_pesos = None
+        if estado and os.path.exists(self.ruta_pesos):
+            with np.load(self.ruta_pesos) as pesos:
+                self.mejores_pesos = [pesos["pesos_%d" % num] for num in range(len(pesos.files))]
+
+    def on_epoch_end(self, epoch: int, logs: Optional[Dict[str, Any]] = None) -> None:
+        logs = logs or {}
+        self.estado["epoca"] = epoch + 1
+        valor = logs.get(self.estado["monitor"])
+        if valor is not None:
+            if self.estado["mejor"] is None or valor < self.estado["mejor"] - MEJORA_MINIMA:
+                self.estado["mejor"] = float(valor)
+                self.estado["espera"] = 0
+                self.mejores_pesos = self.model.get_weights()
+            else:
+                self.estado["espera"] += 1
+                if self.paciencia and self.estado["espera"] >= self.paciencia:
+                    print("\nParada temprana en la época %d: %s sin mejorar en %d épocas (mejor %.6f)" % (
+                        epoch + 1, self.estado["monitor"], self.estado["espera"], self.estado["mejor"]))
+                    self.model.stop_training = True
+
+        if self.cada and ((epoch + 1) % self.cada == 0 or self.model.stop_training):
+            self.guardar()
+
+    def on_train_end(self, logs: Optional[Dict[str, Any]] = None) -> None:
+        if self.paciencia and self.mejores_pesos is not None:
+            self.model.set_weights(self.mejores_pesos)
+
+    def guardar(self) -> None:
+        os.makedirs(os.path.dirname(self.ruta_modelo), exist_ok=True)
+        # El estado se escribe el último: un checkpoint sin .json no se reanuda
+        self.model.save(self.ruta_modelo)
+        if self.mejores_pesos is not None:
+            np.savez(self.ruta_pesos, **{"pesos_%d" % num: pesos for num, pesos in enumerate(self.mejores_pesos)})
+        temporal = self.ruta_estado + ".tmp"
+        with open(temporal, "w") as fichero:
+            json.dump(dict(self.estado, modelo=self.ruta_modelo), fichero, indent=1)
+        os.replace(temporal, self.ruta_estado)
+
+    def borrar(self) -> None:
+        """Elimina el checkpoint cuando el modelo final ya está guardado."""
+        for ruta in (self.ruta_estado, self.ruta_modelo, self.ruta_pesos):
+            if os.path.exists(ruta):
+                os.remove(ruta)
+
+
+class RendimientoEpocas(tf.keras.callbacks.Callback):
+    """Mide las muestras por segundo de cada época y las añade al historial como ``muestras_s``."""
+
+    def __init__(self, muestras: int) -> None:
+        """:param muestras: Muestras de entrenamiento por época."""
+        super().__init__()
+        self.muestras = muestras
+        self.tasas: List[float] = []
+        self.inicio = 0.0
+
+    def on_epoch_begin(self, epoch: int, logs: Optional[Dict[str, Any]] = None) -> None:
+        self.inicio = time.perf_counter()
+
+    def on_epoch_end(self, epoch: int, logs: Optional[Dict[str, Any]] = None) -> None:
+        segundos = time.perf_counter() - self.inicio
+        tasa = self.muestras / max(segundos, 1e-9)
+        self.tasas.append(tasa)
+        if logs is not None:
+            logs["muestras_s"] = tasa
+        print("# RENDIMIENTO época %d: %.0f muestras/s (%.3f s)" % (epoch + 1, tasa, segundos))
+
+    def on_train_end(self, logs: Optional[Dict[str, Any]] = None) -> None:
+        if not self.tasas:
+            return
+        # La primera época incluye el trazado y la compilación XLA
+        tasas = sorted(self.tasas[1:] or self.tasas)
+        print("# RENDIMIENTO: %d épocas, mediana %.0f muestras/s, máximo %.0f muestras/s, primera época %.0f muestras/s" % (
+            len(self.tasas), tasas[len(tasas) // 2], tasas[-1], self.tasas[0]))
+
+
+def ultimo_checkpoint(folder: str) -> Optional[Dict[str, Any]]:
+    """Estado del checkpoint más reciente de la carpeta de modelos, o None si no hay ninguno."""
+    estados = glob.glob(os.path.join(folder, CARPETA_CHECKPOINTS, "*.json"))
+    if not estados:
+        return None
+    with open(max(estados, key=os.path.getmtime), "r") as fichero:
+        return json.load(fichero)
+
+
 def load_modelo(nombre_modelo, folder: str):
     nombre_modelo = os.path.basename(nombre_modelo)
     if os.path.exists(nombre_modelo):
@@ -119,9 +321,13 @@ def save_modelo(config, modelo, nombre_modelo):
     modelo.save(nombre_modelo)
     print("Modelo guardado en %s" % nombre_modelo)
 
-def recoge_datos_modelo(modelo):
+def recoge_datos_modelo(modelo, historial=None):
+    """:return: Épocas entrenadas según el historial de ``fit`` (None sin historial) y neuronas de cada capa."""
     layers = []
     epocas = None
+    if historial is not None and historial.epoch:
+        # Con initial_epoch, las épocas del historial ya cuentan las anteriores
+        epocas = historial.epoch[-1] + 1
     for capa in modelo.layers:
         layers.append(str(capa.output.shape[1]))
 
@@ -0,0 +1,110 @@
+"""
+Ingesta de capturas para construir el dataset de entrenamiento.
+
+Los ficheros se reparten en lotes entre varios procesos; cada proceso carga y
+normaliza sus tramas y devuelve sus arrays. Los resultados se unen en el orden de
+los lotes, así que el dataset es el mismo con uno o con varios procesos. Los
+errores (ficheros que faltan, capturas corruptas...) se acumulan en un informe.
+"""
+import math
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from . import trama as trama_tools
+from .cache import ficheros_entrada
+
+LOTES_POR_PROCESO = 4
+
+
+class ResultadoIngesta(NamedTuple):
+    datos: Any
+    resultados: Any
+    # Filas que aporta cada fichero, en orden; None si no se pudo cargar
+    filas: List[Optional[int]]
+    omitidas: int
+    errores: List[Tuple[str, str]]
+
+
+def preparar_tramas(tramas: List[List[Dict[str, Any]]], layer_size: int) -> Tuple[Any, Any, Any]:
+    """
+    Normaliza de una vez las tramas cargadas y calcula el resultado esperado de cada una.
+
+    :return: Datos (N, 1, layer_size) y resultados (N, 1, 1) de las tramas válidas, ambos float32,
+             y vector booleano con las tramas de entrada que caben en la primera capa.
+    """
+    datos, validas = trama_tools.normalizar_tramas([[bloque["data"] for bloque in trama] for trama in tramas], layer_size)
+    resultados = np.array([trama_tools.codificar_valores(trama[0]["values"]) for trama in tramas], dtype=np.float32)
+    return datos[validas][:, np.newaxis, :], resultados[validas].reshape(-1, 1, 1), validas
+
+
+def procesar_ficheros(rutas: List[str], layer_size: int) -> ResultadoIngesta:
+    """Carga y normaliza un lote de ficheros. Se ejecuta en los procesos del pool."""
+    tramas: List[List[Dict[str, Any]]] = []
+    propietarios: List[int] = []
+    cargados = np.zeros(len(rutas), dtype=bool)
+    errores = []
+    for num, ruta in enumerate(rutas):
+        faltan = [fichero for fichero in ficheros_entrada(ruta) if not os.path.exists(fichero)]
+        if faltan:
+            errores.append((ruta, "No existe el fichero %s" % ", ".join(faltan)))
+            continue
+        try:
+            tramas_fichero = trama_tools.cargar_tramas(ruta)
+        except Exception as e:
+            errores.append((ruta, "%s: %s" % (type(e).__name__, e)))
+            continue
+        tramas.extend(tramas_fichero)
+        propietarios.extend([num] * len(tramas_fichero))
+        cargados[num] = True
+
+    datos, resultados, validas = preparar_tramas(tramas, layer_size)
+    por_fichero = np.bincount(np.asarray(propietarios, dtype=np.int64)[validas], minlength=len(rutas))
+    filas = [int(total) if cargado else None for total, cargado in zip(por_fichero, cargados)]
+    return ResultadoIngesta(datos, resultados, filas, int((~validas).sum()), errores)
+
+
+def ingerir(rutas: List[str], layer_size: int, workers: int = 1) -> ResultadoIngesta:
+    """
+    :param rutas: Ficheros de captura (``.bin`` o segmentos ``.clog``).
+    :param layer_size: Neuronas de la primera capa.
+    :param workers: Procesos a usar; con 1 todo se hace en el proceso actual.
+    """
+    workers = max(1, min(workers, len(rutas)))
+    if workers == 1:
+        return procesar_ficheros(rutas, layer_size)
+
+    tamano_lote = max(1, math.ceil(len(rutas) / (workers * LOTES_POR_PROCESO)))
+    lotes = [rutas[inicio:inicio + tamano_lote] for inicio in range(0, len(rutas), tamano_lote)]
+    parciales: List[ResultadoIngesta] = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futuros = [pool.submit(procesar_ficheros, lote, layer_size) for lote in lotes]
+        for lote, futuro in zip(lotes, futuros):
+            try:
+                parciales.append(futuro.result())
+            except Exception as e:
+                print(traceback.format_exc())
+                parciales.append(ResultadoIngesta(np.zeros((0, 1, layer_size), dtype=np.float32), np.zeros((0, 1, 1), dtype=np.float32),
+                                                  [None] * len(lote), 0, [(ruta, "Fallo del proceso: %s" % e) for ruta in lote]))
+
+    return ResultadoIngesta(
+        np.concatenate([parcial.datos for parcial in parciales]),
+        np.concatenate([parcial.resultados for parcial in parciales]),
+        [filas for parcial in parciales for filas in parcial.filas],
+        sum(parcial.omitidas for parcial in parciales),
+        [error for parcial in parciales for error in parcial.errores],
+    )
+
+
+def mostrar_informe(resultado: ResultadoIngesta, layer_size: int) -> None:
+    if resultado.omitidas:
+        print("Omitidas %s tramas con más de %s datos" % (resultado.omitidas, layer_size))
+    if not resultado.errores:
+        return
+    print("# INGESTA: %s ficheros con errores" % len(resultado.errores))
+    for ruta, mensaje in resultado.errores:
+        print("  %s: %s" % (ruta, mensaje))
@@ -0,0 +1,233 @@
+"""
+Lector de tramas del puerto serie por bloques.
+
+Lee de golpe todo lo que indica ``in_waiting`` sobre un buffer reservado de
+antemano y separa bloques y tramas por los silencios entre bytes, medidos con
+``time.monotonic_ns``. Devuelve la misma estructura ``(bloques, tiempos)`` que
+recibe ``trama.guardar_trama_bytes``.
+
+Con un ``trama.ParserTramas`` los bytes que el parser descarta (basura antes de la
+cabecera, restos que no pueden formar una trama) se quitan del buffer según llegan,
+en lugar de guardarlos y validarlos al final, y las tramas que llegan seguidas sin
+silencio se separan donde el parser encuentra el final de cada una. Las que el parser
+descarta (cortadas, sin tamaño válido...) se cuentan en ``tramas_descartadas``.
+"""
+import collections
+import time
+from datetime import datetime
+
+from typing import List, Tuple, Any, Optional, Callable, Deque, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .trama import ParserTramas, EventoTrama
+
+TAMANO_BUFFER = 1024
+
+Trama = Tuple[List[bytes], List[List[Any]]]
+
+
+class LectorTramas:
+
+    buffer: bytearray
+    bloques: List[Tuple[int, int, int]]
+    completas: Deque[Trama]
+
+    def __init__(self, ser: Any, silencio_bloque: float, silencio_trama: Optional[float] = None, tamano_buffer: int = TAMANO_BUFFER,
+                 al_cerrar_bloque: Optional[Callable[[bytes, int], None]] = None, parser: Optional['ParserTramas'] = None) -> None:
+        """
+        :param ser: Puerto serie abierto (``serial.Serial`` o compatible).
+        :param silencio_bloque: Segundos sin datos que cierran un bloque.
+        :param silencio_trama: Segundos sin datos que cierran la trama, por defecto el doble de ``silencio_bloque``.
+        :param tamano_buffer: Tamaño inicial del buffer de recepción.
+        :param al_cerrar_bloque: Se llama con cada bloque en cuanto se cierra y el instante de su último byte.
+        :param parser: Parser incremental con el que descartar la basura según llega.
+        """
+        self.ser = ser
+        self.al_cerrar_bloque = al_cerrar_bloque
+        self.parser = parser
+        self.descartados = 0
+        # Tramas con cabecera que el parser descarta: longitud no válida o cortadas
+        self.tramas_descartadas = 0
+        # Posición, contando todo lo recibido, del byte siguiente al final del buffer
+        self.fin_abs = 0
+        self.silencio_bloque_ns = int(silencio_bloque * 1e9)
+        if silencio_trama is None:
+            silencio_trama = silencio_bloque * 2
+        self.silencio_trama_ns = int(silencio_trama * 1e9)
+        self.buffer = bytearray(tamano_buffer)
+        self.pos = 0
+        self.bloques = []
+        self.inicio_bloque = 0
+        self.t_inicio_bloque = 0
+        self.ultimo_ns = 0
+        # Tramas cerradas pendientes de devolver (varias cuando llegan seguidas)
+        self.completas = collections.deque()
+        # Silencio antes de la última trama extraída y último byte de la anterior, para las métricas
+        self.hueco_ns = 0
+        self.fin_trama_ns = 0
+        # Referencia para pasar de monotonic_ns a hora de reloj sin llamar a datetime.now() por byte
+        self.ref_monotonic = time.monotonic_ns()
+        self.ref_reloj = time.time_ns()
+
+    def bloque_abierto(self) -> bool:
+        return self.pos > self.inicio_bloque
+
+    def pendiente(self) -> bool:
+        return bool(self.bloques) or self.bloque_abierto()
+
+    def alimentar(self, datos: bytes, t_ns: int) -> Optional[Trama]:
+        """
+        Añade un trozo recibido en el instante ``t_ns``.
+
+        Si el silencio previo cierra la trama en curso, la devuelve y los nuevos datos
+        pasan a formar parte de la siguiente. Con parser, también se cierra la trama en
+        curso cuando el parser encuentra su final sin silencio. Si se cierran varias
+        tramas a la vez, las demás se devuelven en las siguientes llamadas.
+        """
+        if self.pendiente():
+            silencio = t_ns - self.ultimo_ns
+            if silencio >= self.silencio_trama_ns:
+                self._cerrar_trama()
+            elif silencio >= self.silencio_bloque_ns and self.bloque_abierto():
+                self._cerrar_bloque()
+
+        if not self.bloque_abierto():
+            self.inicio_bloque = self.pos
+            self.t_inicio_bloque = t_ns
+
+        fin = self.pos + len(datos)
+        if fin > len(self.buffer):
+            self.buffer.extend(bytes(max(len(self.buffer), fin - len(self.buffer))))
+        self.buffer[self.pos:fin] = datos
+        self.pos = fin
+        self.fin_abs += len(datos)
+        self.ultimo_ns = t_ns
+        if self.parser is not None:
+            self._procesar_eventos(self.parser.alimentar(datos), t_ns)
+        return self._siguiente()
+
+    def comprobar_silencio(self, ahora_ns: int) -> Optional[Trama]:
+        """Cierra el bloque y/o la trama en curso si el silencio hasta ``ahora_ns`` es suficiente."""
+        if self.completas:
+            return self.completas.popleft()
+        if not self.pendiente():
+            return None
+        silencio = ahora_ns - self.ultimo_ns
+        if silencio >= self.silencio_trama_ns:
+            self._cerrar_trama()
+            return self._siguiente()
+        if self.bloque_abierto() and silencio >= self.silencio_bloque_ns:
+            self._cerrar_bloque()
+        return None
+
+    def leer_trama(self, parar: Optional[Callable[[], bool]] = None) -> Optional[Trama]:
+        """
+        Lee del puerto hasta completar una trama.
+
+        Cuando no hay nada pendiente se bloquea en ``read(1)`` hasta el timeout del puerto,
+        así que no hace falta sondear. Devuelve None si ``parar()`` indica que hay que salir.
+        """
+        while True:
+            pendientes = self.ser.in_waiting
+            datos = self.ser.read(pendientes or 1)
+            ahora = time.monotonic_ns()
+            if datos:
+                trama = self.alimentar(datos, ahora)
+            else:
+                trama = self.comprobar_silencio(ahora)
+            if trama:
+                return trama
+            if parar is not None and parar():
+                return None
+
+    def hora(self, t_ns: int) -> str:
+        return str(datetime.fromtimestamp((self.ref_reloj + t_ns - self.ref_monotonic) / 1e9))
+
+    def _siguiente(self) -> Optional[Trama]:
+        return self.completas.popleft() if self.completas else None
+
+    def _cerrar_trama(self) -> None:
+        if self.parser is not None:
+            self._procesar_eventos(self.parser.fin(), self.ultimo_ns)
+        if self.bloque_abierto():
+            self._cerrar_bloque()
+        if self.bloques:
+            self.completas.append(self._extraer_trama(self.ultimo_ns))
+        # Si no quedan bloques, todo lo recibido era basura
+        self.pos = 0
+        self.inicio_bloque = 0
+
+    def _procesar_eventos(self, eventos: List['EventoTrama'], t_ns: int) -> None:
+        """
+        Aplica los eventos del parser al buffer: los bytes de ``resync`` y ``descartada``
+        se quitan y cada ``trama`` cierra la trama en curso donde termina.
+        """
+        for evento in eventos:
+            if evento.tipo == "trama":
+                corte = self.pos - (self.fin_abs - evento.inicio - len(evento.datos))
+                if corte > 0:
+                    self._cortar_trama(min(corte, self.pos), t_ns)
+                continue
+            self.descartados += len(evento.datos)
+            if evento.tipo == "descartada":
+                self.tramas_descartadas += 1
+            desde = max(0, self.pos - (self.fin_abs - evento.inicio))
+            hasta = max(0, self.pos - (self.fin_abs - evento.inicio - len(evento.datos)))
+            if hasta <= desde:
+                continue
+            quitados = hasta - desde
+            self.buffer[desde:self.pos - quitados] = self.buffer[hasta:self.pos]
+            self.pos -= quitados
+
+            def mover(posicion: int) -> int:
+                if posicion >= hasta:
+                    return posicion - quitados
+                return min(posicion, desde)
+
+            bloques = [(mover(inicio), mover(fin), t_ns) for inicio, fin, t_ns in self.bloques]
+            self.bloques = [bloque for bloque in bloques if bloque[1] > bloque[0]]
+            self.inicio_bloque = mover(self.inicio_bloque)
+
+    def _cerrar_bloque(self) -> None:
+        if self.parser is not None:
+            self.parser.hueco()
+        self.bloques.append((self.inicio_bloque, self.pos, self.t_inicio_bloque))
+        if self.al_cerrar_bloque is not None:
+            self.al_cerrar_bloque(bytes(self.buffer[self.inicio_bloque:self.pos]), self.ultimo_ns)
+        self.inicio_bloque = self.pos
+
+    def _cortar_trama(self, corte: int, t_ns: int) -> None:
+        """Cierra la trama en curso en la posición ``corte`` del buffer; lo que sigue empieza la siguiente."""
+        if self.bloque_abierto() and self.inicio_bloque < corte:
+            # El bloque abierto termina donde termina la trama
+            self.bloques.append((self.inicio_bloque, corte, self.t_inicio_bloque))
+            if self.al_cerrar_bloque is not None:
+                self.al_cerrar_bloque(bytes(self.buffer[self.inicio_bloque:corte]), t_ns)
+            self.inicio_bloque = corte
+            self.t_inicio_bloque = t_ns
+        siguientes = [(max(inicio, corte) - corte, fin - corte, t_bloque if inicio >= corte else t_ns)
+                      for inicio, fin, t_bloque in self.bloques if fin > corte]
+        self.bloques = [(inicio, min(fin, corte), t_bloque) for inicio, fin, t_bloque in self.bloques if inicio < corte]
+        if self.bloques:
+            self.completas.append(self._extraer_trama(t_ns))
+
+        resto = self.pos - corte
+        self.buffer[:resto] = self.buffer[corte:self.pos]
+        self.pos = resto
+        self.bloques = siguientes
+        self.inicio_bloque -= corte
+
+    def _extraer_trama(self, fin_ns: int) -> Trama:
+        """
+        Trama con los bloques cerrados; quien la extrae recoloca el buffer.
+
+        :param fin_ns: Instante de su último byte.
+        """
+        self.hueco_ns = self.bloques[0][2] - self.fin_trama_ns if self.fin_trama_ns else 0
+        self.fin_trama_ns = fin_ns
+        vista = memoryview(self.buffer)
+        bloques = [bytes(vista[inicio:fin]) for inicio, fin, _ in self.bloques]
+        tiempos = [[[self.hora(t_ns)], fin - inicio] for inicio, fin, t_ns in self.bloques]
+        vista.release()
+        self.bloques = []
+        return bloques, tiempos
@@ -0,0 +1,304 @@
+"""
+Métricas de ejecución de la captura, el repetidor y el envío.
+
+``RegistroMetricas`` guarda contadores, indicadores e histogramas por nombre. Los
+actualizan a la vez el hilo lector y los escritores, así que cada métrica tiene su
+propio lock. ``ExportadorMetricas`` las publica mientras dura la sesión:
+
+* En un fichero con el formato de texto de Prometheus, reescrito cada pocos segundos
+  (para el textfile collector de node_exporter o para mirarlo con ``watch cat``).
+* Por HTTP en local: ``/metrics`` en formato Prometheus y ``/`` en JSON.
+
+Al terminar se imprime un resumen con los totales, las tasas y los percentiles.
+"""
+import bisect
+import collections
+import http.server
+import json
+import math
+import os
+import threading
+import time
+import urllib.parse
+
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple, Union
+
+from . import estadisticas
+
+PREFIJO = "curryrtool_"
+INTERVALO_EXPORTACION = 10.0
+# Límites de las cubetas de los histogramas de tiempos, en segundos
+LIMITES_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Últimas observaciones de cada histograma con las que se calculan los percentiles del resumen
+MUESTRAS_RESUMEN = 10000
+
+
+def _formato(valor: float) -> str:
+    if math.isnan(valor):
+        return "NaN"
+    if math.isinf(valor):
+        return "+Inf" if valor > 0 else "-Inf"
+    if float(valor).is_integer():
+        return str(int(valor))
+    return repr(float(valor))
+
+
+class Contador:
+    """Valor que sólo crece. Con ``funcion`` se lee de otro sitio (p.ej. los contadores de una cola)."""
+
+    tipo = "counter"
+
+    def __init__(self, nombre: str, ayuda: str, funcion: Optional[Callable[[], float]] = None) -> None:
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.funcion = funcion
+        self.lock = threading.Lock()
+        self._valor = 0.0
+
+    def incrementar(self, valor: float = 1.0) -> None:
+        with self.lock:
+            self._valor += valor
+
+    @property
+    def valor(self) -> float:
+        if self.funcion is not None:
+            try:
+                return float(self.funcion())
+            except Exception:
+                return math.nan
+        with self.lock:
+            return self._valor
+
+    def lineas(self) -> List[str]:
+        return ["%s %s" % (self.nombre, _formato(self.valor))]
+
+    def como_dict(self) -> Any:
+        valor = self.valor
+        return int(valor) if valor.is_integer() else valor
+
+
+class Indicador(Contador):
+    """Valor que sube y baja: profundidad de la cola, tramas por segundo..."""
+
+    tipo = "gauge"
+
+    def fijar(self, valor: float) -> None:
+        with self.lock:
+            self._valor = valor
+
+
+class Histograma:
+    """Distribución de observaciones en cubetas acumuladas, como los histogramas de Prometheus."""
+
+    tipo = "histogram"
+
+    muestras: Deque[float]
+
+    def __init__(self, nombre: str, ayuda: str, limites: Sequence[float] = LIMITES_SEGUNDOS) -> None:
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.limites = sorted(limites)
+        self.lock = threading.Lock()
+        self.cubetas = [0] * (len(self.limites) + 1)
+        self.suma = 0.0
+        self.cuenta = 0
+        self.maximo = 0.0
+        self.muestras = collections.deque(maxlen=MUESTRAS_RESUMEN)
+
+    def observar(self, valor: float) -> None:
+        with self.lock:
+            self.cubetas[bisect.bisect_left(self.limites, valor)] += 1
+            self.suma += valor
+            self.cuenta += 1
+            self.maximo = max(self.maximo, valor)
+            self.muestras.append(valor)
+
+    def lineas(self) -> List[str]:
+        with self.lock:
+            cubetas, suma, cuenta = list(self.cubetas), self.suma, self.cuenta
+        lineas = []
+        acumulado = 0
+        for limite, num in zip(self.limites + [math.inf], cubetas):
+            acumulado += num
+            lineas.append('%s_bucket{le="%s"} %s' % (self.nombre, _formato(limite), acumulado))
+        lineas.append("%s_sum %s" % (self.nombre, _formato(suma)))
+        lineas.append("%s_count %s" % (self.nombre, cuenta))
+        return lineas
+
+    def como_dict(self) -> Dict[str, float]:
+        with self.lock:
+            muestras = list(self.muestras)
+            return {
+                "cuenta": self.cuenta,
+                "suma": round(self.suma, 6),
+                "p50": round(estadisticas.percentil(muestras, 50), 6),
+                "p99": round(estadisticas.percentil(muestras, 99), 6),
+                "max": round(self.maximo, 6),
+            }
+
+
+Metrica = Union[Contador, Indicador, Histograma]
+
+
+class RegistroMetricas:
+
+    metricas: Dict[str, Metrica]
+
+    def __init__(self, prefijo: str = PREFIJO) -> None:
+        self.prefijo = prefijo
+        self.metricas = {}
+        self.lock = threading.Lock()
+        self.inicio = time.monotonic()
+
+    def contador(self, nombre: str, ayuda: str = "", funcion: Optional[Callable[[], float]] = None) -> Contador:
+        return self._obtener(Contador, nombre, ayuda, funcion=funcion) # type: ignore[return-value]
+
+    def indicador(self, nombre: str, ayuda: str = "", funcion: Optional[Callable[[], float]] = None) -> Indicador:
+        return self._obtener(Indicador, nombre, ayuda, funcion=funcion) # type: ignore[return-value]
+
+    def histograma(self, nombre: str, ayuda: str = "", limites: Sequence[float] = LIMITES_SEGUNDOS) -> Histograma:
+        return self._obtener(Histograma, nombre, ayuda, limites=limites) # type: ignore[return-value]
+
+    def segundos(self) -> float:
+        return time.monotonic() - self.inicio
+
+    def texto_prometheus(self) -> str:
+        lineas = []
+        for metrica in self._lista():
+            lineas.append("# HELP %s %s" % (metrica.nombre, metrica.ayuda))
+            lineas.append("# TYPE %s %s" % (metrica.nombre, metrica.tipo))
+            lineas.extend(metrica.lineas())
+        return "\n".join(lineas) + "\n"
+
+    def como_dict(self) -> Dict[str, Any]:
+        datos: Dict[str, Any] = {"segundos": round(self.segundos(), 3)}
+        for metrica in self._lista():
+            datos[metrica.nombre[len(self.prefijo):]] = metrica.como_dict()
+        return datos
+
+    def escribir_fichero(self, ruta: str) -> None:
+        """Reescribe ``ruta`` de forma atómica para que un lector nunca vea el fichero a medias."""
+        temporal = "%s.%s.tmp" % (ruta, os.getpid())
+        with open(temporal, "w") as fichero:
+            fichero.write(self.texto_prometheus())
+        os.replace(temporal, ruta)
+
+    def mostrar_resumen(self, titulo: str = "MÉTRICAS") -> None:
+        segundos = self.segundos()
+        print("# %s (%.1f s):" % (titulo, segundos))
+        for metrica in self._lista():
+            nombre = metrica.nombre[len(self.prefijo):]
+            if isinstance(metrica, Histograma):
+                datos = metrica.como_dict()
+                if not datos["cuenta"]:
+                    continue
+                # Los tiempos se guardan en segundos, como pide Prometheus, pero se leen mejor en ms
+                escala, unidad = (1000, " ms") if nombre.endswith("_segundos") else (1, "")
+                print("  %-34s n=%s p50=%.2f%s p99=%.2f%s max=%.2f%s" % (
+                    nombre, datos["cuenta"], datos["p50"] * escala, unidad, datos["p99"] * escala, unidad, datos["max"] * escala, unidad))
+            elif isinstance(metrica, Indicador):
+                print("  %-34s %s" % (nombre, _formato(metrica.valor)))
+            else:
+                valor = metrica.valor
+                print("  %-34s %s (%.2f/s)" % (nombre, _formato(valor), valor / segundos if segundos > 0 else 0.0))
+
+    def _lista(self) -> List[Metrica]:
+        with self.lock:
+            return list(self.metricas.values())
+
+    def _obtener(self, clase: type, nombre: str, ayuda: str, **kwargs: Any) -> Metrica:
+        nombre_completo = self.prefijo + nombre
+        with self.lock:
+            metrica = self.metricas.get(nombre_completo)
+            if metrica is None:
+                metrica = clase(nombre_completo, ayuda, **kwargs)
+                self.metricas[nombre_completo] = metrica # type: ignore[assignment]
+            elif type(metrica) is not clase:
+                raise Exception("La métrica %s ya existe como %s" % (nombre, metrica.tipo))
+            return metrica # type: ignore[return-value]
+
+
+def parsear_destino(destino: str) -> Tuple[str, Any]:
+    """
+    ``http://127.0.0.1:9100`` o ``:9100`` -> ("http", (host, puerto)); cualquier otra cosa es un fichero.
+    """
+    if destino.startswith(":") and destino[1:].isdigit():
+        return "http", ("127.0.0.1", int(destino[1:]))
+    if destino.startswith("http://"):
+        url = urllib.parse.urlsplit(destino)
+        if not url.port:
+            raise Exception("Falta el puerto en %s" % destino)
+        return "http", (url.hostname or "127.0.0.1", url.port)
+    return "fichero", destino
+
+
+class ExportadorMetricas:
+
+    def __init__(self, registro: RegistroMetricas, destino: str, intervalo: float = INTERVALO_EXPORTACION) -> None:
+        """
+        :param registro: Métricas a exportar.
+        :param destino: Fichero ``.prom`` o ``http://host:puerto`` (``:puerto`` escucha en 127.0.0.1).
+        :param intervalo: Segundos entre escrituras del fichero.
+        """
+        self.registro = registro
+        self.tipo, self.destino = parsear_destino(destino)
+        self.intervalo = max(0.1, intervalo)
+        self.parar = threading.Event()
+        self.hilo: Optional[threading.Thread] = None
+        self.servidor: Optional[http.server.ThreadingHTTPServer] = None
+
+    def arrancar(self) -> None:
+        if self.tipo == "http":
+            self.servidor = http.server.ThreadingHTTPServer(self.destino, self._manejador())
+            self.servidor.daemon_threads = True
+            self.hilo = threading.Thread(target=self.servidor.serve_forever, name="metricas-http", daemon=True)
+            print("Métricas en http://%s:%s/metrics (JSON en /)" % self.destino)
+        else:
+            self.hilo = threading.Thread(target=self._escribir_periodicamente, name="metricas-fichero", daemon=True)
+            print("Métricas en %s cada %s s" % (self.destino, self.intervalo))
+        self.hilo.start()
+
+    def detener(self) -> None:
+        self.parar.set()
+        if self.servidor is not None:
+            self.servidor.shutdown()
+            self.servidor.server_close()
+        if self.hilo is not None:
+            self.hilo.join()
+        if self.tipo == "fichero":
+            # Los valores finales quedan en el fichero
+            self.registro.escribir_fichero(self.destino)
+
+    def _escribir_periodicamente(self) -> None:
+        while not self.parar.wait(self.intervalo):
+            try:
+                self.registro.escribir_fichero(self.destino)
+            except OSError as e:
+                print(f"Error al escribir las métricas: {e}")
+
+    def _manejador(self) -> type:
+        registro = self.registro
+
+        class Manejador(http.server.BaseHTTPRequestHandler):
+
+            def do_GET(self) -> None:
+                ruta = urllib.parse.urlsplit(self.path).path
+                if ruta == "/metrics":
+                    cuerpo, tipo = registro.texto_prometheus(), "text/plain; version=0.0.4; charset=utf-8"
+                elif ruta in ("/", "/metricas.json"):
+                    cuerpo, tipo = json.dumps(registro.como_dict(), indent=1), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                datos = cuerpo.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", tipo)
+                self.send_header("Content-Length", str(len(datos)))
+                self.end_headers()
+                self.wfile.write(datos)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                # Sin una línea por petición en medio de la salida de la captura
+                pass
+
+        return Manejador
@@ -0,0 +1,118 @@
+"""
+Motor de inferencia en NumPy para los modelos Dense de ``ia.init_modelo``.
+
+Los modelos entrenados son una pila de capas ``Dense`` (ReLU) con salida sigmoide.
+``trainning exportar`` guarda sus pesos en un ``.npz`` pequeño y ``ModeloNumpy``
+repite la pasada hacia delante sólo con NumPy, sin importar TensorFlow. Los resultados deben
+coincidir con Keras (ver ``trainning paridad``).
+"""
+import os
+
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+EXTENSION_MODELO_NUMPY = ".npz"
+TAMANO_BLOQUE_PREDICCION = 4096
+
+
+def _sigmoide(x: Any) -> Any:
+    # Forma estable: no desborda exp con valores muy negativos
+    return 0.5 * (1 + np.tanh(0.5 * x))
+
+
+def _softmax(x: Any) -> Any:
+    e = np.exp(x - x.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+ACTIVACIONES: Dict[str, Callable[[Any], Any]] = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0),
+    "sigmoid": _sigmoide,
+    "tanh": np.tanh,
+    "softmax": _softmax,
+}
+
+
+def es_modelo_numpy(nombre_modelo: str) -> bool:
+    return str(nombre_modelo).lower().endswith(EXTENSION_MODELO_NUMPY)
+
+
+def ruta_modelo(nombre_modelo: str, folder: str) -> str:
+    """Igual que ``ia.load_modelo``: el fichero tal cual si existe o dentro de la carpeta de modelos."""
+    if os.path.exists(nombre_modelo):
+        return nombre_modelo
+    return os.path.join(folder, os.path.basename(nombre_modelo))
+
+
+class ModeloNumpy:
+
+    capas: List[Tuple[Any, Any, str]]
+
+    def __init__(self, capas: List[Tuple[Any, Any, str]], forma_entrada: Tuple[int, ...]) -> None:
+        """
+        :param capas: Pesos, sesgos y nombre de la activación de cada capa Dense.
+        :param forma_entrada: Forma de una muestra a la entrada del modelo (sin el lote).
+        """
+        for _, _, activacion in capas:
+            if activacion not in ACTIVACIONES:
+                raise Exception("Activación %s no soportada. Opciones: %s" % (activacion, ", ".join(ACTIVACIONES)))
+        self.capas = [(np.asarray(pesos, dtype=np.float32), np.asarray(sesgos, dtype=np.float32), activacion) for pesos, sesgos, activacion in capas]
+        self.forma_entrada = tuple(int(dim) for dim in forma_entrada)
+
+    @classmethod
+    def desde_keras(cls, modelo: Any) -> 'ModeloNumpy':
+        capas = []
+        for capa in modelo.layers:
+            nombre_clase = type(capa).__name__
+            if nombre_clase == "InputLayer":
+                continue
+            if nombre_clase != "Dense":
+                raise Exception("Capa %s (%s) no soportada: sólo se exportan modelos Dense" % (capa.name, nombre_clase))
+            pesos, sesgos = capa.get_weights()
+            capas.append((pesos, sesgos, capa.get_config()["activation"]))
+        return cls(capas, tuple(modelo.input_shape[1:]))
+
+    @classmethod
+    def cargar(cls, ruta: str) -> 'ModeloNumpy':
+        with np.load(ruta, allow_pickle=False) as datos:
+            activaciones = [str(activacion) for activacion in datos["activaciones"]]
+            capas = [(datos["pesos_%d" % num], datos["sesgos_%d" % num], activacion) for num, activacion in enumerate(activaciones)]
+            return cls(capas, tuple(datos["forma_entrada"]))
+
+    def guardar(self, ruta: str) -> None:
+        arrays: Dict[str, Any] = {
+            "forma_entrada": np.asarray(self.forma_entrada, dtype=np.int64),
+            "activaciones": np.asarray([activacion for _, _, activacion in self.capas]),
+        }
+        for num, (pesos, sesgos, _) in enumerate(self.capas):
+            arrays["pesos_%d" % num] = pesos
+            arrays["sesgos_%d" % num] = sesgos
+        if os.path.dirname(ruta):
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        np.savez_compressed(ruta, **arrays)
+        print("Modelo NumPy guardado en %s" % ruta)
+
+    def salida(self, entradas: Any) -> Any:
+        """Pasada hacia delante sobre entradas ya escaladas a 0...1 con la forma del modelo."""
+        x = entradas
+        for pesos, sesgos, activacion in self.capas:
+            x = ACTIVACIONES[activacion](x @ pesos + sesgos)
+        return x
+
+    def predecir(self, datos: Any, tamano_bloque: int = TAMANO_BLOQUE_PREDICCION) -> Any:
+        """
+        Mismo contrato que ``ia.predecir``.
+
+        :param datos: Tramas normalizadas (N, 1, neuronas) o (N, neuronas), en 0...255.
+        :return: Salida de la red para cada trama (N,).
+        """
+        datos = np.asarray(datos, dtype=np.float32)
+        salidas = []
+        for inicio in range(0, len(datos), max(1, tamano_bloque)):
+            bloque = datos[inicio:inicio + tamano_bloque]
+            bloque = (bloque / 255).reshape((len(bloque),) + self.forma_entrada)
+            salida = self.salida(bloque)
+            salidas.append(salida.reshape(len(salida), -1)[:, 0])
+        return np.concatenate(salidas) if salidas else np.zeros(0, dtype=np.float32)
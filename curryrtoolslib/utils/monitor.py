@@ -0,0 +1,93 @@
+"""
+Monitor en vivo del estado del termostato.
+
+Cada trama leída del puerto se normaliza en memoria y pasa por el modelo; sólo se
+avisa cuando cambia el estado decodificado (FAN/COLD/DRY/HOT). No se escribe nada
+en disco. La latencia se mide desde el último byte recibido de la trama hasta
+tener su estado decodificado, así que incluye el silencio que cierra la trama.
+"""
+import json
+import sys
+import time
+
+from typing import Any, Callable, Dict, List, Optional
+
+from . import estadisticas
+from . import prediccion
+from . import trama as trama_tools
+
+
+class MonitorEstado:
+
+    estado: Optional[Dict[str, Any]]
+    latencias: List[float]
+    latencias_inferencia: List[float]
+
+    def __init__(self, predictor: Callable[..., Any], layer_size: int, salida_json: bool = False) -> None:
+        """
+        :param predictor: Recibe las tramas normalizadas (N, neuronas) y devuelve la salida de la red (N,).
+        :param layer_size: Neuronas de la primera capa.
+        :param salida_json: Escribe cada cambio como una línea JSON en lugar de texto.
+        """
+        self.predictor = predictor
+        self.layer_size = layer_size
+        self.salida_json = salida_json
+        self.estado = None
+        self.latencias = []
+        self.latencias_inferencia = []
+        self.contadores = {"tramas": 0, "invalidas": 0, "cambios": 0}
+
+    def decodificar(self, bloques: List[bytes]) -> Optional[Dict[str, Any]]:
+        """Estado decodificado de una trama, o None si no se puede normalizar."""
+        datos, validas = trama_tools.normalizar_tramas([bloques], self.layer_size)
+        if not validas[0]:
+            return None
+        salidas = self.predictor(datos)
+        fila = prediccion.filas_prediccion([""], salidas)[0]
+        del fila["trama"]
+        return fila
+
+    def procesar(self, bloques: List[bytes], hora: str, ultimo_byte_ns: int) -> Optional[Dict[str, Any]]:
+        """
+        Decodifica una trama recibida y avisa si cambia el estado.
+
+        :param ultimo_byte_ns: Instante (``time.monotonic_ns``) del último byte de la trama.
+        :return: El nuevo estado si ha cambiado; None si no cambia o la trama no es válida.
+        """
+        self.contadores["tramas"] += 1
+        datos = b"".join(bloques)
+        # Sin validar_trama_bytes: no debe imprimir nada que rompa la salida JSON
+        if not datos.startswith(trama_tools.CABECERA) or len(datos) not in trama_tools.VALID_SIZES:
+            self.contadores["invalidas"] += 1
+            return None
+
+        inicio = time.monotonic_ns()
+        fila = self.decodificar(bloques)
+        fin = time.monotonic_ns()
+        if fila is None:
+            self.contadores["invalidas"] += 1
+            return None
+
+        self.latencias_inferencia.append((fin - inicio) / 1e6)
+        self.latencias.append((fin - ultimo_byte_ns) / 1e6 if ultimo_byte_ns else 0.0)
+        if self.estado is not None and self.estado["codigo"] == fila["codigo"]:
+            return None
+
+        self.estado = fila
+        self.contadores["cambios"] += 1
+        self.mostrar_estado(fila, hora)
+        return fila
+
+    def mostrar_estado(self, fila: Dict[str, Any], hora: str) -> None:
+        if self.salida_json:
+            print(json.dumps(dict({"hora": hora, "latencia_ms": round(self.latencias[-1], 3)}, **fila)), flush=True)
+            return
+        controles = " ".join("%s=%s" % (control, fila[control]) for control in prediccion.CONTROLES)
+        print("%s %s (código %s, latencia %.1f ms)" % (hora, controles, fila["codigo"], self.latencias[-1]), flush=True)
+
+    def mostrar_resumen(self) -> None:
+        # Con salida JSON el resumen va a stderr para no mezclarse con los cambios
+        destino = sys.stderr if self.salida_json else sys.stdout
+        print("# MONITOR: %(tramas)s tramas, %(invalidas)s inválidas, %(cambios)s cambios de estado" % self.contadores, file=destino)
+        print("# LATENCIA ÚLTIMO BYTE -> ESTADO: %s" % estadisticas.resumen_latencias(self.latencias), file=destino)
+        print("# LATENCIA DE INFERENCIA: %s" % estadisticas.resumen_latencias(self.latencias_inferencia), file=destino)
@@ -0,0 +1,156 @@
+"""
+Motor serie asyncio para vigilar varios puertos desde un único proceso.
+
+Cada puerto se abre sin bloqueo y se registra en el bucle de eventos con
+``add_reader`` (o se sondea si el bucle no lo soporta). Las tramas se separan con
+``LectorTramas``, se validan con ``trama.validar_trama_bytes`` y se entregan en
+orden, por puerto, a un consumidor que corre en el executor del bucle para que la
+escritura en disco no frene la lectura del resto de puertos.
+"""
+import asyncio
+import time
+
+from typing import Any, Callable, Dict, List, Optional
+
+import serial # type: ignore[import]
+
+from . import trama as trama_tools
+from .lector import LectorTramas, Trama
+
+INTERVALO_SONDEO = 0.005
+
+
+class PuertoAsync:
+
+    cola: 'asyncio.Queue[Optional[Trama]]'
+    contadores: Dict[str, int]
+
+    def __init__(self, nombre: str, baudrate: int, timeout: float, tamano_cola: int) -> None:
+        self.nombre = nombre
+        self.ser = serial.Serial(nombre, baudrate, timeout=0)
+        self.lector = LectorTramas(self.ser, silencio_bloque=timeout, parser=trama_tools.ParserTramas())
+        self.cola = asyncio.Queue(maxsize=max(1, tamano_cola))
+        self.contadores = {
+            "bytes": 0,
+            "validas": 0,
+            "invalidas": 0,
+            "descartadas": 0,
+        }
+
+    def leer(self) -> Optional[Trama]:
+        datos = self.ser.read(self.ser.in_waiting or 1)
+        if not datos:
+            return None
+        self.contadores["bytes"] += len(datos)
+        return self.lector.alimentar(datos, time.monotonic_ns())
+
+    def cerrar(self) -> None:
+        self.ser.close()
+
+
+class MotorSerieAsync:
+
+    puertos: List[PuertoAsync]
+
+    def __init__(self, puertos: List[str], baudrate: int, timeout: float, consumidor: Callable[[str, Trama], Any], tamano_cola: int = 64) -> None:
+        """
+        :param puertos: Nombres de los puertos a vigilar.
+        :param baudrate: Velocidad común de todos los puertos.
+        :param timeout: Silencio en segundos que separa bloques (el doble separa tramas).
+        :param consumidor: Recibe el nombre del puerto y cada trama válida; se ejecuta fuera del bucle.
+        :param tamano_cola: Tramas pendientes por puerto antes de descartar la más antigua.
+        """
+        self.nombres = puertos
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.consumidor = consumidor
+        self.tamano_cola = tamano_cola
+        self.puertos = []
+
+    def ejecutar(self) -> None:
+        """Arranca el bucle de eventos hasta que se pulse Ctrl+C."""
+        try:
+            asyncio.run(self.vigilar())
+        finally:
+            self.mostrar_resumen()
+
+    async def vigilar(self) -> None:
+        loop = asyncio.get_running_loop()
+        tareas = []
+        try:
+            for nombre in self.nombres:
+                puerto = PuertoAsync(nombre, self.baudrate, self.timeout, self.tamano_cola)
+                self.puertos.append(puerto)
+                print(f"Conectado al puerto {nombre} con velocidad {self.baudrate} baudios.")
+                try:
+                    loop.add_reader(puerto.ser.fileno(), self._al_recibir, puerto)
+                    tareas.append(asyncio.create_task(self._vigilar_silencios(puerto)))
+                except (NotImplementedError, AttributeError):
+                    tareas.append(asyncio.create_task(self._sondear(puerto)))
+                tareas.append(asyncio.create_task(self._consumir(puerto)))
+
+            await asyncio.gather(*tareas)
+        finally:
+            for puerto in self.puertos:
+                try:
+                    loop.remove_reader(puerto.ser.fileno())
+                except (NotImplementedError, AttributeError):
+                    pass
+            for tarea in tareas:
+                tarea.cancel()
+            await asyncio.gather(*tareas, return_exceptions=True)
+            # Vacía lo que quede en las colas antes de cerrar
+            for puerto in self.puertos:
+                while not puerto.cola.empty():
+                    trama = puerto.cola.get_nowait()
+                    if trama is not None:
+                        await loop.run_in_executor(None, self.consumidor, puerto.nombre, trama)
+                puerto.cerrar()
+
+    def mostrar_resumen(self) -> None:
+        for puerto in self.puertos:
+            print("# %s: %s bytes (%s descartados al resincronizar), %s tramas válidas, %s inválidas, %s descartadas por cola llena" % (
+                puerto.nombre, puerto.contadores["bytes"], puerto.lector.descartados, puerto.contadores["validas"],
+                puerto.contadores["invalidas"], puerto.contadores["descartadas"]))
+
+    def _al_recibir(self, puerto: PuertoAsync) -> None:
+        trama = puerto.leer()
+        # Un mismo trozo puede cerrar varias tramas pegadas: se entregan todas
+        while trama:
+            self._entregar(puerto, trama)
+            trama = puerto.lector.completas.popleft() if puerto.lector.completas else None
+
+    async def _vigilar_silencios(self, puerto: PuertoAsync) -> None:
+        intervalo = max(self.timeout / 4, INTERVALO_SONDEO)
+        while True:
+            await asyncio.sleep(intervalo)
+            trama = puerto.lector.comprobar_silencio(time.monotonic_ns())
+            while trama:
+                self._entregar(puerto, trama)
+                trama = puerto.lector.comprobar_silencio(time.monotonic_ns())
+
+    async def _sondear(self, puerto: PuertoAsync) -> None:
+        while True:
+            trama = puerto.leer() or puerto.lector.comprobar_silencio(time.monotonic_ns())
+            while trama:
+                self._entregar(puerto, trama)
+                trama = puerto.lector.comprobar_silencio(time.monotonic_ns())
+            await asyncio.sleep(INTERVALO_SONDEO)
+
+    def _entregar(self, puerto: PuertoAsync, trama: Trama) -> None:
+        if not trama_tools.validar_trama_bytes(list(b"".join(trama[0]))): # type: ignore[arg-type]
+            puerto.contadores["invalidas"] += 1
+            return
+        puerto.contadores["validas"] += 1
+        if puerto.cola.full():
+            puerto.cola.get_nowait()
+            puerto.contadores["descartadas"] += 1
+        puerto.cola.put_nowait(trama)
+
+    async def _consumir(self, puerto: PuertoAsync) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            trama = await puerto.cola.get()
+            if trama is None:
+                break
+            await loop.run_in_executor(None, self.consumidor, puerto.nombre, trama)
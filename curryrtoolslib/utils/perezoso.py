@@ -0,0 +1,40 @@
+"""
+Importación perezosa de módulos pesados (NumPy, TensorFlow, matplotlib...).
+
+``ModuloPerezoso`` se usa como el módulo importado, pero el import real sólo se
+hace la primera vez que se accede a uno de sus atributos. Así ``--help`` o las
+acciones que no los necesitan arrancan sin pagar su coste.
+"""
+import importlib
+
+from types import ModuleType
+from typing import Any, Optional
+
+
+class ModuloPerezoso:
+
+    _modulo: Optional[ModuleType]
+
+    def __init__(self, nombre: str) -> None:
+        """:param nombre: Nombre absoluto del módulo (``curryrtoolslib.utils.ia``, ``numpy``...)."""
+        self._nombre = nombre
+        self._modulo = None
+
+    def __getattr__(self, atributo: str) -> Any:
+        return getattr(self._cargar(), atributo)
+
+    def __repr__(self) -> str:
+        return "<módulo perezoso %s (%s)>" % (self._nombre, "cargado" if self._modulo is not None else "sin cargar")
+
+    def disponible(self) -> bool:
+        """Importa el módulo y dice si se pudo (por ejemplo, si TensorFlow está instalado)."""
+        try:
+            self._cargar()
+        except ImportError:
+            return False
+        return True
+
+    def _cargar(self) -> ModuleType:
+        if self._modulo is None:
+            self._modulo = importlib.import_module(self._nombre)
+        return self._modulo
@@ -0,0 +1,108 @@
+"""
+Decodificación y salida de las predicciones del modelo.
+
+La red devuelve, por trama, un valor en 0...1 que codifica (x255) el byte de
+posiciones de los controles. Aquí se decodifican todas las salidas de una vez con
+NumPy y se muestran como tabla o se guardan en CSV/JSON. TensorFlow sólo se importa
+al cargar un modelo ``.keras``.
+"""
+import csv
+import json
+import os
+
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from . import modelo_numpy
+
+CONTROLES = ["FAN", "COLD", "DRY", "HOT"]
+
+# Posiciones 2..4 del byte (de más a menos significativo): 100 -> 1, 010 -> 2, 001 -> 3
+_VELOCIDADES_FAN = {(1, 0, 0): "1", (0, 1, 0): "2", (0, 0, 1): "3"}
+
+
+def decodificar(probabilidades: Any) -> Dict[str, Any]:
+    """
+    Decodifica las salidas de la red para todas las tramas a la vez.
+
+    :param probabilidades: Vector (N,) con la salida de la red para cada trama.
+    :return: Código (N,) y un array de textos (N,) por control.
+    """
+    codigos = np.rint(np.clip(np.asarray(probabilidades, dtype=np.float32), 0, 1) * 255).astype(np.uint8)
+    bits = np.unpackbits(codigos[:, np.newaxis], axis=1)
+
+    fan = np.full(len(codigos), "0", dtype=object)
+    for patron, velocidad in _VELOCIDADES_FAN.items():
+        fan[(bits[:, 2:5] == patron).all(axis=1)] = velocidad
+
+    return {
+        "codigo": codigos,
+        "FAN": fan,
+        "COLD": np.where(bits[:, 5] == 1, "ON", "OFF"),
+        "DRY": np.where(bits[:, 6] == 1, "ON", "OFF"),
+        "HOT": np.where(bits[:, 7] == 1, "ON", "OFF"),
+    }
+
+
+def filas_prediccion(origenes: List[str], probabilidades: Any) -> List[Dict[str, Any]]:
+    """Una fila por trama: origen, salida de la red, código y estado de cada control."""
+    decodificado = decodificar(probabilidades)
+    filas = []
+    for num, origen in enumerate(origenes):
+        fila: Dict[str, Any] = {
+            "trama": origen,
+            "salida": round(float(probabilidades[num]), 6),
+            "codigo": format(int(decodificado["codigo"][num]), "08b"),
+        }
+        for control in CONTROLES:
+            fila[control] = str(decodificado[control][num])
+        filas.append(fila)
+    return filas
+
+
+def mostrar_tabla(filas: List[Dict[str, Any]]) -> None:
+    if not filas:
+        return
+    columnas = list(filas[0].keys())
+    anchos = [max(len(columna), *(len(str(fila[columna])) for fila in filas)) for columna in columnas]
+    print("  ".join(columna.ljust(ancho) for columna, ancho in zip(columnas, anchos)))
+    for fila in filas:
+        print("  ".join(str(fila[columna]).ljust(ancho) for columna, ancho in zip(columnas, anchos)))
+
+
+def guardar_predicciones(ruta: str, filas: List[Dict[str, Any]]) -> None:
+    """Guarda las filas en CSV o JSON según la extensión de ``ruta``."""
+    if os.path.splitext(ruta)[1].lower() == ".json":
+        with open(ruta, "w") as fichero:
+            json.dump(filas, fichero, indent=1)
+    else:
+        with open(ruta, "w", newline="") as fichero:
+            escritor = csv.DictWriter(fichero, fieldnames=list(filas[0].keys()) if filas else ["trama"])
+            escritor.writeheader()
+            escritor.writerows(filas)
+    print("Predicciones guardadas en %s" % ruta)
+
+
+def cargar_predictor(nombre_modelo: str, folder: str) -> Optional[Callable[..., Any]]:
+    """
+    Carga un modelo Keras (.keras) o NumPy (.npz, sin TensorFlow).
+
+    :return: Función (datos, tamano_bloque) -> salida de la red para cada trama, o None si no se pudo cargar.
+    """
+    if modelo_numpy.es_modelo_numpy(nombre_modelo):
+        ruta = modelo_numpy.ruta_modelo(nombre_modelo, folder)
+        if not os.path.exists(ruta):
+            print("No existe el modelo %s" % ruta)
+            return None
+        return modelo_numpy.ModeloNumpy.cargar(ruta).predecir
+
+    try:
+        from . import ia as ia_tools
+    except ImportError:
+        print("TensorFlow no está instalado: exporta el modelo a .npz con 'trainning exportar' y usa ese fichero")
+        return None
+    modelo = ia_tools.load_modelo(nombre_modelo, folder)
+    if not modelo:
+        return None
+    return lambda datos, tamano_bloque=modelo_numpy.TAMANO_BLOQUE_PREDICCION: ia_tools.predecir(datos, modelo, tamano_bloque)
@@ -0,0 +1,321 @@
+"""
+Registro de capturas segmentado y de sólo escritura al final.
+
+Sustituye el par ``<uuid>.bin``/``<uuid>.info`` por trama por ficheros de segmento
+``.clog`` con registros prefijados por su longitud y un índice compacto ``.idx``
+por segmento. Los segmentos rotan por tamaño o por tiempo.
+
+Formato de un segmento::
+
+    cabecera   b"CLOG" + versión (1 byte) + 3 bytes de relleno
+    registro   <I longitud del cuerpo> + cuerpo
+
+    cuerpo     <d hora> <I baudrate> <f timeout> <B bloques> <B len(values)>
+               por bloque: <d hora> <H tamaño>
+               values (ascii)
+               datos de todos los bloques seguidos
+
+Cada entrada del índice es ``<Q desplazamiento> <d hora> <H bytes de la trama>``.
+Con él se listan los registros y se buscan por hora sin leer los datos, y se leen
+de uno en uno sin cargar el segmento entero en memoria.
+"""
+import glob
+import json
+import os
+import struct
+import threading
+import time
+from datetime import datetime
+
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+MAGIC = b"CLOG"
+VERSION = 1
+CABECERA = MAGIC + bytes([VERSION, 0, 0, 0])
+EXTENSION = ".clog"
+EXTENSION_INDICE = ".idx"
+
+_LONGITUD = struct.Struct("<I")
+_TRAMA = struct.Struct("<dIfBB")
+_BLOQUE = struct.Struct("<dH")
+_INDICE = struct.Struct("<QdH")
+
+
+def es_segmento(nombre: str) -> bool:
+    return nombre.endswith(EXTENSION)
+
+
+def listar_segmentos(carpeta: str) -> List[str]:
+    """Segmentos de la carpeta en orden cronológico (el nombre lleva la fecha)."""
+    return sorted(glob.glob(os.path.join(carpeta, "*%s" % EXTENSION)))
+
+
+def _a_epoch(hora: str) -> float:
+    return datetime.fromisoformat(hora).timestamp()
+
+
+def _a_texto(epoch: float) -> str:
+    return str(datetime.fromtimestamp(epoch))
+
+
+class EscritorRegistro:
+
+    fichero: Optional[BinaryIO]
+    indice: Optional[BinaryIO]
+
+    def __init__(self, carpeta: str, max_bytes: int = 8 * 1024 * 1024, max_segundos: float = 3600, prefijo: str = "captura") -> None:
+        """
+        :param carpeta: Carpeta donde se crean los segmentos.
+        :param max_bytes: Tamaño a partir del cual se abre un segmento nuevo.
+        :param max_segundos: Antigüedad a partir de la cual se abre un segmento nuevo.
+        :param prefijo: Prefijo del nombre de los segmentos.
+        """
+        self.carpeta = carpeta
+        self.max_bytes = max_bytes
+        self.max_segundos = max_segundos
+        self.prefijo = prefijo
+        self.fichero = None
+        self.indice = None
+        self.ruta = ""
+        self.abierto_en = 0.0
+        self.num_segmento = 0
+        self.segmentos: List[str] = []
+        self.lock = threading.Lock()
+        if not os.path.exists(carpeta):
+            os.makedirs(carpeta)
+
+    def escribir(self, stream_arr: List[bytes], times_arr: List[List[Any]], baudrate: int, timeout: float, values: str = "") -> str:
+        """
+        Añade una trama al segmento actual con la misma entrada que ``trama.guardar_trama_bytes``.
+
+        :return: Identificador ``<segmento>#<desplazamiento>`` del registro.
+        """
+        values = values or ""
+        horas = [_a_epoch(tiempos[0]) for tiempos, _ in times_arr]
+        hora = horas[0] if horas else time.time()
+        datos = b"".join(stream_arr)
+        partes = [_TRAMA.pack(hora, int(baudrate), float(timeout), len(stream_arr), len(values))]
+        for hora_bloque, bloque in zip(horas, stream_arr):
+            partes.append(_BLOQUE.pack(hora_bloque, len(bloque)))
+        partes.append(values.encode("ascii"))
+        partes.append(datos)
+        cuerpo = b"".join(partes)
+
+        with self.lock:
+            self._rotar_si_hace_falta(len(cuerpo))
+            assert self.fichero is not None and self.indice is not None
+            desplazamiento = self.fichero.tell()
+            self.fichero.write(_LONGITUD.pack(len(cuerpo)))
+            self.fichero.write(cuerpo)
+            self.fichero.flush()
+            self.indice.write(_INDICE.pack(desplazamiento, hora, len(datos)))
+            self.indice.flush()
+            return "%s#%d" % (os.path.basename(self.ruta), desplazamiento)
+
+    def cerrar(self) -> None:
+        with self.lock:
+            self._cerrar_segmento()
+
+    def __enter__(self) -> 'EscritorRegistro':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.cerrar()
+
+    def _rotar_si_hace_falta(self, siguiente: int) -> None:
+        if self.fichero is not None:
+            tamano = self.fichero.tell() + _LONGITUD.size + siguiente
+            if tamano <= self.max_bytes and time.time() - self.abierto_en < self.max_segundos:
+                return
+            self._cerrar_segmento()
+
+        marca = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+        self.num_segmento += 1
+        self.ruta = os.path.join(self.carpeta, "%s_%s_%03d%s" % (self.prefijo, marca, self.num_segmento, EXTENSION))
+        self.fichero = open(self.ruta, "ab")
+        if self.fichero.tell() == 0:
+            self.fichero.write(CABECERA)
+        self.indice = open(self.ruta + EXTENSION_INDICE, "ab")
+        self.abierto_en = time.time()
+        self.segmentos.append(self.ruta)
+        print("Nuevo segmento de captura %s" % self.ruta)
+
+    def _cerrar_segmento(self) -> None:
+        if self.fichero is not None:
+            self.fichero.close()
+            self.fichero = None
+        if self.indice is not None:
+            self.indice.close()
+            self.indice = None
+
+
+def _decodificar(cuerpo: bytes) -> List[Dict[str, Any]]:
+    hora, baudrate, timeout, num_bloques, len_values = _TRAMA.unpack_from(cuerpo, 0)
+    pos = _TRAMA.size
+    bloques = []
+    for _ in range(num_bloques):
+        bloques.append(_BLOQUE.unpack_from(cuerpo, pos))
+        pos += _BLOQUE.size
+    values = cuerpo[pos:pos + len_values].decode("ascii")
+    pos += len_values
+
+    result: List[Dict[str, Any]] = []
+    for hora_bloque, tamano in bloques:
+        result.append({
+            "data": cuerpo[pos:pos + tamano],
+            "timeout": round(timeout, 6),
+            "time": _a_texto(hora_bloque),
+            "values": values,
+            "baudrate": baudrate,
+        })
+        pos += tamano
+    return result
+
+
+def leer_indice(ruta: str) -> List[Tuple[int, float, int]]:
+    """Entradas ``(desplazamiento, hora, bytes)`` del índice del segmento."""
+    ruta_indice = ruta + EXTENSION_INDICE
+    if not os.path.exists(ruta_indice):
+        return []
+    with open(ruta_indice, "rb") as f:
+        contenido = f.read()
+    completo = len(contenido) - len(contenido) % _INDICE.size
+    return list(_INDICE.iter_unpack(contenido[:completo]))
+
+
+def _escanear(f: BinaryIO, ruta: str, pos: int, tamano: int) -> Iterator[Tuple[int, float, int]]:
+    """Entradas del índice a partir de ``pos`` leyendo sólo las cabeceras de los registros."""
+    while pos + _LONGITUD.size <= tamano:
+        f.seek(pos)
+        (longitud,) = _LONGITUD.unpack(f.read(_LONGITUD.size))
+        if pos + _LONGITUD.size + longitud > tamano:
+            print("Registro incompleto al final de %s" % ruta)
+            return
+        cabecera = f.read(_TRAMA.size)
+        hora, _, _, num_bloques, _ = _TRAMA.unpack(cabecera)
+        bloques = f.read(_BLOQUE.size * num_bloques)
+        yield pos, hora, sum(tamano_bloque for _, tamano_bloque in _BLOQUE.iter_unpack(bloques))
+        pos += _LONGITUD.size + longitud
+
+
+def _entradas(f: BinaryIO, ruta: str) -> Iterator[Tuple[int, float, int]]:
+    """
+    Entradas del índice de un segmento abierto.
+
+    El índice se escribe después de cada registro, así que tras una captura
+    interrumpida puede faltar la última entrada (o no existir el índice): los
+    registros que no están en el índice se localizan leyendo sus cabeceras.
+    """
+    tamano = os.fstat(f.fileno()).st_size
+    pos = len(CABECERA)
+    entradas = []
+    for desplazamiento, hora, num_bytes in leer_indice(ruta):
+        if desplazamiento != pos:
+            # Índice que no corresponde al segmento: no se usa
+            print("El índice de %s no coincide con el segmento; se recorre entero" % ruta)
+            entradas = []
+            pos = len(CABECERA)
+            break
+        f.seek(pos)
+        (longitud,) = _LONGITUD.unpack(f.read(_LONGITUD.size))
+        if pos + _LONGITUD.size + longitud > tamano:
+            break
+        entradas.append((desplazamiento, hora, num_bytes))
+        pos += _LONGITUD.size + longitud
+    yield from entradas
+    yield from _escanear(f, ruta, pos, tamano)
+
+
+def _abrir_segmento(ruta: str) -> Optional[BinaryIO]:
+    f = open(ruta, "rb")
+    if f.read(len(MAGIC)) != MAGIC:
+        print("El fichero %s no es un segmento de captura" % ruta)
+        f.close()
+        return None
+    return f
+
+
+def _en_rango(hora: float, desde: Optional[float], hasta: Optional[float]) -> bool:
+    return (desde is None or hora >= desde) and (hasta is None or hora < hasta)
+
+
+def listar_registros(ruta: str, desde: Optional[float] = None, hasta: Optional[float] = None) -> List[Tuple[int, float, int]]:
+    """
+    Registros del segmento según su índice, sin leer los datos.
+
+    :param desde: Hora (epoch) mínima de la trama, incluida.
+    :param hasta: Hora (epoch) máxima de la trama, excluida.
+    :return: Entradas ``(desplazamiento, hora, bytes)``.
+    """
+    f = _abrir_segmento(ruta)
+    if f is None:
+        return []
+    with f:
+        return [entrada for entrada in _entradas(f, ruta) if _en_rango(entrada[1], desde, hasta)]
+
+
+def iterar_registros(ruta: str, desde: Optional[float] = None, hasta: Optional[float] = None) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+    """
+    Recorre un segmento devolviendo ``(desplazamiento, bloques)``.
+
+    Los registros se localizan con el índice y se leen de uno en uno, así que
+    sólo se lee lo que está en el rango de horas pedido. Los bloques tienen la
+    misma forma que los que devuelve ``trama.cargar_trama_bytes``. Un último
+    registro incompleto (captura interrumpida) se ignora.
+    """
+    f = _abrir_segmento(ruta)
+    if f is None:
+        return
+    with f:
+        for desplazamiento, hora, _ in list(_entradas(f, ruta)):
+            if not _en_rango(hora, desde, hasta):
+                continue
+            f.seek(desplazamiento)
+            (longitud,) = _LONGITUD.unpack(f.read(_LONGITUD.size))
+            yield desplazamiento, _decodificar(f.read(longitud))
+
+
+def cargar_registro(ruta: str, desplazamiento: int) -> List[Dict[str, Any]]:
+    """Lee un único registro a partir de su desplazamiento en el segmento."""
+    with open(ruta, "rb") as f:
+        f.seek(desplazamiento)
+        (longitud,) = _LONGITUD.unpack(f.read(_LONGITUD.size))
+        return _decodificar(f.read(longitud))
+
+
+def convertir_dumps(carpeta_dumps: str, escritor: EscritorRegistro) -> Tuple[int, int]:
+    """
+    Importa al registro todos los pares ``.bin``/``.info`` de una carpeta de dumps.
+
+    Las tramas se escriben en orden cronológico. Los ficheros originales no se borran.
+
+    :return: Número de tramas importadas y número de ficheros omitidos.
+    """
+    entradas = []
+    omitidos = 0
+    for info_file in glob.glob(os.path.join(carpeta_dumps, "*.info")):
+        trama_file = info_file[:-len(".info")] + ".bin"
+        if not os.path.exists(trama_file):
+            print("No existe el fichero %s" % trama_file)
+            omitidos += 1
+            continue
+        with open(info_file, "r") as f:
+            info_json = json.load(f)
+        if not info_json.get("times"):
+            omitidos += 1
+            continue
+        entradas.append((info_json["times"][0][0][0], trama_file, info_json))
+
+    importados = 0
+    for _, trama_file, info_json in sorted(entradas, key=lambda entrada: entrada[0]):
+        with open(trama_file, "rb") as f:
+            stream = f.read()
+        bloques = []
+        pos_stream = 0
+        for _, size_ in info_json["times"]:
+            bloques.append(stream[pos_stream:pos_stream + size_])
+            pos_stream += size_
+        escritor.escribir(bloques, info_json["times"], info_json["baudrate"], info_json["timeout"], info_json["values"])
+        importados += 1
+
+    return importados, omitidos
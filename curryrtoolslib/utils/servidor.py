@@ -0,0 +1,190 @@
+"""
+Servidor de predicciones que mantiene el modelo cargado.
+
+Escucha por stdin/stdout o por un socket Unix un protocolo de líneas. Cada
+petición es una trama en bruto:
+
+* ``00080a... 0008ff...``: los bloques de la trama en hexadecimal separados por espacios.
+* ``{"id": 7, "bloques": ["00080a...", "0008ff..."]}``: lo mismo en JSON, con un id opcional.
+
+Cada respuesta es una línea JSON con el id (o el número de petición), la salida de
+la red, el código y el estado de FAN/COLD/DRY/HOT, o ``error``. Las peticiones que
+llegan juntas se agrupan en lotes para hacer una sola pasada por la red.
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from . import estadisticas
+from . import prediccion
+from . import trama as trama_tools
+
+TAMANO_LOTE_SERVIDOR = 64
+ESPERA_LOTE = 0.005
+
+
+def leer_peticion(linea: str, numero: int) -> Tuple[Any, List[bytes]]:
+    """:return: Id de la petición y los bloques de la trama."""
+    linea = linea.strip()
+    if linea.startswith("{"):
+        peticion = json.loads(linea)
+        return peticion.get("id", numero), [bytes.fromhex(bloque) for bloque in peticion["bloques"]]
+    return numero, [bytes.fromhex(bloque) for bloque in linea.split()]
+
+
+class ServidorPredicciones:
+
+    pendientes: 'asyncio.Queue[Tuple[List[bytes], asyncio.Future, float]]'
+    latencias: List[float]
+
+    def __init__(self, predictor: Callable[[Any], Any], layer_size: int, tamano_lote: int = TAMANO_LOTE_SERVIDOR, espera_lote: float = ESPERA_LOTE) -> None:
+        """
+        :param predictor: Recibe las tramas normalizadas (N, neuronas) y devuelve la salida de la red (N,).
+        :param layer_size: Neuronas de la primera capa.
+        :param tamano_lote: Máximo de peticiones por pasada de la red.
+        :param espera_lote: Segundos que se espera a que lleguen más peticiones antes de predecir.
+        """
+        self.predictor = predictor
+        self.layer_size = layer_size
+        self.tamano_lote = max(1, tamano_lote)
+        self.espera_lote = espera_lote
+        self.latencias = []
+        self.lotes = 0
+        self.peticiones = 0
+
+    def ejecutar_stdin(self, salida: Any = None) -> None:
+        """Atiende peticiones por stdin y responde por ``salida`` (stdout) hasta fin de fichero o Ctrl+C."""
+        salida = salida or sys.stdout
+        try:
+            asyncio.run(self._servir_stdin(salida))
+        except (KeyboardInterrupt, BrokenPipeError):
+            pass
+        finally:
+            self.mostrar_resumen()
+
+    def ejecutar_socket(self, ruta: str) -> None:
+        """Atiende peticiones en el socket Unix ``ruta`` hasta Ctrl+C."""
+        try:
+            asyncio.run(self._servir_socket(ruta))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.mostrar_resumen()
+
+    def mostrar_resumen(self) -> None:
+        print("# SERVIDOR: %s peticiones en %s lotes; latencia %s" % (
+            self.peticiones, self.lotes, estadisticas.resumen_latencias(self.latencias)), file=sys.stderr)
+
+    async def _servir_stdin(self, salida: Any) -> None:
+        loop = asyncio.get_running_loop()
+        lector = asyncio.StreamReader()
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(lector), sys.stdin)
+
+        def escribir(respuesta: str) -> None:
+            salida.write(respuesta + "\n")
+            salida.flush()
+
+        self.pendientes = asyncio.Queue()
+        agrupador = asyncio.create_task(self._agrupar())
+        try:
+            await self._atender(lector, escribir)
+        finally:
+            agrupador.cancel()
+
+    async def _servir_socket(self, ruta: str) -> None:
+        self.pendientes = asyncio.Queue()
+        agrupador = asyncio.create_task(self._agrupar())
+
+        async def conexion(lector: asyncio.StreamReader, escritor: asyncio.StreamWriter) -> None:
+            await self._atender(lector, lambda respuesta: escritor.write((respuesta + "\n").encode("utf-8")))
+            escritor.close()
+
+        servidor = await asyncio.start_unix_server(conexion, path=ruta)
+        print("Escuchando en %s" % ruta, file=sys.stderr)
+        try:
+            async with servidor:
+                await servidor.serve_forever()
+        finally:
+            agrupador.cancel()
+            if os.path.exists(ruta):
+                os.remove(ruta)
+
+    async def _atender(self, lector: asyncio.StreamReader, escribir: Callable[[str], None]) -> None:
+        """Lee peticiones de una conexión y responde en orden de llegada."""
+        respuestas: 'asyncio.Queue[Optional[Tuple[Any, asyncio.Future]]]' = asyncio.Queue()
+
+        async def responder() -> None:
+            while True:
+                siguiente = await respuestas.get()
+                if siguiente is None:
+                    break
+                id_peticion, futuro = siguiente
+                escribir(json.dumps(dict({"id": id_peticion}, **await futuro)))
+
+        tarea = asyncio.create_task(responder())
+        numero = 0
+        while True:
+            linea = await lector.readline()
+            if not linea:
+                break
+            if not linea.strip():
+                continue
+            numero += 1
+            futuro = asyncio.get_running_loop().create_future()
+            try:
+                id_peticion, bloques = leer_peticion(linea.decode("utf-8", "replace"), numero)
+            except (ValueError, KeyError, TypeError) as e:
+                id_peticion = numero
+                futuro.set_result({"error": "Petición no válida: %s" % e})
+            else:
+                self.pendientes.put_nowait((bloques, futuro, time.perf_counter()))
+            await respuestas.put((id_peticion, futuro))
+        await respuestas.put(None)
+        await tarea
+
+    async def _agrupar(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            lote = [await self.pendientes.get()]
+            limite = loop.time() + self.espera_lote
+            while len(lote) < self.tamano_lote:
+                if not self.pendientes.empty():
+                    lote.append(self.pendientes.get_nowait())
+                    continue
+                restante = limite - loop.time()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(await asyncio.wait_for(self.pendientes.get(), restante))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                respuestas = await loop.run_in_executor(None, self._predecir, [bloques for bloques, _, _ in lote])
+            except Exception as e:
+                respuestas = [{"error": "%s: %s" % (type(e).__name__, e)}] * len(lote)
+
+            ahora = time.perf_counter()
+            self.lotes += 1
+            for (_, futuro, inicio), respuesta in zip(lote, respuestas):
+                self.peticiones += 1
+                self.latencias.append((ahora - inicio) * 1000)
+                if not futuro.done():
+                    futuro.set_result(respuesta)
+
+    def _predecir(self, tramas: List[List[bytes]]) -> List[Dict[str, Any]]:
+        datos, validas = trama_tools.normalizar_tramas(tramas, self.layer_size)
+        respuestas: List[Dict[str, Any]] = [{"error": "Trama con más de %s datos" % self.layer_size} for _ in tramas]
+        if validas.any():
+            indices = np.flatnonzero(validas)
+            salidas = np.asarray(self.predictor(datos[indices]))
+            for num, fila in zip(indices, prediccion.filas_prediccion([""] * len(indices), salidas)):
+                del fila["trama"]
+                respuestas[num] = fila
+        return respuestas
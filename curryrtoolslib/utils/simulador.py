@@ -0,0 +1,326 @@
+"""
+Termostato virtual sobre pseudoterminales, para probar sin adaptador RS485.
+
+``PuertoVirtual`` crea un par de pseudoterminales: los comandos (``device read``,
+``repeat``, ``monitor``...) abren ``nombre`` como si fuera el puerto serie y el
+simulador escribe o lee por el otro extremo. ``SimuladorTermostato`` reproduce
+tramas grabadas o sintéticas con los tiempos de la línea: cada byte tarda lo que
+tardaría a ese baudrate, los bloques se separan con un silencio algo mayor que el
+timeout del receptor y las tramas con uno mayor que el doble. Puede meter ruido
+antes de las tramas, cortar tramas y mandar ráfagas sin pausa entre tramas.
+
+``MedidorCarga`` empareja lo que se emite con lo que llega al otro lado (el mismo
+puerto o un bus de vuelta) para contar tramas por segundo, pérdidas y latencias.
+"""
+import collections
+import fcntl
+import os
+import random
+import select
+import struct
+import termios
+import threading
+import time
+import tty
+
+from typing import Any, Deque, Dict, List, NamedTuple, Optional
+
+from . import estadisticas
+from .lector import LectorTramas
+from .trama import ParserTramas, VALID_SIZES
+
+# Escribir byte a byte a baudrates altos sólo mide el coste de time.sleep: se agrupan bytes hasta ~1 ms
+TROZO_MINIMO_S = 0.001
+
+
+class ExtremoPty:
+    """Extremo maestro de un pseudoterminal con lo que ``LectorTramas`` y ``EmisorTramas`` usan de ``serial.Serial``."""
+
+    def __init__(self, fd: int, timeout: float) -> None:
+        self.fd = fd
+        self.timeout = timeout
+
+    @property
+    def in_waiting(self) -> int:
+        return struct.unpack("I", fcntl.ioctl(self.fd, termios.FIONREAD, b"\0\0\0\0"))[0]
+
+    def read(self, tamano: int = 1) -> bytes:
+        listos, _, _ = select.select([self.fd], [], [], self.timeout)
+        if not listos:
+            return b""
+        try:
+            return os.read(self.fd, tamano)
+        except OSError:
+            return b""
+
+    def write(self, datos: bytes) -> int:
+        vista = memoryview(datos)
+        while vista:
+            escritos = os.write(self.fd, vista)
+            vista = vista[escritos:]
+        return len(datos)
+
+    def flush(self) -> None:
+        pass
+
+
+class PuertoVirtual:
+    """Par de pseudoterminales: los comandos abren ``nombre``; el simulador usa ``extremo()``."""
+
+    def __init__(self) -> None:
+        self.maestro, self.esclavo = os.openpty()
+        # Sin eco ni procesado de línea: los bytes pasan tal cual
+        tty.setraw(self.esclavo)
+        self.nombre = os.ttyname(self.esclavo)
+
+    def extremo(self, timeout: float) -> ExtremoPty:
+        return ExtremoPty(self.maestro, timeout)
+
+    def cerrar(self) -> None:
+        for fd in (self.maestro, self.esclavo):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+class Perturbaciones(NamedTuple):
+    ruido: float = 0.0      # Probabilidad de meter bytes basura justo antes de una trama
+    truncadas: float = 0.0  # Probabilidad de cortar una trama
+    rafaga: int = 0         # Tramas seguidas sin pausa entre ellas (0: sin ráfagas)
+
+
+def parsear_perturbaciones(texto: Optional[str]) -> Perturbaciones:
+    """``ruido=0.05,truncadas=0.02,rafaga=10`` -> ``Perturbaciones``."""
+    valores: Dict[str, Any] = {}
+    for parte in (texto or "").split(","):
+        if not parte.strip():
+            continue
+        clave, _, valor = parte.partition("=")
+        clave = clave.strip()
+        if clave not in Perturbaciones._fields:
+            raise Exception("Perturbación %s no válida. Opciones: %s" % (clave, ", ".join(Perturbaciones._fields)))
+        valores[clave] = int(valor) if clave == "rafaga" else float(valor)
+    return Perturbaciones(**valores)
+
+
+class EmisionTrama(NamedTuple):
+    numero: int
+    datos: bytes    # La trama sin ruido
+    fin_ns: int     # time.monotonic_ns() al escribir el último byte
+    tipo: str       # "valida", "ruido" o "truncada"
+
+
+class MedidorCarga:
+    """
+    Empareja las tramas emitidas con las recibidas por su contenido.
+
+    Si hay varias pendientes con el mismo contenido se empareja la última emitida: las
+    anteriores se perdieron, y emparejarlas daría latencias de vueltas anteriores.
+
+    Una trama esperada que no llega es una pérdida; una recibida que no se esperaba
+    (truncada, con ruido sin quitar, partida...) se cuenta como no esperada.
+    """
+
+    pendientes: Dict[bytes, Deque[Optional[int]]]
+    latencias: List[float]
+
+    def __init__(self) -> None:
+        self.pendientes = {}
+        self.latencias = []
+        self.lock = threading.Lock()
+        self.contadores = {"esperadas": 0, "recibidas": 0, "emparejadas": 0, "no_esperadas": 0}
+        self.primera_ns = 0
+        self.ultima_ns = 0
+
+    def esperada(self, datos: bytes, fin_ns: Optional[int] = None) -> None:
+        """:param fin_ns: Instante del último byte emitido; sin él no se mide la latencia de esta trama."""
+        with self.lock:
+            self.pendientes.setdefault(datos, collections.deque()).append(fin_ns)
+            self.contadores["esperadas"] += 1
+
+    def recibida(self, datos: bytes, t_ns: Optional[int] = None) -> Optional[float]:
+        """:return: Latencia en ms desde el último byte emitido, o None si no se esperaba o no se puede medir."""
+        t_ns = t_ns or time.monotonic_ns()
+        with self.lock:
+            self.contadores["recibidas"] += 1
+            self.primera_ns = self.primera_ns or t_ns
+            self.ultima_ns = t_ns
+            cola = self.pendientes.get(datos)
+            if not cola:
+                self.contadores["no_esperadas"] += 1
+                return None
+            fin_ns = cola.pop()
+            self.contadores["emparejadas"] += 1
+            if fin_ns is None:
+                return None
+            latencia = (t_ns - fin_ns) / 1e6
+            self.latencias.append(latencia)
+            return latencia
+
+    def resumen(self) -> Dict[str, Any]:
+        with self.lock:
+            segundos = (self.ultima_ns - self.primera_ns) / 1e9
+            resultado: Dict[str, Any] = dict(self.contadores)
+            resultado["perdidas"] = self.contadores["esperadas"] - self.contadores["emparejadas"]
+            resultado["tramas_s"] = round(self.contadores["emparejadas"] / segundos, 2) if segundos > 0 else 0.0
+            if self.latencias:
+                resultado["latencia_ms"] = {
+                    "p50": round(estadisticas.percentil(self.latencias, 50), 3),
+                    "p99": round(estadisticas.percentil(self.latencias, 99), 3),
+                    "max": round(max(self.latencias), 3),
+                }
+            return resultado
+
+    def mostrar_resumen(self, titulo: str) -> None:
+        resumen = self.resumen()
+        print("# %s: %s esperadas, %s recibidas, %s perdidas, %s no esperadas, %.2f tramas/s" % (
+            titulo, resumen["esperadas"], resumen["recibidas"], resumen["perdidas"], resumen["no_esperadas"], resumen["tramas_s"]))
+        if self.latencias:
+            print("# %s LATENCIA: %s" % (titulo, estadisticas.resumen_latencias(self.latencias)))
+
+
+class SimuladorTermostato:
+
+    emitidas: List[EmisionTrama]
+
+    def __init__(self, destino: Any, baudrate: int, timeout: float, intervalo: float = 0.0, perturbaciones: Perturbaciones = Perturbaciones(),
+                 medidor: Optional[MedidorCarga] = None, semilla: int = 0) -> None:
+        """
+        :param destino: Donde se escriben los bytes (``ExtremoPty`` o un puerto serie).
+        :param baudrate: Velocidad simulada de la línea.
+        :param timeout: Silencio con el que el receptor separa bloques (el ``-t`` del receptor).
+        :param intervalo: Segundos mínimos entre el principio de dos tramas fuera de las ráfagas.
+        :param perturbaciones: Ruido, tramas cortadas y ráfagas.
+        :param medidor: Se le avisa de cada trama válida emitida.
+        """
+        self.destino = destino
+        self.segundos_byte = 10 / baudrate
+        self.trozo = max(1, int(TROZO_MINIMO_S / self.segundos_byte))
+        self.silencio_bloque = timeout * 1.2
+        # LectorTramas cierra la trama tras el doble del timeout
+        self.silencio_trama = timeout * 2.5
+        self.intervalo = intervalo
+        self.perturbaciones = perturbaciones
+        self.medidor = medidor
+        self.rng = random.Random(semilla)
+        self.emitidas = []
+        self.contadores = {"tramas": 0, "validas": 0, "ruido": 0, "truncadas": 0, "bytes": 0}
+        self.segundos = 0.0
+
+    def emitir(self, bloques: List[bytes]) -> EmisionTrama:
+        """Escribe una trama con los tiempos de la línea, aplicando las perturbaciones al azar."""
+        tipo = "valida"
+        enviar = list(bloques)
+        if self.perturbaciones.truncadas and self.rng.random() < self.perturbaciones.truncadas:
+            tipo = "truncada"
+            total = sum(len(bloque) for bloque in enviar)
+            # Cortada a un tamaño válido sería una trama buena para cualquier receptor
+            longitud = self.rng.choice([longitud for longitud in range(2, total) if longitud not in VALID_SIZES])
+            enviar = self._cortar(enviar, longitud)
+        elif self.perturbaciones.ruido and self.rng.random() < self.perturbaciones.ruido:
+            tipo = "ruido"
+            # Sin 0x00 ni 0x08: la basura no puede parecer una cabecera
+            enviar[0] = bytes(self.rng.randrange(9, 256) for _ in range(self.rng.randrange(1, 9))) + enviar[0]
+
+        fin_ns = 0
+        for num, bloque in enumerate(enviar):
+            fin_ns = self._escribir(bloque)
+            if num + 1 < len(enviar):
+                time.sleep(self.silencio_bloque)
+
+        emision = EmisionTrama(self.contadores["tramas"], b"".join(bloques), fin_ns, tipo)
+        self.emitidas.append(emision)
+        self.contadores["tramas"] += 1
+        self.contadores[{"valida": "validas", "ruido": "ruido", "truncada": "truncadas"}[tipo]] += 1
+        if self.medidor is not None and tipo != "truncada":
+            self.medidor.esperada(emision.datos, fin_ns)
+        return emision
+
+    def reproducir(self, tramas: List[List[bytes]], total: int = 0, parar: Optional[threading.Event] = None) -> None:
+        """
+        Emite las tramas en bucle.
+
+        :param tramas: Bloques de cada trama.
+        :param total: Tramas a emitir; 0 hasta que se active ``parar``.
+        """
+        if not tramas:
+            return
+        inicio = time.perf_counter()
+        num = 0
+        try:
+            while (not total or num < total) and not (parar is not None and parar.is_set()):
+                comienzo = time.monotonic()
+                self.emitir(tramas[num % len(tramas)])
+                num += 1
+                # Dentro de una ráfaga la trama siguiente sale pegada: el receptor la tiene que separar por su contenido
+                if self.perturbaciones.rafaga and num % self.perturbaciones.rafaga:
+                    continue
+                time.sleep(max(self.silencio_trama, self.intervalo - (time.monotonic() - comienzo)))
+        finally:
+            self.segundos += time.perf_counter() - inicio
+
+    def arrancar(self, tramas: List[List[bytes]], total: int = 0, parar: Optional[threading.Event] = None) -> threading.Thread:
+        """Reproduce las tramas en un hilo aparte."""
+        hilo = threading.Thread(target=self.reproducir, args=(tramas, total, parar), name="simulador", daemon=True)
+        hilo.start()
+        return hilo
+
+    def mostrar_resumen(self) -> None:
+        segundos = self.segundos or 1e-9
+        print("# SIMULADOR: %(tramas)s tramas (%(validas)s válidas, %(ruido)s con ruido, %(truncadas)s truncadas), %(bytes)s bytes" % self.contadores
+              + " en %.2f s (%.2f tramas/s)" % (self.segundos, self.contadores["tramas"] / segundos))
+
+    def _escribir(self, datos: bytes) -> int:
+        """Escribe a la velocidad de la línea. :return: Instante del último byte."""
+        siguiente = time.monotonic()
+        for inicio in range(0, len(datos), self.trozo):
+            trozo = datos[inicio:inicio + self.trozo]
+            espera = siguiente - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+            self.destino.write(trozo)
+            siguiente += len(trozo) * self.segundos_byte
+        self.contadores["bytes"] += len(datos)
+        # El último byte termina de salir de la línea cuando acaba su tiempo
+        espera = siguiente - time.monotonic()
+        if espera > 0:
+            time.sleep(espera)
+        return time.monotonic_ns()
+
+    @staticmethod
+    def _cortar(bloques: List[bytes], longitud: int) -> List[bytes]:
+        cortados = []
+        for bloque in bloques:
+            if longitud <= 0:
+                break
+            cortados.append(bloque[:longitud])
+            longitud -= len(bloque)
+        return cortados
+
+
+class ReceptorBus:
+    """
+    Lee tramas de un extremo en un hilo y se las pasa al medidor.
+
+    Separa las tramas con ``ParserTramas`` como la captura: las de una ráfaga llegan sin silencio entre ellas.
+    """
+
+    def __init__(self, extremo: Any, timeout: float, medidor: MedidorCarga) -> None:
+        self.lector = LectorTramas(extremo, silencio_bloque=timeout, parser=ParserTramas())
+        self.medidor = medidor
+        self.parar = threading.Event()
+        self.hilo = threading.Thread(target=self._recibir, name="receptor-bus", daemon=True)
+
+    def arrancar(self) -> None:
+        self.hilo.start()
+
+    def detener(self) -> None:
+        self.parar.set()
+        self.hilo.join()
+
+    def _recibir(self) -> None:
+        while not self.parar.is_set():
+            trama = self.lector.leer_trama(parar=self.parar.is_set)
+            if trama:
+                self.medidor.recibida(b"".join(trama[0]))
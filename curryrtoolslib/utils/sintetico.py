@@ -0,0 +1,100 @@
+"""
+Generador de tramas y capturas sintéticas para benchmarks y pruebas.
+
+Las tramas tienen la forma de las del termostato: 6 bloques que empiezan por 0x00,
+con los 0x08 de relleno que quita ``normalizar_bloque`` (4 en los bloques 0-2 y 2
+en los 3-5), y un tamaño total de ``VALID_SIZES``. El contenido depende de las
+posiciones de los controles, así que cada estado tiene sus propias tramas, con
+algunas variantes por estado. Las capturas se escriben como las de
+``guardar_trama_bytes``: un ``.bin``, su ``.info`` y una lista ``dump_list_*.json``.
+"""
+import json
+import os
+import random
+
+from typing import List, Optional, Tuple
+
+from . import trama as trama_tools
+
+# Tamaño de los bloques de una trama de 85 bytes; las más largas crecen en el último bloque
+TAMANOS_BLOQUE = (15, 15, 15, 15, 15, 10)
+RELLENO_BLOQUE = (4, 4, 4, 2, 2, 2)
+VARIANTES_ESTADO = 4
+# Sin 0x08 en los datos: normalizar_bloque sólo quita los del relleno
+VALORES_DATOS = [valor for valor in range(256) if valor != 8]
+
+
+def tamanos_bloques(tamano: int) -> Tuple[int, ...]:
+    extra = tamano - sum(TAMANOS_BLOQUE)
+    if tamano not in trama_tools.VALID_SIZES or extra < 0:
+        raise Exception("Tamaño de trama %s no válido. Opciones: %s" % (tamano, trama_tools.VALID_SIZES))
+    return TAMANOS_BLOQUE[:-1] + (TAMANOS_BLOQUE[-1] + extra,)
+
+
+def posiciones_aleatorias(rng: random.Random, controles: int = 6) -> str:
+    return "".join(rng.choice("01") for _ in range(controles))
+
+
+def generar_trama(posiciones: str, tamano: int, variante: int = 0) -> List[bytes]:
+    """
+    Trama con la estructura de bloques del termostato para unas posiciones.
+
+    :param posiciones: Posiciones de los controles (``"100100"``).
+    :param tamano: Bytes de la trama; uno de ``VALID_SIZES``.
+    :param variante: Distintas variantes dan tramas distintas para el mismo estado.
+    :return: Los bloques de la trama.
+    """
+    rng = random.Random("%s/%s/%s" % (posiciones, tamano, variante))
+    bloques = []
+    for tamano_bloque, relleno in zip(tamanos_bloques(tamano), RELLENO_BLOQUE):
+        # El primer bloque lleva la cabecera 0x00 0x08 de la trama
+        datos = bytes([0]) + bytes([8] * relleno)
+        datos += bytes(rng.choice(VALORES_DATOS) for _ in range(tamano_bloque - len(datos)))
+        bloques.append(datos)
+    return bloques
+
+
+def generar_tramas(num: int, semilla: int = 0, tamanos: Optional[List[int]] = None) -> List[Tuple[List[bytes], str]]:
+    """:return: ``num`` tramas (bloques, posiciones) con estados, tamaños y variantes al azar."""
+    rng = random.Random(semilla)
+    tamanos = tamanos or trama_tools.VALID_SIZES
+    tramas = []
+    for _ in range(num):
+        posiciones = posiciones_aleatorias(rng)
+        tramas.append((generar_trama(posiciones, rng.choice(tamanos), rng.randrange(VARIANTES_ESTADO)), posiciones))
+    return tramas
+
+
+def escribir_capturas(carpeta: str, num: int, semilla: int = 0, timeout: float = 0.1, baudrate: int = 2400) -> List[str]:
+    """
+    Escribe ``num`` capturas (``.bin`` + ``.info``) y la lista ``dump_list_sintetico.json`` en ``carpeta``.
+
+    :return: Rutas de los ``.bin``.
+    """
+    os.makedirs(carpeta, exist_ok=True)
+    rutas = []
+    nombres = []
+    for num_trama, (bloques, posiciones) in enumerate(generar_tramas(num, semilla)):
+        nombre = "sintetico_%06d" % num_trama
+        ruta = os.path.join(carpeta, "%s.bin" % nombre)
+        with open(ruta, "wb") as fichero:
+            for bloque in bloques:
+                fichero.write(bloque)
+        hora = "2024-01-01 00:00:%02d.%06d" % (num_trama % 60, num_trama)
+        info = {
+            "stream": ruta,
+            "blocks": len(bloques),
+            "timeout": timeout,
+            "baudrate": baudrate,
+            "times": [[[hora], len(bloque)] for bloque in bloques],
+            "uuid": nombre,
+            "values": posiciones,
+        }
+        with open(os.path.join(carpeta, "%s.info" % nombre), "w") as fichero:
+            json.dump(info, fichero, indent=4, sort_keys=True)
+        rutas.append(ruta)
+        nombres.append(nombre)
+
+    with open(os.path.join(carpeta, "dump_list_sintetico.json"), "w") as fichero:
+        json.dump({"files": nombres}, fichero, indent=4, sort_keys=True)
+    return rutas
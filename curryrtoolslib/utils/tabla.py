@@ -0,0 +1,156 @@
+"""
+Tabla de estados: decodificación exacta de tramas conocidas sin pasar por la red.
+
+Cada captura lleva en su ``.info`` las posiciones reales de los controles y el
+termostato sólo emite unas pocas tramas distintas. La tabla indexa los bytes de la
+trama normalizada con su código, construida a partir de todas las capturas del
+dataset. Al decodificar se busca primero en la tabla (un acceso a diccionario) y
+sólo las tramas que no están pasan por el modelo.
+
+Las tramas que aparecen en las capturas con códigos distintos no se guardan: de
+ellas se encarga el modelo.
+"""
+import os
+import sys
+
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from . import trama as trama_tools
+
+NOMBRE_TABLA = "tabla_estados_%s.npz"
+
+
+def ruta_tabla(nombre_tabla: Optional[str], folder: str, layer_size: int) -> str:
+    """El fichero tal cual si existe, dentro de la carpeta de modelos o el nombre por defecto."""
+    if not nombre_tabla:
+        return os.path.join(folder, NOMBRE_TABLA % layer_size)
+    if os.path.exists(nombre_tabla) or os.path.dirname(nombre_tabla):
+        return nombre_tabla
+    return os.path.join(folder, nombre_tabla)
+
+
+def claves_tramas(datos: Any) -> Any:
+    """Tramas normalizadas (N, 1, neuronas) o (N, neuronas) en 0...255 como matriz uint8 (N, neuronas)."""
+    datos = np.asarray(datos)
+    return np.ascontiguousarray(datos.reshape(datos.shape[0], int(np.prod(datos.shape[1:]))), dtype=np.uint8)
+
+
+class TablaEstados:
+
+    codigos: Dict[bytes, int]
+
+    def __init__(self, layer_size: int, codigos: Optional[Dict[bytes, int]] = None) -> None:
+        """
+        :param layer_size: Neuronas de la primera capa (longitud de las tramas normalizadas).
+        :param codigos: Bytes de la trama normalizada -> código de los controles.
+        """
+        self.layer_size = layer_size
+        self.codigos = codigos or {}
+
+    @classmethod
+    def construir(cls, datos: Any, resultados: Any) -> Tuple['TablaEstados', Dict[str, int]]:
+        """
+        :param datos: Tramas normalizadas del dataset (N, 1, neuronas).
+        :param resultados: Código esperado de cada trama (N, 1, 1).
+        :return: La tabla y un resumen con tramas, tramas distintas y ambiguas.
+        """
+        claves = claves_tramas(datos)
+        valores = np.asarray(resultados).reshape(-1).astype(np.int64)
+        codigos: Dict[bytes, int] = {}
+        ambiguas = set()
+        for fila, codigo in zip(claves, valores.tolist()):
+            clave = fila.tobytes()
+            anterior = codigos.setdefault(clave, codigo)
+            if anterior != codigo:
+                ambiguas.add(clave)
+        for clave in ambiguas:
+            del codigos[clave]
+
+        tabla = cls(claves.shape[1], codigos)
+        return tabla, {"tramas": len(claves), "distintas": len(codigos) + len(ambiguas), "ambiguas": len(ambiguas)}
+
+    @classmethod
+    def cargar(cls, ruta: str) -> 'TablaEstados':
+        with np.load(ruta, allow_pickle=False) as datos:
+            if int(datos["normalizacion"]) != trama_tools.VERSION_NORMALIZACION:
+                raise Exception("La tabla %s es de otra versión de la normalización: vuelve a construirla" % ruta)
+            tramas = datos["tramas"]
+            return cls(int(datos["layer_size"]), {fila.tobytes(): int(codigo) for fila, codigo in zip(tramas, datos["codigos"])})
+
+    def guardar(self, ruta: str) -> None:
+        tramas = np.frombuffer(b"".join(self.codigos.keys()), dtype=np.uint8).reshape(len(self.codigos), self.layer_size)
+        if os.path.dirname(ruta):
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        np.savez_compressed(ruta, tramas=tramas, codigos=np.fromiter(self.codigos.values(), dtype=np.uint8, count=len(self.codigos)),
+                            layer_size=np.int64(self.layer_size), normalizacion=np.int64(trama_tools.VERSION_NORMALIZACION))
+        print("Tabla de estados guardada en %s (%s tramas)" % (ruta, len(self.codigos)))
+
+    def __len__(self) -> int:
+        return len(self.codigos)
+
+    def buscar(self, datos: Any) -> Tuple[Any, Any]:
+        """
+        :return: Código de cada trama (N,) y vector booleano con las que están en la tabla.
+        """
+        claves = claves_tramas(datos)
+        codigos = np.zeros(len(claves), dtype=np.uint8)
+        encontradas = np.zeros(len(claves), dtype=bool)
+        if claves.shape[1] != self.layer_size:
+            return codigos, encontradas
+        for num, fila in enumerate(claves):
+            codigo = self.codigos.get(fila.tobytes())
+            if codigo is not None:
+                codigos[num] = codigo
+                encontradas[num] = True
+        return codigos, encontradas
+
+
+class DecodificadorTabla:
+    """
+    Predictor que consulta la tabla antes que el modelo.
+
+    Tiene el mismo contrato que los predictores de ``prediccion.cargar_predictor``:
+    recibe las tramas normalizadas y devuelve una salida en 0...1 por trama. Las que
+    están en la tabla devuelven su código exacto (código / 255).
+    """
+
+    def __init__(self, tabla: TablaEstados, predictor: Callable[..., Any]) -> None:
+        self.tabla = tabla
+        self.predictor = predictor
+        self.consultas = 0
+        self.aciertos = 0
+
+    def __call__(self, datos: Any, *args: Any, **kwargs: Any) -> Any:
+        codigos, encontradas = self.tabla.buscar(datos)
+        salidas = codigos.astype(np.float32) / 255
+        self.consultas += len(codigos)
+        self.aciertos += int(encontradas.sum())
+        if not encontradas.all():
+            pendientes = np.flatnonzero(~encontradas)
+            salidas[pendientes] = np.asarray(self.predictor(np.asarray(datos)[pendientes], *args, **kwargs), dtype=np.float32).reshape(-1)
+        return salidas
+
+    def mostrar_resumen(self, destino: Any = None) -> None:
+        tasa = 100 * self.aciertos / self.consultas if self.consultas else 0.0
+        print("# TABLA DE ESTADOS: %s de %s tramas resueltas por la tabla (%.1f%%), %s por el modelo" % (
+            self.aciertos, self.consultas, tasa, self.consultas - self.aciertos), file=destino or sys.stdout)
+
+
+def cargar_decodificador(nombre_tabla: str, folder: str, layer_size: int, predictor: Callable[..., Any]) -> Optional[DecodificadorTabla]:
+    """
+    Envuelve ``predictor`` con la tabla indicada.
+
+    :return: El decodificador, o None si la tabla no existe o no es para ``layer_size`` neuronas.
+    """
+    ruta = ruta_tabla(nombre_tabla, folder, layer_size)
+    if not os.path.exists(ruta):
+        print("No existe la tabla de estados %s" % ruta)
+        return None
+    tabla = TablaEstados.cargar(ruta)
+    if tabla.layer_size != layer_size:
+        print("La tabla %s es para %s neuronas y el modelo usa %s: se ignora" % (ruta, tabla.layer_size, layer_size))
+        return None
+    print("Tabla de estados %s: %s tramas conocidas" % (ruta, len(tabla)))
+    return DecodificadorTabla(tabla, predictor)
@@ -1,16 +1,22 @@
-import numpy as np
+import collections
+import functools
 from datetime import datetime
 import json
 import uuid
 import os
-from typing import List, Any, Union, Dict, Tuple
+from typing import List, Any, Union, Deque, Dict, Tuple, NamedTuple, Optional
 from .. import CONFIG
+from .perezoso import ModuloPerezoso
+
+# NumPy sólo hace falta al normalizar; leer y guardar tramas no lo necesita
+np = ModuloPerezoso("numpy")
 
 VALID_SIZES = [85,88,91,94]
+CABECERA = b"\x00\x08"
 
-def validar_trama_bytes(trama_bytes: List[bytes]) -> bool:
+def validar_trama_bytes(trama_bytes: Union[bytes, List[int]]) -> bool:
     valid = True
-    if not trama_bytes[0:2] != [b"\x00",b"\x08"]:
+    if bytes(trama_bytes[0:2]) != CABECERA:
         print("Trama inválida (No comienza por 0,8)",trama_bytes)
         valid = False
     elif len(trama_bytes) not in VALID_SIZES:
@@ -19,6 +25,152 @@ def validar_trama_bytes(trama_bytes: List[bytes]) -> bool:
     
     return valid
 
+
+class EventoTrama(NamedTuple):
+    tipo: str       # "trama", "descartada" (empezaba por la cabecera) o "resync" (basura)
+    datos: bytes
+    inicio: int     # Posición del primer byte dentro de todo lo recibido
+
+
+class ParserTramas:
+    """
+    Parser incremental de tramas.
+
+    Se alimenta con trozos de bytes de cualquier tamaño. Se sincroniza con la cabecera
+    0x00 0x08, controla la longitud esperada según ``VALID_SIZES`` y devuelve eventos:
+    ``trama`` con cada trama completa, ``descartada`` con las que empiezan por la
+    cabecera pero no se pueden aceptar y ``resync`` con la basura entre tramas.
+
+    Una trama se cierra al llamar a ``fin()`` (silencio en la línea) o, si la línea no
+    calla, donde empieza la siguiente. Como cada bloque empieza también por 0x00 0x08,
+    una cabecera justo tras un tamaño válido no basta para cortar. Se corta, por orden:
+
+    * donde lo que sigue puede ser a su vez una trama, con otra cabecera tras un tamaño
+      válido (tramas pegadas, con o sin silencio entre ellas);
+    * donde hubo un silencio entre bloques (``hueco()``) y lo que sigue no es una
+      cabecera (basura tras la trama).
+
+    Si no se puede cortar se pierde la sincronía: las cabeceras de los bloques no se
+    distinguen de las de una trama, así que todo se descarta hasta el siguiente silencio.
+    Con tramas pegadas y basura entre ellas el corte puede ser ambiguo: una trama seguida
+    de 3 bytes de basura es igual que otra 3 bytes más larga.
+
+    Al callar la línea, lo pendiente se acepta si se reparte entero en tramas de tamaño
+    válido o se puede cortar por un silencio; el resto (trama cortada, con basura
+    detrás...) se descarta entero.
+    """
+
+    buffer: bytearray
+    huecos: Deque[int]
+
+    def __init__(self, tamanos: List[int] = VALID_SIZES) -> None:
+        self.tamanos = sorted(tamanos)
+        self.maximo = self.tamanos[-1]
+        self.buffer = bytearray()
+        self.inicio = 0
+        # Posiciones (contando todo lo recibido) de los silencios entre bloques pendientes
+        self.huecos = collections.deque()
+        self.sin_sincronia = False
+
+    def alimentar(self, datos: bytes) -> List[EventoTrama]:
+        eventos: List[EventoTrama] = []
+        self.buffer += datos
+        if self.sin_sincronia:
+            self._emitir(eventos, "resync", len(self.buffer))
+            return eventos
+        self._sincronizar(eventos)
+        # Sin silencio que la cierre, se decide en cuanto caben esta trama y la cabecera tras la siguiente
+        while len(self.buffer) >= 2 * self.maximo + len(CABECERA):
+            corte = self._corte()
+            if not corte:
+                self.sin_sincronia = True
+                self._emitir(eventos, "descartada", len(self.buffer))
+                break
+            self._emitir(eventos, "trama", corte)
+            self._sincronizar(eventos)
+        return eventos
+
+    def hueco(self) -> None:
+        """Marca un silencio entre bloques tras lo último recibido."""
+        posicion = self.inicio + len(self.buffer)
+        if not self.huecos or self.huecos[-1] != posicion:
+            self.huecos.append(posicion)
+
+    def fin(self) -> List[EventoTrama]:
+        """Indica que la línea ha quedado en silencio: cierra lo pendiente."""
+        eventos: List[EventoTrama] = []
+        while self.buffer and not self.sin_sincronia:
+            longitudes = self._repartir(0)
+            if longitudes:
+                for longitud in longitudes:
+                    self._emitir(eventos, "trama", longitud)
+                break
+            corte = self._corte(sin_hueco=False)
+            if not corte:
+                break
+            self._emitir(eventos, "trama", corte)
+            self._sincronizar(eventos)
+        if self.buffer:
+            empieza = self.buffer.startswith(CABECERA) and not self.sin_sincronia
+            self._emitir(eventos, "descartada" if empieza else "resync", len(self.buffer))
+        self.huecos.clear()
+        self.sin_sincronia = False
+        return eventos
+
+    def pendientes(self) -> int:
+        return len(self.buffer)
+
+    def _corte(self, sin_hueco: bool = True) -> Optional[int]:
+        """
+        Tamaño de la trama al principio del buffer, o None si no se puede cortar.
+
+        :param sin_hueco: Si se puede cortar donde no hubo silencio (sólo con lo que sigue detrás).
+        """
+        huecos = {hueco - self.inicio for hueco in self.huecos}
+        candidatos = [tamano for tamano in self.tamanos if tamano < len(self.buffer)]
+        if sin_hueco:
+            for tamano in candidatos:
+                if self._empieza_trama(tamano):
+                    return tamano
+        for tamano in candidatos:
+            if tamano in huecos and self.buffer[tamano:tamano + len(CABECERA)] != CABECERA:
+                return tamano
+        return None
+
+    def _empieza_trama(self, pos: int) -> bool:
+        """Si en ``pos`` hay una cabecera seguida, tras un tamaño válido, de otra."""
+        if self.buffer[pos:pos + len(CABECERA)] != CABECERA:
+            return False
+        return any(self.buffer[pos + tamano:pos + tamano + len(CABECERA)] == CABECERA for tamano in self.tamanos)
+
+    def _repartir(self, pos: int) -> Optional[List[int]]:
+        """Tamaños de las tramas en que se reparte todo el buffer desde ``pos``, o None si no se puede."""
+        if pos == len(self.buffer):
+            return []
+        if self.buffer[pos:pos + len(CABECERA)] != CABECERA:
+            return None
+        for tamano in self.tamanos:
+            if pos + tamano <= len(self.buffer):
+                resto = self._repartir(pos + tamano)
+                if resto is not None:
+                    return [tamano] + resto
+        return None
+
+    def _sincronizar(self, eventos: List[EventoTrama]) -> None:
+        pos = self.buffer.find(CABECERA)
+        if pos < 0:
+            # Se conserva un 0x00 final por si es el principio de la cabecera
+            pos = len(self.buffer) - 1 if self.buffer.endswith(CABECERA[:1]) else len(self.buffer)
+        if pos > 0:
+            self._emitir(eventos, "resync", pos)
+
+    def _emitir(self, eventos: List[EventoTrama], tipo: str, longitud: int) -> None:
+        eventos.append(EventoTrama(tipo, bytes(self.buffer[:longitud]), self.inicio))
+        del self.buffer[:longitud]
+        self.inicio += longitud
+        while self.huecos and self.huecos[0] <= self.inicio:
+            self.huecos.popleft()
+
 def guardar_trama_bytes(stream_arr: List[bytes], times_arr : List[List[str]], baudrate: int, timeout : float, values : str = "") -> str:
     folder_dums = CONFIG.get('dumpsfolder')
     file_name = str(uuid.uuid4())
@@ -48,13 +200,22 @@ def resuelve_nombre_binarios_lista(nombre_lista):
         return []
 
     data_json = json.load(open(nombre_lista, "r"))
-    return data_json["files"]
+    return data_json.get("files", [])
 
-def crear_lista_json(lista: dict[str, Any], posiciones: str, baudrate: int) -> bool:
+def resuelve_registros_lista(nombre_lista: str) -> List[str]:
+    """Registros ``<segmento>#<desplazamiento>`` de una lista ``cambios_*.json`` capturada en formato log."""
+    if not os.path.exists(nombre_lista):
+        return []
+    with open(nombre_lista, "r") as f:
+        return json.load(f).get("registros", [])
+
+def crear_lista_json(lista: dict[str, Any], posiciones: str, baudrate: int, sufijo: str = "", prefijo: str = "dump_list") -> bool:
 
     timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+    if sufijo:
+        timestamp = "%s_%s" % (timestamp, sufijo)
     dumps_folder = os.path.abspath(CONFIG.get('dumpsfolder'))
-    hex_filename = os.path.abspath(os.path.join(dumps_folder, 'dump_list_%s.json'% (timestamp)))
+    hex_filename = os.path.abspath(os.path.join(dumps_folder, '%s_%s.json'% (prefijo, timestamp)))
     # f'datos_hex_{baudrate}_{"-".join(posiciones.split(","))}
     json.dump(lista, open(hex_filename, "w"), indent=4, sort_keys=True)
     print(f"Datos guardados en {hex_filename}")
@@ -95,6 +256,35 @@ def cargar_trama_bytes(trama_file: str) -> Union[Tuple[None, None] ,List[Dict[st
     return result
 
 
+def cargar_tramas(ruta: str) -> List[List[Dict[str, Any]]]:
+    """
+    Carga las tramas de un fichero de captura en cualquiera de sus formatos.
+
+    Acepta un ``.bin`` (con su ``.info``), un segmento ``.clog`` entero o un registro
+    concreto ``<segmento>.clog#<desplazamiento>``. Cada trama es la lista de bloques
+    que devuelve ``cargar_trama_bytes``.
+    """
+    from . import registro
+
+    if "#" in ruta:
+        ruta_segmento, desplazamiento = ruta.rsplit("#", 1)
+        if not os.path.exists(ruta_segmento):
+            print("No existe el fichero %s" % ruta_segmento)
+            return []
+        return [registro.cargar_registro(ruta_segmento, int(desplazamiento))]
+
+    if registro.es_segmento(ruta):
+        if not os.path.exists(ruta):
+            print("No existe el fichero %s" % ruta)
+            return []
+        return [bloques for _, bloques in registro.iterar_registros(ruta)]
+
+    lista_tramas = cargar_trama_bytes(ruta)
+    if not lista_tramas or lista_tramas[0] is None:
+        return []
+    return [lista_tramas] # type: ignore[list-item]
+
+
 def normalizar_datos(layer_size: int, datos : List[int], check_size: bool = False) -> Union[bool, List[Tuple[List[int], Any]]]:
     if check_size:
         orig_size = len(datos)
@@ -128,3 +318,75 @@ def normalizar_bloque(bloque: int, data: List[int]) -> List[int]:
 
     return result
 
+
+# Subir si cambian las reglas de normalización: invalida los datasets cacheados
+VERSION_NORMALIZACION = 1
+
+@functools.lru_cache(maxsize=64)
+def mascaras_bloques(tamanos_bloque: Tuple[int, ...]) -> Tuple[Any, Any]:
+    """
+    Máscaras booleanas con las reglas de ``normalizar_bloque`` para una estructura de bloques.
+
+    :return: Posiciones que se eliminan siempre y posiciones que se eliminan si valen 8.
+    """
+    siempre = np.zeros(sum(tamanos_bloque), dtype=bool)
+    si_vale_8 = np.zeros(sum(tamanos_bloque), dtype=bool)
+    inicio = 0
+    for bloque, tamano in enumerate(tamanos_bloque):
+        if tamano:
+            siempre[inicio] = True
+        if bloque in [0,1,2]:
+            si_vale_8[inicio + 1:inicio + min(tamano, 5)] = True
+        elif bloque in [3,4,5]:
+            si_vale_8[inicio + 1:inicio + min(tamano, 3)] = True
+        inicio += tamano
+    siempre.flags.writeable = False
+    si_vale_8.flags.writeable = False
+    return siempre, si_vale_8
+
+def normalizar_lote(tramas: Any, tamanos_bloque: Tuple[int, ...], layer_size: int) -> Tuple[Any, Any]:
+    """
+    Versión vectorizada de ``normalizar_bloque`` + ``normalizar_datos`` para muchas tramas
+    con la misma estructura de bloques.
+
+    :param tramas: Matriz uint8 (N, bytes de la trama).
+    :param tamanos_bloque: Tamaño de cada bloque de las tramas.
+    :param layer_size: Neuronas de la primera capa: se rellena con ceros o se trunca a este tamaño.
+    :return: Matriz float32 (N, layer_size) y vector booleano con las tramas que caben sin truncar.
+    """
+    tramas = np.asarray(tramas, dtype=np.uint8)
+    siempre, si_vale_8 = mascaras_bloques(tuple(tamanos_bloque))
+    conservar = ~(siempre | (si_vale_8 & (tramas == 8)))
+    destino = np.cumsum(conservar, axis=1) - 1
+    validas = conservar.sum(axis=1) <= layer_size
+
+    resultado = np.zeros((len(tramas), layer_size), dtype=np.float32)
+    filas, columnas = np.nonzero(conservar & (destino < layer_size))
+    resultado[filas, destino[filas, columnas]] = tramas[filas, columnas]
+    return resultado, validas
+
+def normalizar_tramas(tramas: List[List[bytes]], layer_size: int) -> Tuple[Any, Any]:
+    """
+    Normaliza de una vez una lista de tramas (cada una, su lista de bloques).
+
+    Agrupa las tramas por estructura de bloques y aplica ``normalizar_lote`` a cada grupo.
+
+    :return: Matriz float32 (N, layer_size) en el orden de entrada y vector de tramas válidas.
+    """
+    resultado = np.zeros((len(tramas), layer_size), dtype=np.float32)
+    validas = np.zeros(len(tramas), dtype=bool)
+    grupos: Dict[Tuple[int, ...], List[int]] = {}
+    for num, bloques in enumerate(tramas):
+        grupos.setdefault(tuple(len(bloque) for bloque in bloques), []).append(num)
+
+    for tamanos_bloque, indices in grupos.items():
+        datos = np.frombuffer(b"".join(b"".join(tramas[num]) for num in indices), dtype=np.uint8)
+        datos = datos.reshape(len(indices), sum(tamanos_bloque))
+        resultado[indices], validas[indices] = normalizar_lote(datos, tamanos_bloque, layer_size)
+
+    return resultado, validas
+
+def codificar_valores(values: str) -> int:
+    """Convierte las posiciones de los controles ("100100") en el código que aprende la red."""
+    bits = "".join(bit for bit in str(values) if bit in "01")
+    return int(bits or "0", 2)
@@ -0,0 +1,24 @@
+import importlib.util
+
+import numpy as np
+import pytest
+
+from curryrtoolslib.utils import barrido
+
+
+def test_rejilla_combina_capas_y_tasas():
+    assert barrido.rejilla("20,20;2*8", "0.001,0.01") == [("20,20", 0.001), ("20,20", 0.01), ("2*8", 0.001), ("2*8", 0.01)]
+
+
+@pytest.mark.skipif(importlib.util.find_spec("tensorflow") is None, reason="TensorFlow no está instalado")
+def test_clasifica_por_perdida_de_validacion(tmp_path):
+    rng = np.random.default_rng(0)
+    datos = rng.random((60, 1, 8)).astype(np.float32)
+    resultados = (datos.mean(axis=-1, keepdims=True) > 0.5).astype(np.float32)
+
+    clasificacion = barrido.ejecutar_barrido([("4", 0.01), ("8,4", 0.01)], datos, resultados, epocas=2, tamano_lote=None,
+                                             carpeta_modelos=str(tmp_path), fraccion=0.2)
+
+    assert [resultado["tramas_validacion"] for resultado in clasificacion] == [12, 12]
+    perdidas = [resultado["perdida_validacion"] for resultado in clasificacion]
+    assert perdidas == sorted(perdidas)
@@ -0,0 +1,43 @@
+import os
+
+import numpy as np
+
+from curryrtoolslib.utils.cache import CacheDataset
+
+
+def crear_capturas(carpeta, valores):
+    rutas = []
+    for valor in valores:
+        ruta = os.path.join(str(carpeta), "captura_%d.clog" % valor)
+        with open(ruta, "wb") as fichero:
+            fichero.write(bytes([valor]) * 8)
+        rutas.append(ruta)
+    return rutas
+
+
+def constructor(borrar=None):
+    """Cada captura da tantas filas como su valor + 1, todas con ese valor."""
+    def construir(rutas):
+        datos, filas = [], []
+        for ruta in rutas:
+            with open(ruta, "rb") as fichero:
+                valor = fichero.read()[0]
+            datos.extend([[[float(valor), 0.0]]] * (valor + 1))
+            filas.append(valor + 1)
+        if borrar and os.path.exists(borrar):
+            os.remove(borrar)
+        return np.array(datos, dtype=np.float32), np.zeros((len(datos), 1, 1), dtype=np.float32), filas
+    return construir
+
+
+def test_captura_borrada_durante_la_construccion(tmp_path):
+    rutas = crear_capturas(tmp_path, [0, 1, 2])
+    datos, _ = CacheDataset(str(tmp_path), {"neuronasfirstlayer": 2}).actualizar(rutas, constructor(borrar=rutas[1]))
+    assert datos[:, 0, 0].tolist() == [0.0, 2.0, 2.0, 2.0]
+
+    # En la siguiente construcción incremental cada entrada sigue apuntando a sus filas
+    nueva = crear_capturas(tmp_path, [3])
+    cache = CacheDataset(str(tmp_path), {"neuronasfirstlayer": 2})
+    datos, _ = cache.actualizar([rutas[0], rutas[2]] + nueva, constructor())
+    assert datos[:, 0, 0].tolist() == [0.0, 2.0, 2.0, 2.0, 3.0, 3.0, 3.0, 3.0]
+    assert cache.contadores["sin_cambios"] == 2
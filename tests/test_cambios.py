@@ -0,0 +1,43 @@
+from curryrtoolslib.utils import sintetico
+from curryrtoolslib.utils.cambios import FiltroCambios
+
+
+def test_las_repeticiones_no_se_guardan():
+    filtro = FiltroCambios()
+    trama = sintetico.generar_trama("100100", 85)
+
+    assert filtro.registrar(trama, "10:00:00")[0]
+    for segundo in range(1, 4):
+        nueva, entrada = filtro.registrar(list(trama), "10:00:%02d" % segundo)
+        assert not nueva
+
+    assert filtro.guardadas() == 1
+    assert filtro.vistas == 4
+    assert entrada["repeticiones"] == 4
+    assert entrada["primera"] == "10:00:00"
+    assert entrada["ultima"] == "10:00:03"
+
+
+def test_los_cambios_se_guardan_con_su_propio_contador():
+    filtro = FiltroCambios()
+    apagado = sintetico.generar_trama("000000", 85)
+    encendido = sintetico.generar_trama("100000", 85)
+
+    horas = ["10:00:00", "10:00:01", "10:00:02", "10:00:03", "10:00:04"]
+    resultados = [filtro.registrar(trama, hora) for trama, hora in zip([apagado, apagado, encendido, encendido, apagado], horas)]
+
+    assert [nueva for nueva, _ in resultados] == [True, False, True, False, True]
+    assert [(entrada["repeticiones"], entrada["primera"], entrada["ultima"]) for entrada in filtro.entradas] == [
+        (2, "10:00:00", "10:00:01"), (2, "10:00:02", "10:00:03"), (1, "10:00:04", "10:00:04")]
+    assert filtro.entradas[0]["hash"] == filtro.entradas[2]["hash"]
+
+
+def test_cada_posicion_compara_con_su_ultima_trama():
+    filtro = FiltroCambios()
+    corta = sintetico.generar_trama("010101", 85)
+    larga = sintetico.generar_trama("010101", 94)
+
+    # Una trama de otra posición entre medias no rompe la racha de repeticiones
+    assert [filtro.registrar(trama, "10:00:00")[0] for trama in [corta, larga, corta, larga]] == [True, True, False, False]
+    assert filtro.guardadas() == 2
+    assert [entrada["repeticiones"] for entrada in filtro.entradas] == [2, 2]
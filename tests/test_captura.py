@@ -0,0 +1,37 @@
+import random
+import time
+
+from curryrtoolslib.utils.captura import CapturaPipeline
+
+
+class LectorLista:
+    """Entrega las tramas de una lista y después para la captura."""
+
+    def __init__(self, tramas):
+        self.tramas = list(tramas)
+        self.pipeline = None
+        self.descartados = 0
+        self.tramas_descartadas = 0
+
+    def leer_trama(self, parar=None):
+        if not self.tramas:
+            self.pipeline.detener()
+            return None
+        return self.tramas.pop(0)
+
+
+def test_varios_escritores_conservan_el_numero_de_lectura():
+    tramas = [([bytes([num])], [[("t", num)]]) for num in range(40)]
+    lector = LectorLista(tramas)
+    rng = random.Random(0)
+    procesadas = []
+
+    def consumidor(trama, numero):
+        time.sleep(rng.random() * 0.005)
+        procesadas.append((numero, trama))
+
+    pipeline = lector.pipeline = CapturaPipeline(lector, consumidor, tamano_cola=64, escritores=4, politica="bloquear")
+    pipeline.ejecutar()
+
+    assert sorted(procesadas) == list(enumerate(tramas))
+    assert pipeline.contadores["procesadas"] == len(tramas)
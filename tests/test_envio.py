@@ -0,0 +1,39 @@
+import pytest
+
+from curryrtoolslib.utils import envio
+
+BAUDRATE = 2400
+TIMEOUT = 0.05
+
+
+def test_fijo():
+    ritmo = envio.Ritmo("fijo:0.18", BAUDRATE, TIMEOUT)
+
+    assert ritmo.pausa((b"\x00" * 15, 100.0), (b"\x00" * 15, 105.0)) == 0.18
+    assert ritmo.pausa((b"\x00" * 15, 100.0), None) == 0.18
+    assert envio.Ritmo("", BAUDRATE, TIMEOUT).pausa((b"", 0.0), None) == 0.18
+
+
+def test_original_reproduce_el_silencio_capturado():
+    ritmo = envio.Ritmo("original", BAUDRATE, TIMEOUT)
+    bloque = b"\x00" * 24     # 0.1 s en línea a 2400 baudios
+
+    assert ritmo.pausa((bloque, 100.0), (bloque, 100.4)) == pytest.approx(0.3)
+    # Nunca menos de lo que necesita el receptor para cerrar el bloque, ni más del máximo
+    assert ritmo.pausa((bloque, 100.0), (bloque, 100.1)) == pytest.approx(TIMEOUT * 1.2)
+    assert ritmo.pausa((bloque, 100.0), (bloque, 200.0)) == envio.MAX_SILENCIO_ORIGINAL
+    # Sin horas o al final de la tanda, como linea
+    assert ritmo.pausa((bloque, 0.0), (bloque, 100.4)) == pytest.approx(TIMEOUT * 1.2)
+    assert ritmo.pausa((bloque, 100.0), None) == pytest.approx(TIMEOUT * 1.2)
+
+
+def test_linea():
+    ritmo = envio.Ritmo("linea", BAUDRATE, TIMEOUT)
+
+    assert ritmo.pausa((b"\x00" * 15, 100.0), (b"\x00" * 15, 105.0)) == pytest.approx(TIMEOUT * 1.2)
+
+
+@pytest.mark.parametrize("definicion", ["lento", "fijo:abc", "fijo:-1", "fijo:nan"])
+def test_ritmo_no_valido(definicion):
+    with pytest.raises(Exception, match="no válido"):
+        envio.Ritmo(definicion, BAUDRATE, TIMEOUT)
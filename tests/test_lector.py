@@ -0,0 +1,98 @@
+from curryrtoolslib.utils import sintetico
+from curryrtoolslib.utils import trama as trama_tools
+from curryrtoolslib.utils.lector import LectorTramas
+
+MS = 1_000_000
+
+
+def lector():
+    return LectorTramas(None, silencio_bloque=0.1, parser=trama_tools.ParserTramas())
+
+
+def trama(posiciones, tamano):
+    return b"".join(sintetico.generar_trama(posiciones, tamano))
+
+
+def leer_todo(lector, trozos):
+    """Alimenta los trozos (datos, ms) y cierra con silencio; devuelve las tramas unidas."""
+    tramas = []
+    ultimo = 0
+    for datos, ms in trozos:
+        tramas.append(lector.alimentar(datos, ms * MS))
+        ultimo = ms
+    tramas.append(lector.comprobar_silencio((ultimo + 250) * MS))
+    while True:
+        siguiente = lector.comprobar_silencio((ultimo + 500) * MS)
+        if siguiente is None:
+            break
+        tramas.append(siguiente)
+    return [b"".join(bloques) for bloques, _ in filter(None, tramas)]
+
+
+def test_basura_antes_de_la_trama():
+    f1 = trama("100100", 85)
+    assert leer_todo(lector(), [(b"\x11\x22\x33" + f1, 0)]) == [f1]
+
+
+def test_tramas_seguidas_sin_silencio():
+    f1, f2 = trama("100100", 85), trama("011011", 88)
+    resultado = leer_todo(lector(), [(f1 + f2, 0)])
+    assert resultado == [f1, f2]
+    assert all(trama_tools.validar_trama_bytes(datos) for datos in resultado)
+
+
+def test_tramas_seguidas_en_varios_trozos_y_bloques():
+    f1, f2, f3 = trama("100100", 85), trama("011011", 88), trama("111000", 94)
+    datos = f1 + f2 + f3
+    lect = lector()
+    resultado = leer_todo(lect, [(datos[inicio:inicio + 20], inicio // 20 * 5) for inicio in range(0, len(datos), 20)])
+    assert resultado == [f1, f2, f3]
+
+
+def test_basura_despues_de_la_trama():
+    # Sin silencio entre medias no se sabe dónde acaba la trama: se descarta entera
+    f1 = trama("100100", 85)
+    lect = lector()
+    assert leer_todo(lect, [(f1 + b"\x11\x22", 0)]) == []
+    assert lect.descartados == 87
+    assert lect.tramas_descartadas == 1
+
+
+def test_trama_cortada_se_descarta():
+    f1 = trama("100100", 94)
+    lect = lector()
+    assert leer_todo(lect, [(f1[:93], 0)]) == []
+    assert lect.tramas_descartadas == 1
+    assert lect.descartados == 93
+
+
+def test_bloque_en_un_tamano_valido_no_corta_la_trama():
+    # Trama de 94 bytes con un bloque que empieza en el byte 85
+    bloques = []
+    for tamano in (15, 15, 15, 15, 25, 9):
+        bloques.append(bytes([0, 8, 8]) + bytes(range(100, 100 + tamano - 3)))
+    f1 = b"".join(bloques)
+    assert len(f1) == 94 and f1[85:87] == trama_tools.CABECERA
+    f2, f3 = trama("011011", 88), trama("111000", 85)
+    assert leer_todo(lector(), [(f1 + f2 + f3, 0)]) == [f1, f2, f3]
+    assert leer_todo(lector(), [(f1, 0)]) == [f1]
+
+
+def test_silencio_entre_bloques_se_conserva():
+    bloques = sintetico.generar_trama("100100", 85)
+    lect = lector()
+    for num, bloque in enumerate(bloques):
+        assert lect.alimentar(bloque, num * 150 * MS) is None
+    datos, tiempos = lect.comprobar_silencio((len(bloques) * 150 + 250) * MS)
+    assert datos == bloques
+    assert [tamano for _, tamano in tiempos] == [len(bloque) for bloque in bloques]
+
+
+def test_cuenta_las_tramas_descartadas():
+    f1, f2 = trama("100100", 85), trama("011011", 88)
+    lector_tramas = lector()
+    # Una trama cortada (cierra el silencio) y ruido sin cabecera antes de una válida
+    resultado = leer_todo(lector_tramas, [(f1[:20], 0), (b"\x11\x22\x33" + f2, 300)])
+    assert resultado == [f2]
+    assert lector_tramas.tramas_descartadas == 1
+    assert lector_tramas.descartados == 23
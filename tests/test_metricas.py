@@ -0,0 +1,48 @@
+from curryrtoolslib.utils.metricas import RegistroMetricas
+
+
+def test_texto_prometheus():
+    registro = RegistroMetricas()
+    tramas = registro.contador("tramas_total", "Tramas leídas")
+    cola = registro.indicador("profundidad_cola", "Tramas en cola")
+    latencia = registro.histograma("latencia_segundos", "Latencia", limites=(0.01, 0.1, 1.0))
+    pendientes = [3, 1]
+    registro.indicador("pendientes", "Leído de otro sitio", funcion=lambda: pendientes[-1])
+
+    tramas.incrementar()
+    tramas.incrementar(2)
+    cola.fijar(5)
+    cola.fijar(2)
+    for valor in (0.005, 0.01, 0.05, 0.5, 2.0):
+        latencia.observar(valor)
+
+    assert registro.texto_prometheus() == "\n".join([
+        "# HELP curryrtool_tramas_total Tramas leídas",
+        "# TYPE curryrtool_tramas_total counter",
+        "curryrtool_tramas_total 3",
+        "# HELP curryrtool_profundidad_cola Tramas en cola",
+        "# TYPE curryrtool_profundidad_cola gauge",
+        "curryrtool_profundidad_cola 2",
+        "# HELP curryrtool_latencia_segundos Latencia",
+        "# TYPE curryrtool_latencia_segundos histogram",
+        'curryrtool_latencia_segundos_bucket{le="0.01"} 2',
+        'curryrtool_latencia_segundos_bucket{le="0.1"} 3',
+        'curryrtool_latencia_segundos_bucket{le="1"} 4',
+        'curryrtool_latencia_segundos_bucket{le="+Inf"} 5',
+        "curryrtool_latencia_segundos_sum 2.565",
+        "curryrtool_latencia_segundos_count 5",
+        "# HELP curryrtool_pendientes Leído de otro sitio",
+        "# TYPE curryrtool_pendientes gauge",
+        "curryrtool_pendientes 1",
+    ]) + "\n"
+
+
+def test_escribir_fichero(tmp_path):
+    registro = RegistroMetricas()
+    registro.contador("errores_total", "Errores").incrementar()
+    ruta = tmp_path / "captura.prom"
+
+    registro.escribir_fichero(str(ruta))
+
+    assert ruta.read_text() == registro.texto_prometheus()
+    assert [nombre.name for nombre in tmp_path.iterdir()] == ["captura.prom"]
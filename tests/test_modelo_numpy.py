@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from curryrtoolslib.utils.modelo_numpy import ModeloNumpy
+
+
+def test_paridad_con_keras_tras_exportar(tmp_path):
+    pytest.importorskip("tensorflow")
+    from curryrtoolslib.utils import ia
+
+    neuronas = 16
+    modelo = ia.init_modelo((1, neuronas), [8, 4])
+    datos = np.random.default_rng(0).integers(0, 256, size=(50, 1, neuronas)).astype(np.float32)
+
+    ruta = str(tmp_path / "modelo.npz")
+    ModeloNumpy.desde_keras(modelo).guardar(ruta)
+    cargado = ModeloNumpy.cargar(ruta)
+
+    esperadas = modelo.predict(datos / 255, verbose=0).reshape(len(datos), -1)[:, 0]
+    np.testing.assert_allclose(cargado.predecir(datos), esperadas, atol=1e-5)
+    np.testing.assert_allclose(ia.predecir(datos, modelo), esperadas, atol=1e-5)
+
+
+def test_guardar_y_cargar_conserva_la_salida(tmp_path):
+    rng = np.random.default_rng(1)
+    capas = [(rng.normal(size=(16, 8)), rng.normal(size=8), "relu"), (rng.normal(size=(8, 1)), rng.normal(size=1), "sigmoid")]
+    modelo = ModeloNumpy(capas, (1, 16))
+    datos = rng.integers(0, 256, size=(20, 1, 16)).astype(np.float32)
+
+    ruta = str(tmp_path / "modelo.npz")
+    modelo.guardar(ruta)
+    cargado = ModeloNumpy.cargar(ruta)
+
+    assert cargado.forma_entrada == (1, 16)
+    np.testing.assert_array_equal(cargado.predecir(datos), modelo.predecir(datos))
@@ -0,0 +1,42 @@
+import os
+
+from curryrtoolslib.utils import registro
+
+
+def escribir_segmento(carpeta, num=5):
+    with registro.EscritorRegistro(str(carpeta)) as escritor:
+        for segundo in range(num):
+            hora = "2024-01-01 00:00:%02d" % segundo
+            escritor.escribir([b"\x00\x08ab", bytes([0, segundo])], [[[hora], 4], [[hora], 2]], 2400, 0.1, "100100")
+    return escritor.segmentos[0]
+
+
+def test_listar_registros_por_hora(tmp_path):
+    ruta = escribir_segmento(tmp_path)
+    entradas = registro.listar_registros(ruta)
+    assert [num_bytes for _, _, num_bytes in entradas] == [6] * 5
+    desde = registro._a_epoch("2024-01-01 00:00:01")
+    hasta = registro._a_epoch("2024-01-01 00:00:03")
+    assert [hora for _, hora, _ in registro.listar_registros(ruta, desde, hasta)] == [desde, desde + 1]
+
+
+def test_iterar_registros_en_rango(tmp_path):
+    ruta = escribir_segmento(tmp_path)
+    desde = registro._a_epoch("2024-01-01 00:00:03")
+    registros = list(registro.iterar_registros(ruta, desde=desde))
+    assert [bloques[1]["data"] for _, bloques in registros] == [b"\x00\x03", b"\x00\x04"]
+    assert registros[0][1] == registro.cargar_registro(ruta, registros[0][0])
+
+
+def test_registros_fuera_del_indice(tmp_path):
+    ruta = escribir_segmento(tmp_path)
+    # Captura interrumpida entre el registro y su entrada del índice
+    with open(ruta + registro.EXTENSION_INDICE, "rb+") as indice:
+        indice.truncate(os.path.getsize(ruta + registro.EXTENSION_INDICE) - 2 * registro._INDICE.size)
+    assert len(list(registro.iterar_registros(ruta))) == 5
+    os.remove(ruta + registro.EXTENSION_INDICE)
+    assert len(registro.listar_registros(ruta)) == 5
+    # Registro incompleto al final
+    with open(ruta, "ab") as segmento:
+        segmento.write(registro._LONGITUD.pack(80) + b"xx")
+    assert len(list(registro.iterar_registros(ruta))) == 5
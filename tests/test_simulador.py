@@ -0,0 +1,28 @@
+import time
+
+from curryrtoolslib.utils import simulador
+
+
+class Destino:
+
+    def __init__(self):
+        self.escrituras = []
+
+    def write(self, datos):
+        self.escrituras.append((time.monotonic(), bytes(datos)))
+        return len(datos)
+
+
+def test_rafaga_emite_las_tramas_sin_pausa():
+    destino = Destino()
+    emulador = simulador.SimuladorTermostato(destino, 115200, 0.05, perturbaciones=simulador.Perturbaciones(rafaga=3))
+    tramas = [[bytes([0x00, 0x08, num] * 3)] for num in range(3)]
+
+    emulador.reproducir(tramas, 6)
+
+    assert [datos for _, datos in destino.escrituras] == [trama[0] for trama in tramas] * 2
+    tiempos = [t for t, _ in destino.escrituras]
+    huecos = [fin - inicio for inicio, fin in zip(tiempos, tiempos[1:])]
+    # Dentro de cada ráfaga no hay silencio; entre ráfagas, el silencio que cierra la trama
+    assert max(huecos[0], huecos[1], huecos[3], huecos[4]) < 0.05
+    assert huecos[2] >= emulador.silencio_trama
@@ -0,0 +1,37 @@
+import random
+
+import numpy as np
+import pytest
+
+from curryrtoolslib.utils import sintetico
+from curryrtoolslib.utils import trama as trama_tools
+
+
+def normalizar_una(bloques, layer_size):
+    """Lo que se hacía trama a trama antes de ``normalizar_lote``."""
+    datos = []
+    for bloque, data in enumerate(bloques):
+        datos.extend(trama_tools.normalizar_bloque(bloque, list(data)))
+    return trama_tools.normalizar_datos(layer_size, datos, True)
+
+
+def con_ochos(bloques, rng):
+    """Cambia bytes al azar (también por 0x08) para probar la regla que sólo quita los 0x08."""
+    return [bytes([bloque[0]]) + bytes(rng.choice([8, rng.randrange(256)]) for _ in bloque[1:]) for bloque in bloques]
+
+
+@pytest.mark.parametrize("tamano", [85, 88, 91, 94])
+@pytest.mark.parametrize("layer_size", [94, 70])
+def test_normalizar_lote_igual_que_trama_a_trama(tamano, layer_size):
+    rng = random.Random(tamano)
+    tramas = [sintetico.generar_trama(sintetico.posiciones_aleatorias(rng), tamano, variante) for variante in range(4)]
+    tramas += [con_ochos(bloques, rng) for bloques in tramas * 5]
+    estructura = tuple(len(bloque) for bloque in tramas[0])
+    matriz = np.array([list(b"".join(bloques)) for bloques in tramas], dtype=np.uint8)
+
+    resultado, validas = trama_tools.normalizar_lote(matriz, estructura, layer_size)
+
+    esperadas = [normalizar_una(bloques, layer_size) for bloques in tramas]
+    assert list(validas) == [esperada is not False for esperada in esperadas]
+    assert validas.any()
+    np.testing.assert_array_equal(resultado[validas], np.concatenate([esperada for esperada in esperadas if esperada is not False]))